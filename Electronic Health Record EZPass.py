@@ -1,5 +1,7 @@
+import multiprocessing
 import gui
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Needed for the batch worker pool in frozen (PyInstaller) builds
     app = gui.App()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,148 @@
+import os
+import json
+
+CONFIG_FILE = "config.json"
+
+DEFAULT_SETTINGS = {
+    "input_pdf_folder": "Rightfax folder",
+    "output_text_folder": "CPRS documents for provider to sign",
+    "archive_folder": "PDF files to be archived in vistaimaging",
+    "failed_text_extraction_folder": "failed text extraction folder",
+    "max_workers": 0, # 0 = one worker process per CPU core
+    "pipeline_name": "default", # Name of the feed defined by the folders above
+    "pipeline_priority": 1, # Weight in the fair share of workers when several pipelines are busy
+    "pipeline_worker_quota": 0, # Most workers this feed may hold at once; 0 = no limit
+    # More feeds processed alongside the one above, e.g. {"pipeline_name": "bulk_records",
+    # "input_pdf_folder": ..., "output_text_folder": ..., "archive_folder": ...,
+    # "failed_text_extraction_folder": ..., "pipeline_priority": 1, "pipeline_worker_quota": 2}.
+    # Any other setting can be overridden per pipeline too; missing ones are taken from above,
+    # except the output, archive and failed folders: those default to a subfolder named after
+    # the pipeline, since two feeds writing one folder could overwrite each other's files.
+    "pipelines": [],
+    "pipeline_write_workers": 2, # Threads renaming finished .txt files into place and updating the indexes
+    "pipeline_move_workers": 4, # Threads copying/archiving PDFs, so a slow share does not stall extraction
+    "pipeline_queue_size": 0, # Documents allowed to wait between two pipeline stages; 0 = 2 x max_workers
+    "watch_poll_interval": 2.0, # Seconds between folder scans when inotify is not available
+    "watch_stable_seconds": 2.0, # A new PDF must keep the same size/mtime this long before it is opened
+    "discovery_order": "oldest", # oldest | newest | name; order of files within each priority group
+    "discovery_page_size": 0, # 0 = sort the whole input listing; N = read and sort N entries at a time, so huge folders start at once but priority only holds within each N
+    "priority_patterns": ["(?<![a-z])stat(?![a-z])", "urgent"], # File name regexes (case-insensitive) processed first, in this order
+    "watch_rescan_interval": 30.0, # Full rescan safety net in inotify mode (e.g. files written over SMB)
+    "status_log_level": "info", # debug | info | warning | error; "debug" adds per-page progress
+    "status_log_max_lines": 5000, # Lines kept in the GUI status log before the oldest are dropped
+    "dedup_index_path": "ezpass_index.sqlite3", # Content-hash index of processed PDFs; "" turns duplicate detection off
+    "ocr_enabled": False, # OCR pages without a text layer (needs Tesseract + TESSDATA_PREFIX for PyMuPDF)
+    "ocr_dpi": 300,
+    "ocr_language": "eng",
+    "ocr_workers": 2, # OCR processes in total, shared out between the extraction processes
+    "ocr_cache_path": "ezpass_index.sqlite3", # Per-page OCR results keyed by page image hash; "" disables
+    "journal_path": "ezpass_index.sqlite3", # Write-ahead job journal used to resume after a crash; "" disables
+    "retry_queue_path": "ezpass_index.sqlite3", # Background retry queue for failed moves/copies; "" retries inline instead
+    "retry_max_attempts": 8, # Attempts per move/copy before the document is reported as failed_archive
+    "retry_base_delay": 0.5, # Backoff doubles from here, with jitter...
+    "retry_max_delay": 60.0, # ...up to this many seconds between attempts
+    "retry_breaker_threshold": 3, # Consecutive failures on one destination folder before it is paused
+    "retry_breaker_cooldown": 30.0, # Seconds a paused destination is left alone
+    "search_index_path": "ezpass_search.sqlite3", # Full-text index of extracted text (python -m ezpass search); "" disables
+    "routing_enabled": False, # Split multi-patient / multi-document fax packets into one .txt per segment (see document_router.py)
+    "routing_split_pdf": False, # Also write each segment's pages as its own PDF next to its .txt
+    # Name -> regex; the first group is the identifier. A new value starts a new patient. Patterns are
+    # case-insensitive, so keep label and value on one line ([ \t], not \s) and make the MRN contain
+    # a digit: otherwise "MRN" at the end of a line reads the next line's first word as the MRN.
+    "routing_patient_patterns": {
+        "mrn": r"\b(?:MRN|Medical[ \t]+Record[ \t]+(?:No|Number))\.?[ \t]*[:#]?[ \t]*((?=[A-Z0-9-]*\d)[A-Z0-9][A-Z0-9-]{3,})",
+        "ssn4": r"\b(?:SSN|SS#|Last[ \t]*4)[ \t]*[:#]?[ \t]*(?:[*Xx]{3}-?[*Xx]{2}-?)?(\d{4})\b",
+        "dob": r"\b(?:DOB|D\.O\.B\.|Date[ \t]+of[ \t]+Birth)[ \t]*[:#]?[ \t]*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+    },
+    "routing_document_types": { # Name -> regex; a different document type starts a new segment
+        "discharge_summary": r"\bdischarge\s+summary\b",
+        "lab_results": r"\b(?:laboratory\s+report|lab(?:oratory)?\s+results)\b",
+        "radiology_report": r"\b(?:radiology|imaging)\s+report\b",
+        "progress_note": r"\bprogress\s+note\b",
+        "consult_note": r"\bconsult(?:ation)?\s+(?:note|report)\b",
+    },
+    "routing_first_page_pattern": r"\bPage\s+1\s+of\s+\d+\b", # Starts a new document; "" disables
+    "routing_label_fields": ["mrn"], # Identifiers shown in split file names (keep SSN digits out of file names)
+    "output_format": "text", # text | json | both; json is per-page blocks/lines/spans with bounding boxes and font sizes (see structured_output.py)
+    "output_sort": False, # Order each page's text top-left to bottom-right instead of PDF content order (helps some lab tables)
+    "folder_check_timeout": 5.0, # Seconds the GUI waits on its background folder check before warning that a share is slow or offline
+    "read_inputs_once": False, # Read each PDF into memory once (mmap locally, one bulk read from a share) for hashing, extraction and the failed copy
+    "input_buffer_max_mb": 256, # PDFs larger than this are opened from the folder as usual
+    "preview_cache_mb": 64, # Memory for rendered page images in the GUI results browser
+    "metrics_enabled": False, # Per-stage timings and counters (see metrics.py)
+    "metrics_textfile": "ezpass_metrics.prom", # Prometheus textfile-collector output, rewritten after every batch; "" disables
+    "metrics_http_port": 0, # Serve /metrics on 127.0.0.1:<port>; 0 disables
+    "metrics_report_folder": "", # Folder for one JSON report per batch; "" disables
+}
+
+
+def data_path(path, config_file=CONFIG_FILE):
+    # Relative data files (indexes, journals) live next to the config file they belong to
+    if not path or os.path.isabs(path):
+        return path
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), path)
+
+
+def load_settings(config_file=CONFIG_FILE):
+    # Defaults overlaid with whatever config.json provides; unknown keys are kept as-is
+    settings = dict(DEFAULT_SETTINGS)
+    if os.path.exists(config_file):
+        with open(config_file, "r") as f:
+            settings.update(json.load(f))
+    return settings
+
+
+# Settings that hold per-feed state: each extra pipeline gets its own file unless it names one
+PER_PIPELINE_DATA_FILES = ("journal_path", "retry_queue_path")
+# Folders a pipeline writes: never shared, since file names are only unique within one pipeline.
+# An extra pipeline that does not name one gets a subfolder of the top-level feed's.
+PER_PIPELINE_FOLDERS = ("output_text_folder", "archive_folder", "failed_text_extraction_folder")
+
+
+def _folder_key(folder):
+    return os.path.normcase(os.path.abspath(folder))
+
+
+def pipeline_settings(settings):
+    # Full settings dicts for every pipeline: the top-level feed first, then each "pipelines" entry
+    # laid over the top-level settings. Raises ValueError for an unusable entry.
+    primary = {key: value for key, value in settings.items() if key != "pipelines"}
+    result = [primary]
+    names = {primary["pipeline_name"]}
+    input_folders = {_folder_key(primary["input_pdf_folder"])}
+    written_folders = {key: {_folder_key(primary[key])} for key in PER_PIPELINE_FOLDERS}
+    for entry in settings.get("pipelines") or []:
+        name = entry.get("pipeline_name")
+        if not name:
+            raise ValueError("Every entry in 'pipelines' needs a pipeline_name.")
+        if name in names:
+            raise ValueError(f"Pipeline name '{name}' is used more than once.")
+        if not entry.get("input_pdf_folder"):
+            raise ValueError(f"Pipeline '{name}' has no input_pdf_folder.")
+        input_folder = _folder_key(entry["input_pdf_folder"])
+        if input_folder in input_folders:
+            raise ValueError(f"Pipeline '{name}' reads the same input folder as another pipeline.")
+        input_folders.add(input_folder)
+        pipeline = dict(primary)
+        pipeline.update({"pipeline_priority": 1, "pipeline_worker_quota": 0}) # Not inherited from the top-level feed
+        for key in PER_PIPELINE_DATA_FILES:
+            if key not in entry and pipeline[key]:
+                stem, ext = os.path.splitext(pipeline[key])
+                pipeline[key] = f"{stem}.{name}{ext}"
+        for key in PER_PIPELINE_FOLDERS:
+            if key not in entry:
+                pipeline[key] = os.path.join(primary[key], name)
+        pipeline.update(entry)
+        for key in PER_PIPELINE_FOLDERS:
+            folder = _folder_key(pipeline[key])
+            if folder in written_folders[key]:
+                raise ValueError(f"Pipeline '{name}' uses the same {key} as another pipeline.")
+            written_folders[key].add(folder)
+        names.add(name)
+        result.append(pipeline)
+    return result
+
+
+def save_settings(settings, config_file=CONFIG_FILE):
+    with open(config_file, "w") as f:
+        json.dump(settings, f, indent=4)
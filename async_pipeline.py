@@ -0,0 +1,173 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+import concurrent.futures
+import concurrent.futures.process
+from pipeline_scheduler import FairScheduler
+
+# Marks the end of a stage's input; one is queued per consumer of the next stage.
+_DONE = object()
+
+# PDFProcessor instances owned by each extraction process, by pipeline name (installed by the pool initializer).
+_worker_processors = {}
+# (message, level) status events of the document the worker is extracting; see _extract_in_worker
+_worker_events = []
+
+
+def _collect_status(message, level="info"):
+    _worker_events.append((message, level))
+
+
+def init_extract_worker(pdf_processors, worker_count=1):
+    global _worker_processors
+    # With the fork start method the instances are inherited rather than pickled, so replace the
+    # caller's status callback explicitly; it must never run (e.g. touch Tk) inside a worker.
+    # Status events are collected instead and replayed by the parent (AsyncPipeline._extract).
+    for pdf_processor in pdf_processors.values():
+        pdf_processor.status_callback = _collect_status
+        if pdf_processor.ocr_stage is not None:
+            pdf_processor.ocr_stage.split_workers(worker_count)
+    _worker_processors = pdf_processors
+
+
+def _extract_in_worker(pipeline_name, pdf_path):
+    _worker_events.clear()
+    job = _worker_processors[pipeline_name].extract_document(pdf_path)
+    job.pipeline = pipeline_name
+    job.status_events = list(_worker_events)
+    _worker_events.clear()
+    return job
+
+
+class AsyncPipeline:
+    # schedule -> extract (process pool) -> write text -> copy/move (threads), connected by bounded
+    # asyncio.Queues. Each stage runs a fixed number of tasks, so a slow archive share only fills
+    # the queue in front of the move stage and extraction keeps going until that queue is full;
+    # at most queue_size documents wait between any two stages however many PDFs arrive.
+    # Several input pipelines can share one run; FairScheduler decides whose PDF each free
+    # extraction worker takes next.
+    def __init__(self, pdf_processors, executor, extract_workers, write_workers=2, move_workers=4, queue_size=0, status_callback=None):
+        self.pdf_processors = pdf_processors # Pipeline name -> PDFProcessor
+        self.executor = executor
+        self.extract_workers = max(1, int(extract_workers))
+        self.write_workers = max(1, int(write_workers))
+        self.move_workers = max(1, int(move_workers))
+        self.queue_size = int(queue_size) if queue_size else 2 * self.extract_workers
+        self.status_callback = status_callback
+        self.pool_broken = False
+        self._cancelled = threading.Event()
+
+    def _send_status(self, message, level="info"):
+        if self.status_callback:
+            self.status_callback(message, level)
+
+    def iter_results(self, sources):
+        # Synchronous front end: runs the event loop on its own thread and yields
+        # (pipeline name, (result_type, base_name, error_details), stats) in completion order.
+        # sources: (pipeline name, pdf_paths, priority, worker_quota) tuples, see FairScheduler
+        results = queue.SimpleQueue()
+
+        def run_loop():
+            try:
+                asyncio.run(self.run(sources, results.put))
+            except BaseException as e:
+                results.put(e)
+            finally:
+                results.put(_DONE)
+
+        self._cancelled.clear()
+        thread = threading.Thread(target=run_loop, name="ingestion-pipeline", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Caller stopped early: let documents already in flight finish, take no new ones
+            self._cancelled.set()
+            thread.join()
+
+    async def run(self, sources, emit):
+        loop = asyncio.get_running_loop()
+        scheduler = FairScheduler(sources, self.extract_workers, self._cancelled)
+        scheduler.start(loop)
+        extracted = asyncio.Queue(self.queue_size)
+        written = asyncio.Queue(self.queue_size)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.write_workers + self.move_workers,
+                                                       thread_name_prefix="pipeline-io") as io_executor:
+                await asyncio.gather(
+                    self._stage(self.extract_workers, self.write_workers, extracted,
+                                lambda: self._extract(loop, scheduler, extracted, emit)),
+                    self._stage(self.write_workers, self.move_workers, written,
+                                lambda: self._write(loop, io_executor, extracted, written)),
+                    self._stage(self.move_workers, 0, None,
+                                lambda: self._move(loop, io_executor, written, emit)),
+                )
+        finally:
+            scheduler.stop()
+
+    async def _stage(self, task_count, next_task_count, outbox, make_task):
+        await asyncio.gather(*(make_task() for _ in range(task_count)))
+        for _ in range(next_task_count):
+            await outbox.put(_DONE)
+
+    async def _extract(self, loop, scheduler, outbox, emit):
+        while True:
+            picked = await scheduler.acquire() # Waits here while this pipeline is at its quota or has no input
+            if picked is None:
+                return
+            pipeline_name, pdf_path = picked
+            started = time.perf_counter()
+            try:
+                job = await loop.run_in_executor(self.executor, _extract_in_worker, pipeline_name, pdf_path)
+            except Exception as e:
+                # A worker that dies (e.g. a PDF that crashes MuPDF) must not sink the whole batch
+                if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+                    self.pool_broken = True
+                base_name = os.path.basename(pdf_path)
+                self._send_status(f"Worker failed while processing {base_name}: {e}", "error")
+                emit((pipeline_name, ("failed", base_name, str(e)), None))
+                continue
+            finally:
+                await scheduler.release(pipeline_name, pdf_path, time.perf_counter() - started)
+            self._replay_status(job)
+            await outbox.put(job)
+
+    def _replay_status(self, job):
+        # What the worker process reported while extracting, through this process's status callback
+        pdf_processor = self.pdf_processors[job.pipeline]
+        for message, level in job.status_events or ():
+            pdf_processor._send_status(message, level)
+        job.status_events = None
+
+    async def _write(self, loop, io_executor, inbox, outbox):
+        while True:
+            job = await inbox.get()
+            if job is _DONE:
+                return
+            try:
+                await loop.run_in_executor(io_executor, self.pdf_processors[job.pipeline].write_text, job)
+            except Exception as e:
+                self._send_status(f"Unexpected error writing text for {job.base_name}: {e}", "error")
+                job.result_type = "failed"
+                job.error_details = str(e)
+            await outbox.put(job)
+
+    async def _move(self, loop, io_executor, inbox, emit):
+        while True:
+            job = await inbox.get()
+            if job is _DONE:
+                return
+            try:
+                result_tuple = await loop.run_in_executor(io_executor, self.pdf_processors[job.pipeline].finish_document, job)
+            except Exception as e:
+                self._send_status(f"Unexpected error archiving {job.base_name}: {e}", "error")
+                result_tuple = ("failed", job.base_name, str(e))
+            emit((job.pipeline, result_tuple, job.stats))
@@ -0,0 +1,314 @@
+import os
+import time
+import queue
+import itertools
+import threading
+import concurrent.futures
+
+
+def resolve_worker_count(max_workers):
+    # 0 or None means "use every core"
+    try:
+        max_workers = int(max_workers or 0)
+    except (TypeError, ValueError):
+        max_workers = 0
+    if max_workers <= 0:
+        max_workers = os.cpu_count() or 1
+    return max_workers
+
+
+DEFAULT_PIPELINE = "default"
+METRICS_FLUSH_SECONDS = 15.0 # How often a long-running batch (watch mode) rewrites the metrics textfile
+SETTLE_POLL_SECONDS = 1.0 # How often held documents are checked against the retry queue while no new result arrives
+_DONE = object()
+
+
+class BatchSummary:
+    def __init__(self):
+        self.total_files = 0
+        self.processed_count = 0
+        self.no_text_count = 0
+        self.failed_count = 0
+        self.duplicate_count = 0
+        self.ocr_pages = 0
+        self.ocr_seconds = 0.0
+        self.ocr_cache_hits = 0
+
+    def add(self, result_tuple, stats=None):
+        status_type = result_tuple[0]
+        self.total_files += 1
+        if status_type == "success":
+            self.processed_count += 1
+        elif status_type == "no_text":
+            self.no_text_count += 1
+        elif status_type == "failed" or status_type == "failed_archive":
+            self.failed_count += 1
+        elif status_type == "duplicate":
+            self.duplicate_count += 1
+
+        if stats:
+            self.ocr_pages += stats.get("ocr_pages", 0)
+            self.ocr_seconds += stats.get("ocr_seconds", 0.0)
+            self.ocr_cache_hits += stats.get("ocr_cache_hits", 0)
+
+    def merge(self, other):
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def ocr_report(self):
+        if not self.ocr_pages and not self.ocr_cache_hits:
+            return ""
+        per_page = self.ocr_seconds / self.ocr_pages if self.ocr_pages else 0.0
+        return (f"OCR: {self.ocr_pages} page(s) in {self.ocr_seconds:.1f}s ({per_page:.2f}s per page), "
+                f"{self.ocr_cache_hits} page(s) from cache")
+
+
+class BatchProcessor:
+    def __init__(self, pdf_processor, max_workers=None, status_callback=None, metrics=None, write_workers=2, move_workers=4, queue_size=0):
+        # pdf_processor: a PDFProcessor, or a list of pipeline_scheduler.Pipeline sharing one pool
+        # of max_workers extraction processes
+        pipelines = pdf_processor if isinstance(pdf_processor, (list, tuple)) else None
+        if pipelines:
+            self.pdf_processors = {pipeline.name: pipeline.pdf_processor for pipeline in pipelines}
+            self._shares = {pipeline.name: (pipeline.priority, pipeline.worker_quota) for pipeline in pipelines}
+        else:
+            self.pdf_processors = {DEFAULT_PIPELINE: pdf_processor}
+            self._shares = {DEFAULT_PIPELINE: (1, 0)}
+        self.pdf_processor = next(iter(self.pdf_processors.values())) # The first pipeline's, for single-feed callers
+        self.max_workers = resolve_worker_count(max_workers)
+        self.status_callback = status_callback
+        self.metrics = metrics # Optional metrics.PipelineMetrics; each run_with_stats() call is one batch
+        # Pipeline stage sizes (see AsyncPipeline); only used when extracting in worker processes
+        self.write_workers = write_workers
+        self.move_workers = move_workers
+        self.queue_size = queue_size
+        self._executor = None
+
+    @classmethod
+    def from_settings(cls, pdf_processor, settings, status_callback=None, metrics=None):
+        return cls(
+            pdf_processor,
+            max_workers=settings["max_workers"],
+            status_callback=status_callback,
+            metrics=metrics,
+            write_workers=settings["pipeline_write_workers"],
+            move_workers=settings["pipeline_move_workers"],
+            queue_size=settings["pipeline_queue_size"]
+        )
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _send_status(self, message, level="info"):
+        if self.status_callback:
+            self.status_callback(message, level)
+
+    def _new_executor(self, worker_count):
+        # async_pipeline (and asyncio with it) is imported on first use, not when the GUI starts
+        from async_pipeline import init_extract_worker
+        return concurrent.futures.ProcessPoolExecutor(max_workers=worker_count,
+                                                      initializer=init_extract_worker,
+                                                      initargs=(self.pdf_processors, worker_count))
+
+    def open(self):
+        # Keeps one pool alive across run() calls (watch mode) instead of spawning workers per batch
+        if self._executor is None and self.max_workers > 1:
+            self._executor = self._new_executor(self.max_workers)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for retry_queue in self._retry_queues().values():
+            retry_queue.stop() # Whatever is still queued stays on disk for the next run
+
+    def _retry_queues(self):
+        return {name: pdf_processor.retry_queue for name, pdf_processor in self.pdf_processors.items()
+                if pdf_processor.retry_queue is not None}
+
+    def run(self, pdf_paths):
+        # Yields (result_type, base_name, error_details) tuples in completion order.
+        for result_tuple, _stats in self.run_with_stats(pdf_paths):
+            yield result_tuple
+
+    def run_with_stats(self, pdf_paths):
+        # Same as run(), paired with each document's PDFProcessor.last_document_stats
+        first_pipeline = next(iter(self.pdf_processors))
+        for _pipeline_name, result_tuple, stats in self.run_pipelines([(first_pipeline, pdf_paths)]):
+            yield result_tuple, stats
+
+    def run_pipelines(self, sources):
+        # sources: (pipeline name, pdf_paths) pairs, all processed in one run on the shared worker
+        # pool with each pipeline's priority and worker quota. Yields (pipeline name, result tuple,
+        # stats) in completion order.
+        retry_queues = self._retry_queues()
+        if retry_queues:
+            sources = [(name, self._skip_queued_moves(retry_queues.get(name), pdf_paths)) for name, pdf_paths in sources]
+        results = self._run_with_stats(sources)
+        if retry_queues:
+            results = self._with_deferred_moves(results)
+        if self.metrics is None:
+            yield from results
+            return
+
+        self.metrics.start_batch()
+        last_flush = time.monotonic()
+        try:
+            for pipeline_name, result_tuple, stats in results:
+                self.metrics.observe_document(result_tuple, stats)
+                if time.monotonic() - last_flush >= METRICS_FLUSH_SECONDS:
+                    # A watch-mode run never ends; keep the textfile current in the meantime
+                    self._write_metrics_textfile()
+                    last_flush = time.monotonic()
+                yield pipeline_name, result_tuple, stats
+        finally:
+            try:
+                self.metrics.end_batch()
+            except OSError as e:
+                self._send_status(f"Could not write metrics: {e}", "warning")
+
+    def _write_metrics_textfile(self):
+        try:
+            self.metrics.write_textfile()
+        except OSError as e:
+            self._send_status(f"Could not write metrics: {e}", "warning")
+
+    def _with_deferred_moves(self, results):
+        # Documents whose move/copy went to the retry queue are held back until the queue settles
+        # them, so callers still see failed_archive when the archive move finally gives up
+        retry_queues = self._retry_queues()
+        for retry_queue in retry_queues.values():
+            retry_queue.start(self.status_callback)
+        held = {} # (pipeline name, group id) -> (result_tuple, stats)
+        # In watch mode the next result can be hours away; ticks release settled documents meanwhile
+        for item in self._with_ticks(results, SETTLE_POLL_SECONDS):
+            if item is None:
+                yield from self._settled(held)
+                continue
+            pipeline_name, result_tuple, stats = item
+            group_id = stats.get("deferred_moves") if stats else None
+            if group_id:
+                held[(pipeline_name, group_id)] = (result_tuple, stats)
+                retry_queues[pipeline_name].wake()
+            else:
+                yield pipeline_name, result_tuple, stats
+            yield from self._settled(held)
+
+        for retry_queue in retry_queues.values():
+            if retry_queue.pending_count():
+                self._send_status(f"Waiting for {retry_queue.pending_count()} queued file move(s)/copies to finish...")
+                retry_queue.wait_idle()
+        yield from self._settled(held)
+
+    def _with_ticks(self, results, interval):
+        # Yields the items of `results`, plus None whenever `interval` seconds pass without one.
+        # results is pulled on a thread of its own, at most one item ahead of the caller.
+        items = queue.Queue(maxsize=1)
+        stopped = threading.Event()
+
+        def offer(item):
+            while not stopped.is_set():
+                try:
+                    items.put(item, timeout=interval)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def pump():
+            try:
+                for item in results:
+                    if not offer(item):
+                        return
+                offer(_DONE)
+            except BaseException as e:
+                offer(e)
+            finally:
+                results.close() # Caller stopped early: documents in flight finish, no new ones start
+
+        thread = threading.Thread(target=pump, name="batch-results", daemon=True)
+        thread.start()
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=interval)
+                except queue.Empty:
+                    yield None
+                    continue
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Not joined: in watch mode the pump may be waiting on the input folder, and notices
+            # `stopped` as soon as it has its next result
+            stopped.set()
+
+    def _skip_queued_moves(self, retry_queue, pdf_paths):
+        # A PDF whose archive move is still in the retry queue (from this run or an earlier one) is
+        # already processed; it only looks new because the move has not gone through yet
+        for pdf_path in pdf_paths:
+            if retry_queue is not None and retry_queue.has_queued_move(pdf_path):
+                self._send_status(f"Skipping {os.path.basename(pdf_path)}: its archive move is queued for retry.", "debug")
+                continue
+            yield pdf_path
+
+    def _settled(self, held):
+        for pipeline_name, group_id in list(held):
+            pdf_processor = self.pdf_processors[pipeline_name]
+            outcome = pdf_processor.retry_queue.take_outcome(group_id)
+            if outcome is None:
+                continue
+            pdf_processor.settle_deferred(group_id)
+            result_tuple, stats = held.pop((pipeline_name, group_id))
+            if outcome == "failed" and result_tuple[0] != "failed":
+                result_tuple = ("failed_archive", result_tuple[1], "Could not archive original PDF.")
+            yield pipeline_name, result_tuple, stats
+
+    def _run_with_stats(self, sources):
+        # pdf_paths may be lazy iterators (InputDiscovery.discover, FolderWatcher streams); they are
+        # never read further ahead than the pipeline's queues allow
+        sources = [(name, pdf_paths) + self._shares[name] for name, pdf_paths in sources]
+        if self._executor is not None:
+            yield from self._run_on(self._executor, self.max_workers, sources)
+            return
+
+        if len(sources) == 1:
+            # Only look far enough ahead to know whether more than one worker process is worth starting
+            name, pdf_paths, priority, worker_quota = sources[0]
+            pdf_paths = iter(pdf_paths)
+            head = list(itertools.islice(pdf_paths, self.max_workers))
+            pdf_paths = itertools.chain(head, pdf_paths)
+            sources = [(name, pdf_paths, priority, worker_quota)]
+            worker_count = min(self.max_workers, len(head))
+            if worker_count <= 1:
+                pdf_processor = self.pdf_processors[name]
+                for pdf_path in pdf_paths:
+                    result_tuple = pdf_processor.process_pdf(pdf_path)
+                    yield name, result_tuple, pdf_processor.last_document_stats
+                return
+        else:
+            worker_count = self.max_workers
+
+        self._send_status(f"Processing PDF files with {worker_count} worker processes.")
+        with self._new_executor(worker_count) as executor:
+            yield from self._run_on(executor, worker_count, sources)
+
+    def _run_on(self, executor, worker_count, sources):
+        # Extraction runs in the worker processes; text writes and archive moves run on threads
+        # here, so share I/O overlaps with extraction instead of holding up a worker
+        from async_pipeline import AsyncPipeline
+        pipeline = AsyncPipeline(self.pdf_processors, executor, worker_count,
+                                 write_workers=self.write_workers, move_workers=self.move_workers,
+                                 queue_size=self.queue_size, status_callback=self.status_callback)
+        yield from pipeline.iter_results(sources)
+
+        if pipeline.pool_broken and executor is self._executor:
+            # A broken pool rejects all further work; replace it so watch mode keeps running
+            self._executor.shutdown(wait=False)
+            self._executor = self._new_executor(self.max_workers)
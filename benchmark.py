@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import random
+import argparse
+import platform
+import tempfile
+import multiprocessing
+import fitz # PyMuPDF
+import app_config
+from pdf_processor import PDFProcessor
+from batch_processor import BatchProcessor, BatchSummary
+
+# Throughput benchmark for the extraction pipeline.
+#
+#   python benchmark.py --out results.json
+#   python benchmark.py --out new.json --baseline results.json
+#
+# A synthetic fax corpus is generated into a temp folder and pushed through the same
+# BatchProcessor/PDFProcessor path the GUI and CLI use, with the pipeline settings from
+# config.json (folders and index files are redirected into the temp folder).
+
+# (kind, pages per document, number of documents) at --scale 1
+CORPUS_PROFILE = [
+    ("text", 1, 40),
+    ("text", 20, 10),
+    ("text", 500, 1),
+    ("image", 1, 10),
+    ("image", 5, 4),
+    ("mixed", 10, 5),
+    ("corrupt", 0, 3),
+]
+
+FAX_LINES = [
+    "FACSIMILE TRANSMITTAL - CONFIDENTIAL PATIENT INFORMATION",
+    "Patient: TEST, PATIENT {doc}   MRN: {mrn}   DOB: 01/01/1950",
+    "Page {page} of {pages}",
+    "Reason for referral: follow-up after discharge, labs attached.",
+    "HGB 13.2 g/dL   WBC 7.1 K/uL   PLT 250 K/uL   NA 139 mmol/L   K 4.1 mmol/L",
+]
+
+
+FILLER_TEXT = "\n".join(f"Line {i:02d}: " + "lorem ipsum clinical note text " * 3 for i in range(40))
+
+
+def _write_text_page(page, doc_index, page_num, pages):
+    header = "\n".join(line.format(doc=doc_index, mrn=100000 + doc_index, page=page_num + 1, pages=pages) for line in FAX_LINES)
+    page.insert_text((72, 72), header, fontsize=10)
+    # Fill the page roughly like a typed report so text volume per page is realistic
+    page.insert_text((72, 160), FILLER_TEXT, fontsize=8)
+
+
+def _scanned_page_image():
+    # One rendered text page reused as the "scan" for every image-only page
+    doc = fitz.open()
+    _write_text_page(doc.new_page(), 0, 0, 1)
+    png = doc[0].get_pixmap(dpi=100, colorspace=fitz.csGRAY).tobytes("png")
+    doc.close()
+    return png
+
+
+def generate_corpus(folder, scale=1.0, seed=1234):
+    # Returns {kind: number of documents written}
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    scan_png = _scanned_page_image()
+    truncated_pdf = None
+    counts = {}
+    doc_index = 0
+
+    for kind, pages, count in CORPUS_PROFILE:
+        count = max(1, int(round(count * scale)))
+        counts[kind] = counts.get(kind, 0) + count
+        for _ in range(count):
+            doc_index += 1
+            path = os.path.join(folder, f"{kind}_{pages}p_{doc_index:05d}.pdf")
+            if kind == "corrupt":
+                # Truncated transfers and plain garbage both show up in fax queues
+                if truncated_pdf is None:
+                    doc = fitz.open()
+                    _write_text_page(doc.new_page(), doc_index, 0, 1)
+                    full_pdf = doc.tobytes()
+                    doc.close()
+                    truncated_pdf = full_pdf[:len(full_pdf) // 3]
+                    data = truncated_pdf
+                else:
+                    data = b"%PDF-1.7\n" + bytes(rng.getrandbits(8) for _ in range(2048))
+                with open(path, "wb") as f:
+                    f.write(data)
+                continue
+
+            doc = fitz.open()
+            for page_num in range(pages):
+                page = doc.new_page()
+                is_image = kind == "image" or (kind == "mixed" and page_num % 2 == 1)
+                if is_image:
+                    page.insert_image(page.rect, stream=scan_png)
+                else:
+                    _write_text_page(page, doc_index, page_num, pages)
+            doc.save(path, garbage=1, deflate=True)
+            doc.close()
+    return counts
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile; values need not be sorted
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process and of its (finished) worker processes
+    try:
+        import resource
+    except ImportError: # Windows
+        return None, None
+    scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0 # ru_maxrss is bytes on macOS, KiB elsewhere
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+
+def run_benchmark(settings, work_dir, scale=1.0):
+    input_folder = os.path.join(work_dir, "input")
+    corpus_started = time.perf_counter()
+    corpus = generate_corpus(input_folder, scale)
+    corpus_seconds = time.perf_counter() - corpus_started
+
+    settings = dict(settings)
+    settings.update({
+        "input_pdf_folder": input_folder,
+        "output_text_folder": os.path.join(work_dir, "output"),
+        "archive_folder": os.path.join(work_dir, "archive"),
+        "failed_text_extraction_folder": os.path.join(work_dir, "failed"),
+        "status_log_level": "error",
+    })
+    for key in ("dedup_index_path", "ocr_cache_path", "journal_path", "retry_queue_path", "search_index_path"):
+        if settings.get(key):
+            settings[key] = os.path.join(work_dir, os.path.basename(settings[key]))
+
+    pdf_processor = PDFProcessor.from_settings(settings, config_file=os.path.join(work_dir, "config.json"))
+    batch = BatchProcessor.from_settings(pdf_processor, settings)
+    pdf_paths = sorted(os.path.join(input_folder, f) for f in os.listdir(input_folder))
+
+    summary = BatchSummary()
+    latencies = []
+    pages = 0
+    move_seconds = 0.0
+    started = time.perf_counter()
+    for result_tuple, stats in batch.run_with_stats(pdf_paths):
+        summary.add(result_tuple, stats)
+        if stats:
+            latencies.append(stats["seconds"])
+            pages += stats["pages"]
+            move_seconds += stats["move_seconds"]
+    wall_seconds = time.perf_counter() - started
+
+    rss_main, rss_workers = peak_rss_mb()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "max_workers": batch.max_workers,
+        "ocr_enabled": bool(settings["ocr_enabled"]),
+        "corpus": {"documents": len(pdf_paths), "by_kind": corpus, "scale": scale, "generation_seconds": round(corpus_seconds, 3)},
+        "results": {
+            "wall_seconds": round(wall_seconds, 3),
+            "docs_per_sec": round(len(pdf_paths) / wall_seconds, 3) if wall_seconds else 0.0,
+            "pages_per_sec": round(pages / wall_seconds, 3) if wall_seconds else 0.0,
+            "pages": pages,
+            "latency_p50": round(percentile(latencies, 50), 4),
+            "latency_p95": round(percentile(latencies, 95), 4),
+            "latency_p99": round(percentile(latencies, 99), 4),
+            "move_seconds": round(move_seconds, 3),
+            "peak_rss_mb": rss_main,
+            "peak_worker_rss_mb": rss_workers,
+            "success": summary.processed_count,
+            "no_text": summary.no_text_count,
+            "failed": summary.failed_count,
+            "ocr_pages": summary.ocr_pages,
+            "ocr_seconds": round(summary.ocr_seconds, 3),
+        },
+    }
+
+
+# Metrics compared against a baseline: name -> True if higher is better
+COMPARED_METRICS = {
+    "docs_per_sec": True,
+    "pages_per_sec": True,
+    "latency_p50": False,
+    "latency_p95": False,
+    "latency_p99": False,
+    "peak_rss_mb": False,
+}
+
+
+def compare(report, baseline, max_regression):
+    # Prints the change per metric; returns the names of metrics that regressed past the threshold
+    regressions = []
+    for name, higher_is_better in COMPARED_METRICS.items():
+        new = report["results"].get(name)
+        old = baseline.get("results", {}).get(name)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        marker = "REGRESSION" if worse > max_regression else ""
+        print(f"  {name:15} {old:>12} -> {new:>12}  ({change:+.1%}) {marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PDF extraction pipeline on a synthetic fax corpus.")
+    parser.add_argument("--config", default=app_config.CONFIG_FILE, help="Pipeline settings to benchmark (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="Override max_workers")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply the number of documents of every kind")
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Compare against a previous JSON report")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="Allowed slowdown vs. baseline before exiting non-zero (default: %(default)s)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temp folder with the corpus and outputs")
+    args = parser.parse_args(argv)
+
+    settings = app_config.load_settings(args.config)
+    if args.workers is not None:
+        settings["max_workers"] = args.workers
+
+    work_dir = tempfile.mkdtemp(prefix="ezpass_bench_")
+    try:
+        report = run_benchmark(settings, work_dir, args.scale)
+    finally:
+        if args.keep:
+            print(f"Benchmark files kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline} ({baseline.get('timestamp', 'unknown date')}):")
+        if compare(report, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,33 @@
+import os
+
+import fitz # PyMuPDF
+
+
+def write_pdf(path, page_texts):
+    # One page per text; an empty text makes a page with nothing on it (a scan without OCR)
+    doc = fitz.open()
+    for text in page_texts:
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+
+class Crash(BaseException):
+    # Stands in for the process being killed: no `except Exception` cleanup runs
+    pass
+
+
+def failing_replace(monkeypatch, fail_on_call, error):
+    # os.replace that raises `error` on its fail_on_call-th call
+    real_replace = os.replace
+    calls = []
+
+    def replace(src, dst):
+        calls.append(src)
+        if len(calls) == fail_on_call:
+            raise error
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", replace)
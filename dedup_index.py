@@ -0,0 +1,105 @@
+import time
+import hashlib
+from sqlite_connections import SqliteConnections
+
+HASH_CHUNK_SIZE = 1024 * 1024 # Hash in 1 MiB reads so large packets never sit in memory whole
+
+
+def sha256_file(path, chunk_size=HASH_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sha256_data(data):
+    # Same digest as sha256_file, for a PDF already in memory (file_ops.InputBuffer)
+    return hashlib.sha256(data).hexdigest()
+
+
+PROCESSING = "processing" # result_type of a claim() row whose extraction has not finished yet
+
+
+def _create_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            sha256 TEXT PRIMARY KEY,
+            source_name TEXT NOT NULL,
+            result_type TEXT NOT NULL,
+            output_path TEXT,
+            page_count INTEGER,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL,
+            seen_count INTEGER NOT NULL DEFAULT 1
+        )""")
+
+
+class DedupIndex:
+    # On-disk record of every PDF whose extraction finished, keyed by SHA-256 of its bytes.
+    # Safe to share between batch worker processes: each process opens its own connection.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._connections = SqliteConnections(db_path, _create_tables)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def lookup(self, sha256):
+        row = self._connection().execute("SELECT * FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, sha256, source_name):
+        # Lookup and claim in one statement, so two copies of a PDF arriving together cannot both
+        # miss: returns None when this caller inserted the PROCESSING row (record() or release()
+        # it later), or the record that was already there, in which case this copy is a duplicate
+        conn = self._connection()
+        while True:
+            now = time.time()
+            with conn:
+                cursor = conn.execute("""
+                    INSERT OR IGNORE INTO documents (sha256, source_name, result_type, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?)""", (sha256, source_name, PROCESSING, now, now))
+            if cursor.rowcount:
+                return None
+            previous = self.lookup(sha256)
+            if previous is not None:
+                return previous
+            # Released between the two statements; try again
+
+    def release(self, sha256):
+        # Gives up a claim whose extraction failed, so the next copy of the PDF is tried again
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM documents WHERE sha256 = ? AND result_type = ?", (sha256, PROCESSING))
+
+    def release_claims(self):
+        # Claims left by a run that crashed mid-extraction; only safe before any batch starts
+        conn = self._connection()
+        with conn:
+            return conn.execute("DELETE FROM documents WHERE result_type = ?", (PROCESSING,)).rowcount
+
+    def record(self, sha256, source_name, result_type, output_path=None, page_count=None):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("""
+                INSERT INTO documents (sha256, source_name, result_type, output_path, page_count, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET
+                    source_name = excluded.source_name,
+                    result_type = excluded.result_type,
+                    output_path = excluded.output_path,
+                    page_count = excluded.page_count,
+                    last_seen = excluded.last_seen,
+                    seen_count = seen_count + (documents.result_type != ?)""",
+                (sha256, source_name, result_type, output_path, page_count, now, now, PROCESSING))
+
+    def mark_seen(self, sha256):
+        conn = self._connection()
+        with conn:
+            conn.execute("UPDATE documents SET last_seen = ?, seen_count = seen_count + 1 WHERE sha256 = ?",
+                         (time.time(), sha256))
+
+    def close(self):
+        self._connections.close()
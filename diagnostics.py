@@ -0,0 +1,86 @@
+import os
+import re
+import sys
+import time
+import threading
+import subprocess
+
+# "import time:  self [us] | cumulative | <2 spaces per nesting level>module"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( +)(\S+)\s*$")
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_time_profile(module="gui", python=sys.executable, timeout=120):
+    # Imports `module` in a fresh interpreter under -X importtime, so nothing is already cached in
+    # sys.modules. Returns (entries, error): entries are (module, self seconds, cumulative seconds,
+    # nesting depth) in import order; error is the interpreter's last stderr line if the import failed.
+    completed = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=APP_DIR, capture_output=True, text=True, timeout=timeout)
+    entries = []
+    other_lines = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6, (len(indent) - 1) // 2))
+        elif line.strip() and not line.startswith("import time:"):
+            other_lines.append(line.strip())
+    error = other_lines[-1] if completed.returncode != 0 and other_lines else None
+    return entries, error
+
+
+def _module_scope(module, entries):
+    # The entries that belong to importing `module` itself, without the interpreter's own startup
+    # imports (site, encodings...) that -X importtime also lists. Entries come in completion order,
+    # so the module's own line closes its block; without one (failed import) the last block is used.
+    end = len(entries)
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index][3] == 0 and entries[index][0] == module:
+            end = index + 1
+            break
+    start = 0
+    for index in range(end - 2, -1, -1):
+        if entries[index][3] == 0:
+            start = index + 1
+            break
+    return entries[start:end]
+
+
+def format_import_report(module, entries, error=None, top=15):
+    scope = _module_scope(module, entries)
+    total = sum(cumulative for _name, _self, cumulative, depth in scope if depth == 0)
+    lines = [f"Import time for '{module}': {total * 1000:.1f} ms in {len(scope)} module(s)"]
+    if error:
+        lines.append(f"  Import failed: {error}")
+    lines.append(f"Slowest modules by own time (top {top}):")
+    for name, self_seconds, _cumulative, _depth in sorted(scope, key=lambda entry: entry[1], reverse=True)[:top]:
+        lines.append(f"  {self_seconds * 1000:8.1f} ms  {name}")
+    lines.append(f"Modules imported directly by '{module}', including everything they import:")
+    for name, _self, cumulative, depth in sorted(scope, key=lambda entry: entry[2], reverse=True):
+        if depth == 1:
+            lines.append(f"  {cumulative * 1000:8.1f} ms  {name}")
+    return "\n".join(lines)
+
+
+def check_folders(folders, timeout=5.0, create=True):
+    # Creates (or just stats) each folder on a background thread and waits at most `timeout` seconds
+    # overall, so an unreachable share is reported instead of hanging the caller. Returns
+    # {folder: (seconds, error)}; seconds is None for folders that had not answered in time.
+    results = {}
+
+    def check():
+        for folder in folders:
+            started = time.perf_counter()
+            try:
+                if create:
+                    os.makedirs(folder, exist_ok=True)
+                elif not os.path.isdir(folder):
+                    raise FileNotFoundError(f"'{folder}' is not a folder")
+                results[folder] = (time.perf_counter() - started, None)
+            except OSError as e:
+                results[folder] = (time.perf_counter() - started, str(e))
+
+    worker = threading.Thread(target=check, name="folder-check", daemon=True)
+    worker.start()
+    worker.join(timeout)
+    return {folder: results.get(folder, (None, "no answer within the timeout")) for folder in folders}
@@ -0,0 +1,141 @@
+import re
+
+_UNSAFE_FILE_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]+')
+
+
+def _normalize(value):
+    # "MRN 0012-345" and "mrn 0012345" name the same patient
+    return re.sub(r"[^0-9A-Za-z]", "", value).upper()
+
+
+class Segment:
+    # A run of pages (not necessarily contiguous once a patient comes back later in the packet)
+    # that belong to one patient and one document type
+    def __init__(self, number, identifiers=None, doc_type=None):
+        self.number = number
+        self.identifiers = dict(identifiers or {}) # pattern name -> (normalized value, value as printed)
+        self.doc_type = doc_type
+        self.pages = [] # 0-based page numbers
+
+    def conflicts_with(self, identifiers):
+        return any(name in self.identifiers and self.identifiers[name][0] != value[0]
+                   for name, value in identifiers.items())
+
+    def matches(self, identifiers, doc_type):
+        if doc_type and self.doc_type and doc_type != self.doc_type:
+            return False
+        return bool(identifiers) and not self.conflicts_with(identifiers) and \
+            any(name in self.identifiers for name in identifiers)
+
+    def label(self, label_fields):
+        parts = [f"{name.upper()} {self.identifiers[name][1]}" for name in label_fields if name in self.identifiers]
+        if self.doc_type:
+            parts.append(self.doc_type.replace("_", " "))
+        return _UNSAFE_FILE_CHARS.sub("-", ", ".join(parts)).strip(" .")
+
+    def page_runs(self):
+        # Contiguous (first, last) page ranges, for fitz insert_pdf
+        runs = []
+        for page in self.pages:
+            if runs and runs[-1][1] == page - 1:
+                runs[-1][1] = page
+            else:
+                runs.append([page, page])
+        return [tuple(run) for run in runs]
+
+
+class DocumentSplit:
+    # Assigns the pages of one PDF to segments as they are extracted; one call per page, in order
+    def __init__(self, router):
+        self.router = router
+        self.segments = []
+        self._current = None
+
+    def _start(self, identifiers, doc_type):
+        segment = Segment(len(self.segments) + 1, identifiers, doc_type)
+        self.segments.append(segment)
+        return segment
+
+    def assign(self, page_num, page_text):
+        identifiers, doc_type, first_page = self.router.scan(page_text)
+        current = self._current
+        if current is None:
+            current = self._start(identifiers, doc_type)
+        elif current.conflicts_with(identifiers):
+            # A different patient: go back to an earlier segment of theirs, or start a new one
+            current = next((segment for segment in self.segments if segment.matches(identifiers, doc_type)), None) \
+                or self._start(identifiers, doc_type)
+        elif first_page and current.pages:
+            current = self._start(identifiers, doc_type)
+        elif doc_type and current.doc_type and doc_type != current.doc_type:
+            # Same patient, next document in the packet
+            current = self._start(dict(current.identifiers, **identifiers), doc_type)
+        for name, value in identifiers.items():
+            current.identifiers.setdefault(name, value)
+        current.doc_type = current.doc_type or doc_type
+        current.pages.append(page_num)
+        self._current = current
+        return current
+
+
+class DocumentRouter:
+    # Splits multi-patient / multi-document fax packets. Every pattern is folded into one
+    # alternation compiled when the router is built (once per batch, and once per worker process
+    # when it is unpickled), so each page's text is scanned once whatever the number of patterns.
+    # Patient patterns should capture the identifier in their first group, e.g. r"MRN[:# \t]*(\d+)".
+    def __init__(self, patient_patterns, document_types=None, first_page_pattern=None, label_fields=(), split_pdf=False):
+        self.label_fields = tuple(label_fields)
+        self.split_pdf = split_pdf
+        self._kinds = {} # alternation group name -> ("patient" | "doc_type" | "first_page", configured name, value group)
+        parts = []
+
+        def add(kind, name, pattern):
+            group = f"g{len(self._kinds)}"
+            inner_groups = re.compile(pattern).groups # Also rejects an invalid pattern with its own name in the error
+            self._kinds[group] = (kind, name, inner_groups)
+            parts.append(f"(?P<{group}>{pattern})")
+
+        for name, pattern in patient_patterns.items():
+            add("patient", name, pattern)
+        for name, pattern in (document_types or {}).items():
+            add("doc_type", name, pattern)
+        if first_page_pattern:
+            add("first_page", "first_page", first_page_pattern)
+        self._pattern = re.compile("|".join(parts), re.IGNORECASE | re.MULTILINE) if parts else None
+        # The identifier is the first group inside each alternative, or the whole match without one
+        self._value_groups = {group: self._pattern.groupindex[group] + (1 if inner_groups else 0)
+                              for group, (_kind, _name, inner_groups) in self._kinds.items()}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            settings["routing_patient_patterns"],
+            document_types=settings["routing_document_types"],
+            first_page_pattern=settings["routing_first_page_pattern"],
+            label_fields=settings["routing_label_fields"],
+            split_pdf=settings["routing_split_pdf"]
+        )
+
+    def scan(self, page_text):
+        # Returns (identifiers, document type or None, starts a new document) for one page; the first
+        # occurrence of each identifier and document type on the page wins
+        identifiers = {}
+        doc_type = None
+        first_page = False
+        if self._pattern is None or not page_text:
+            return identifiers, doc_type, first_page
+        for match in self._pattern.finditer(page_text):
+            group = match.lastgroup
+            kind, name, _inner_groups = self._kinds[group]
+            if kind == "patient":
+                value = (match.group(self._value_groups[group]) or "").strip()
+                if value and name not in identifiers:
+                    identifiers[name] = (_normalize(value), value)
+            elif kind == "doc_type":
+                doc_type = doc_type or name
+            else:
+                first_page = True
+        return identifiers, doc_type, first_page
+
+    def new_split(self):
+        return DocumentSplit(self)
@@ -0,0 +1,260 @@
+import sys
+import time
+import signal
+import argparse
+import threading
+import multiprocessing
+import app_config
+from pipeline_scheduler import create_pipelines
+from batch_processor import BatchProcessor, BatchSummary
+from folder_watcher import FolderWatcher
+from input_discovery import InputDiscovery
+from status_bus import LEVELS
+from metrics import create_metrics
+from search_index import SearchIndex
+import diagnostics
+
+# Headless entry point: `python -m ezpass process` for a one-off batch,
+# `python -m ezpass watch` to run as a long-lived service on the input folder.
+# `python -m ezpass diagnostics` profiles the desktop app's imports and times the configured folders.
+
+
+def print_status(message, level="info"):
+    # One write per line: pipeline threads report concurrently and print() would interleave them
+    sys.stdout.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {level.upper():7} {message}\n")
+    sys.stdout.flush()
+
+
+def print_summary(summary, pipeline_name=None):
+    prefix = f"[{pipeline_name}] " if pipeline_name else ""
+    print_status(f"{prefix}Summary: {summary.total_files} processed, {summary.processed_count} with text, "
+                 f"{summary.no_text_count} without text, {summary.failed_count} failed, "
+                 f"{summary.duplicate_count} duplicates skipped.")
+    if summary.ocr_report():
+        print_status(prefix + summary.ocr_report())
+
+
+def print_summaries(summaries):
+    # One line per pipeline when there are several, then the overall total
+    total = BatchSummary()
+    for pipeline_name, summary in summaries.items():
+        total.merge(summary)
+        if len(summaries) > 1:
+            print_summary(summary, pipeline_name)
+    print_summary(total)
+
+
+def process_files(batch, sources, summaries):
+    # sources: (pipeline name, pdf_paths) pairs; summaries: pipeline name -> BatchSummary
+    for pipeline_name, result_tuple, stats in batch.run_pipelines(sources):
+        summaries[pipeline_name].add(result_tuple, stats)
+        result_type, base_name, error_details = result_tuple
+        level = "info" if result_type in ("success", "duplicate") else "warning"
+        prefix = f"[{pipeline_name}] " if len(summaries) > 1 else ""
+        print_status(f"{prefix}{base_name}: {result_type}" + (f" ({error_details})" if error_details else ""), level)
+
+
+def run_process(settings, pipelines, args, metrics=None):
+    sources = []
+    discoveries = []
+    for pipeline in pipelines:
+        input_pdf_folder = pipeline.settings["input_pdf_folder"]
+        discovery = InputDiscovery.from_settings(pipeline.settings, status_callback=print_status)
+        try:
+            sources.append((pipeline.name, discovery.discover()))
+        except OSError as e:
+            print_status(f"Error listing files in input folder '{input_pdf_folder}': {e}", "error")
+            continue
+        discoveries.append((input_pdf_folder, discovery))
+    if not sources:
+        return 1
+
+    # Files are handed to the pipeline as the folders are read, so the total is only known at the end
+    summaries = {pipeline.name: BatchSummary() for pipeline in pipelines}
+    batch = BatchProcessor.from_settings(pipelines, settings, status_callback=print_status, metrics=metrics)
+    process_files(batch, sources, summaries)
+    total = BatchSummary()
+    for summary in summaries.values():
+        total.merge(summary)
+    if not total.total_files and not any(discovery.skipped_unstable for _folder, discovery in discoveries):
+        for input_pdf_folder, _discovery in discoveries:
+            print_status(f"No PDF files found in '{input_pdf_folder}'.")
+        return 0 if len(sources) == len(pipelines) else 1
+    print_summaries(summaries)
+    return 0 if total.failed_count == 0 and len(sources) == len(pipelines) else 2
+
+
+def watch_stream(watcher, stop_event, pipeline_name=None):
+    # Flattens FolderWatcher batches into one endless stream of paths for BatchProcessor.run_pipelines
+    prefix = f"[{pipeline_name}] " if pipeline_name else ""
+    for ready_paths in watcher.watch(stop_event):
+        print_status(f"{prefix}{len(ready_paths)} new PDF file(s) ready.")
+        yield from ready_paths
+
+
+def run_watch(settings, pipelines, args, metrics=None):
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        print_status(f"Received signal {signum}, stopping after the current files...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    watchers = {}
+    summaries = {pipeline.name: BatchSummary() for pipeline in pipelines}
+    try:
+        for pipeline in pipelines:
+            watchers[pipeline.name] = FolderWatcher(
+                pipeline.settings["input_pdf_folder"],
+                poll_interval=float(pipeline.settings["watch_poll_interval"]),
+                stable_seconds=float(pipeline.settings["watch_stable_seconds"]),
+                rescan_interval=float(pipeline.settings["watch_rescan_interval"]),
+                use_inotify=not args.no_inotify,
+                status_callback=print_status,
+                sort_key=InputDiscovery.from_settings(pipeline.settings).sort_key
+            )
+        # All feeds run as one long batch, so a fax arriving on one feed can take the next free
+        # worker while another feed is still working through a bulk load
+        labelled = len(pipelines) > 1
+        sources = [(name, watch_stream(watcher, stop_event, name if labelled else None)) for name, watcher in watchers.items()]
+        with BatchProcessor.from_settings(pipelines, settings, status_callback=print_status, metrics=metrics) as batch:
+            process_files(batch, sources, summaries)
+    finally:
+        for watcher in watchers.values():
+            watcher.close()
+        print_summaries(summaries)
+    return 0
+
+
+def run_search(settings, args):
+    index_path = app_config.data_path(settings["search_index_path"], args.config)
+    if not index_path:
+        print_status("The search index is disabled (search_index_path is empty).", "error")
+        return 1
+    search_index = SearchIndex(index_path)
+    if args.command == "reindex":
+        added, removed = search_index.sync(settings["output_text_folder"])
+        print_status(f"Search index updated: {added} text file(s) added, {removed} removed.")
+        return 0
+
+    started = time.perf_counter()
+    hits = search_index.search(" ".join(args.query), limit=args.limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for hit in hits:
+        arrived = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit["arrival"]))
+        page = f"page {hit['page']}" if hit["page"] else "no page info"
+        location = hit["text_path"] or f"({hit['result_type']}, no text file)"
+        print(f"{hit['source_name']}  [{page}, arrived {arrived}]  {location}")
+        if hit["snippet"]:
+            print(f"    {' '.join(hit['snippet'].split())}")
+    print(f"{len(hits)} hit(s) in {elapsed_ms:.1f} ms.")
+    return 0
+
+
+def run_diagnostics(settings, args):
+    # Startup profile of the desktop app (or any module) plus how fast each configured folder answers
+    entries, error = diagnostics.import_time_profile(args.module)
+    print(diagnostics.format_import_report(args.module, entries, error, top=args.top))
+    if args.module != "fitz":
+        fitz_entries, fitz_error = diagnostics.import_time_profile("fitz")
+        fitz_total = sum(cumulative for _name, _self, cumulative, depth in fitz_entries if depth == 0)
+        print(f"PyMuPDF (imported with the first PDF, not at startup): {fitz_total * 1000:.1f} ms"
+              + (f" - import failed: {fitz_error}" if fitz_error else ""))
+
+    try:
+        pipelines = app_config.pipeline_settings(settings)
+    except ValueError as e:
+        print_status(f"Invalid pipeline settings: {e}", "error")
+        return 1
+    timeout = float(settings["folder_check_timeout"])
+    print(f"Folder checks (timeout {timeout:g}s):")
+    unreachable = 0
+    for pipeline in pipelines:
+        folders = [pipeline[key] for key in ("input_pdf_folder", "output_text_folder", "archive_folder", "failed_text_extraction_folder")]
+        for folder, (seconds, folder_error) in diagnostics.check_folders(folders, timeout, create=False).items():
+            timing = f"{seconds * 1000:8.1f} ms" if seconds is not None else "   timeout"
+            print(f"  [{pipeline['pipeline_name']}] {timing}  {folder}" + (f"  ({folder_error})" if folder_error else ""))
+            unreachable += bool(folder_error)
+    return 1 if error or unreachable else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="ezpass", description="Headless EHR EZ Pass PDF processor.")
+    parser.add_argument("--config", default=app_config.CONFIG_FILE, help="Path to config.json (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="Worker processes (overrides max_workers; 0 = one per core)")
+    parser.add_argument("--log-level", choices=sorted(LEVELS, key=LEVELS.get), help="Overrides status_log_level")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("process", help="Process every PDF currently in the input folder and exit")
+
+    watch_parser = subparsers.add_parser("watch", help="Keep watching the input folder and process PDFs as they arrive")
+    watch_parser.add_argument("--poll-interval", type=float, help="Seconds between scans in polling mode")
+    watch_parser.add_argument("--stable-seconds", type=float, help="Seconds a file's size must stay unchanged before it is opened")
+    watch_parser.add_argument("--no-inotify", action="store_true", help="Always poll, even where inotify is available")
+
+    search_parser = subparsers.add_parser("search", help="Search the text of processed documents")
+    search_parser.add_argument("query", nargs="+", help="Words to find; FTS5 syntax such as \"chest pain\" or smith AND mrn works too")
+    search_parser.add_argument("--limit", type=int, default=20, help="Maximum number of hits (default: %(default)s)")
+
+    subparsers.add_parser("reindex", help="Bring the search index up to date with the output folder (added/deleted .txt files)")
+
+    diagnostics_parser = subparsers.add_parser("diagnostics", help="Report import times (python -X importtime) and folder latency")
+    diagnostics_parser.add_argument("--module", default="gui", help="Module whose import is profiled (default: %(default)s, the desktop app)")
+    diagnostics_parser.add_argument("--top", type=int, default=15, help="Slowest modules to list (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+
+    try:
+        settings = app_config.load_settings(args.config)
+    except Exception as e:
+        print_status(f"Error loading settings from '{args.config}': {e}", "error")
+        return 1
+    if args.workers is not None:
+        settings["max_workers"] = args.workers
+    if args.log_level is not None:
+        settings["status_log_level"] = args.log_level
+    if getattr(args, "poll_interval", None) is not None:
+        settings["watch_poll_interval"] = args.poll_interval
+    if getattr(args, "stable_seconds", None) is not None:
+        settings["watch_stable_seconds"] = args.stable_seconds
+
+    if args.command in ("search", "reindex"):
+        return run_search(settings, args)
+    if args.command == "diagnostics":
+        return run_diagnostics(settings, args)
+
+    try:
+        pipelines = create_pipelines(settings, status_callback=print_status, config_file=args.config)
+    except Exception as e:
+        print_status(f"Error initializing PDFProcessor or creating folders: {e}", "error")
+        return 1
+
+    try:
+        metrics = create_metrics(settings, config_file=args.config)
+    except Exception as e:
+        print_status(f"Error starting metrics export: {e}", "error")
+        return 1
+
+    summary = BatchSummary()
+    for pipeline in pipelines:
+        for result_tuple in pipeline.pdf_processor.recover_interrupted_jobs():
+            summary.add(result_tuple)
+            print_status(f"{result_tuple[1]}: {result_tuple[0]} ({result_tuple[2]})")
+    if summary.total_files:
+        print_status(f"Finished {summary.total_files} document(s) left over from an interrupted run.")
+
+    try:
+        if args.command == "process":
+            return run_process(settings, pipelines, args, metrics)
+        return run_watch(settings, pipelines, args, metrics)
+    finally:
+        if metrics is not None:
+            metrics.close()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import os
+import mmap
+import errno
+import shutil
+
+# Copies and moves that never leave a half-written file under the destination name:
+# data goes to "<dest>.partial" first and is renamed into place in one step.
+
+PARTIAL_SUFFIX = ".partial"
+
+
+# File systems whose reads go over the network; reading those twice is what InputBuffer avoids
+_NETWORK_FILESYSTEMS = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "afpfs", "9p", "davfs", "fuse.sshfs", "fuse.rclone"}
+
+
+def is_network_path(path):
+    # Best effort: UNC paths and mapped network drives on Windows, network file systems listed in
+    # /proc/mounts on Linux. Anything that cannot be determined counts as local.
+    path = os.path.realpath(path)
+    if os.name == "nt":
+        if path.startswith("\\\\"):
+            return True
+        import ctypes
+        drive_remote = 4 # GetDriveType's DRIVE_REMOTE
+        return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(path)[0] + "\\") == drive_remote
+    try:
+        with open("/proc/mounts", "r") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return False
+    best_mount, best_type = "", ""
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) >= len(best_mount):
+            best_mount, best_type = mount_point, fs_type
+    return best_type in _NETWORK_FILESYSTEMS
+
+
+class InputBuffer:
+    # The whole content of one input file, read exactly once: memory-mapped for local files (pages
+    # are faulted in only as MuPDF touches them), or fetched with one bulk read for files on a
+    # network share. data is bytes-like, for hashlib and fitz.open(stream=...). close() must come
+    # after every user of data is done; a mapped file cannot be renamed on Windows until then.
+    def __init__(self, path, mapped=True):
+        self._mmap = None
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            if mapped and self.stat.st_size:
+                try:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    self._mmap = None # Falls back to a plain read
+            self.data = memoryview(self._mmap) if self._mmap is not None else f.read()
+
+    @property
+    def mapped(self):
+        return self._mmap is not None
+
+    def close(self):
+        if self._mmap is not None:
+            self.data.release()
+            self._mmap.close()
+            self._mmap = None
+        self.data = None
+
+
+def atomic_copy(src_path, dest_path, data=None):
+    # data: the source's content when it is already in memory; the copy is then written from it
+    # instead of reading src_path again, and only the metadata (mtime etc.) comes from src_path
+    temp_path = dest_path + PARTIAL_SUFFIX
+    try:
+        if data is None:
+            shutil.copy2(src_path, temp_path)
+        else:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            shutil.copystat(src_path, temp_path)
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def atomic_move(src_path, dest_path, data=None):
+    # A plain rename when both folders are on the same volume; otherwise copy (from data, if given),
+    # rename, then delete the source, so a crash leaves at worst a second complete copy, never a torn one
+    try:
+        os.replace(src_path, dest_path)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    atomic_copy(src_path, dest_path, data)
+    os.remove(src_path)
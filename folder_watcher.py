@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify(7) event masks we care about: a file finished writing, was moved in, or was created
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+
+_INOTIFY_EVENT = struct.Struct("iIII") # wd, mask, cookie, len
+
+
+class _InotifyNotifier:
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"inotify_add_watch failed for '{folder}'")
+        self.fd = fd
+
+    def wait(self, timeout):
+        # Returns (names, overflowed). Blocks at most `timeout` seconds.
+        names = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return names, False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names, False
+
+        overflowed = False
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            _wd, mask, _cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+            if name:
+                names.add(os.fsdecode(name))
+        return names, overflowed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    def __init__(self, folder, poll_interval=2.0, stable_seconds=2.0, rescan_interval=30.0, use_inotify=True, status_callback=None, sort_key=None):
+        self.folder = folder
+        self.sort_key = sort_key # Optional (name, mtime_ns) -> key, e.g. InputDiscovery.sort_key, to order each ready batch
+        self.poll_interval = poll_interval
+        self.stable_seconds = stable_seconds
+        self.rescan_interval = rescan_interval
+        self.status_callback = status_callback
+
+        self._pending = {} # name -> ((size, mtime_ns), time the signature was first seen)
+        self._handled = {} # name -> (size, mtime_ns) already yielded, so files left behind are not re-processed
+        self._last_scan = 0.0
+        self._notifier = None
+
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._notifier = _InotifyNotifier(folder)
+                self._send_status(f"Watching '{folder}' with inotify.")
+            except (OSError, AttributeError) as e:
+                self._send_status(f"inotify not available for '{folder}' ({e}). Falling back to polling every {poll_interval} seconds.", "warning")
+        if self._notifier is None:
+            self._send_status(f"Watching '{folder}' by polling every {poll_interval} seconds.")
+
+    def _send_status(self, message, level="info"):
+        if self.status_callback:
+            self.status_callback(message, level)
+
+    def _add_candidate(self, name):
+        if name.lower().endswith('.pdf'):
+            self._pending.setdefault(name, None)
+
+    def _scan(self):
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                self._add_candidate(entry.name)
+        self._last_scan = time.monotonic()
+
+    def _collect_stable(self):
+        # A file is ready once its size and mtime have not changed for stable_seconds
+        now = time.monotonic()
+        ready = []
+        for name, last in list(self._pending.items()):
+            path = os.path.join(self.folder, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[name]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+
+            if self._handled.get(name) == signature:
+                del self._pending[name]
+                continue
+            if last is None or last[0] != signature:
+                self._pending[name] = (signature, now)
+                continue
+            if now - last[1] >= self.stable_seconds:
+                del self._pending[name]
+                self._handled[name] = signature
+                ready.append((name, st.st_mtime_ns, path))
+        if self.sort_key is not None:
+            ready.sort(key=lambda item: self.sort_key(item[0], item[1]))
+        return [path for _name, _mtime_ns, path in ready]
+
+    def _forget_missing(self):
+        # Keep _handled bounded to files that are still sitting in the input folder
+        for name in list(self._handled):
+            if not os.path.exists(os.path.join(self.folder, name)):
+                del self._handled[name]
+
+    def poll(self):
+        # One watch iteration; returns the list of PDF paths that are ready to process
+        if self._notifier is None:
+            time.sleep(min(self.poll_interval, 0.5) if self._pending else self.poll_interval)
+            self._scan()
+            self._forget_missing()
+        else:
+            # Wake up at least once a second so a stop request is noticed promptly
+            timeout = 0.25 if self._pending else min(self.rescan_interval, 1.0)
+            names, overflowed = self._notifier.wait(timeout)
+            for name in names:
+                self._add_candidate(name)
+            if overflowed or time.monotonic() - self._last_scan >= self.rescan_interval:
+                self._scan()
+                self._forget_missing()
+        return self._collect_stable()
+
+    def watch(self, stop_event=None):
+        # Yields non-empty lists of ready PDF paths until stop_event is set
+        self._scan()
+        while stop_event is None or not stop_event.is_set():
+            ready = self.poll()
+            if ready:
+                yield ready
+
+    def close(self):
+        if self._notifier is not None:
+            self._notifier.close()
+            self._notifier = None
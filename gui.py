@@ -3,71 +3,119 @@ import tkinter.messagebox
 import customtkinter
 import os
 import tkinter.filedialog
-import json
+import time
 import threading
-from pdf_processor import PDFProcessor
+import queue
+import app_config
+from pipeline_scheduler import create_pipelines
+from batch_processor import BatchProcessor, BatchSummary
+from input_discovery import InputDiscovery
+from status_bus import StatusBus, level_value
+from metrics import create_metrics
+from preview_cache import PreviewLoader
+
+STATUS_REFRESH_MS = 100 # Status log is redrawn at most ~10 times a second, however fast events arrive
+STATUS_EVENTS_PER_REFRESH = 1000 # Upper bound on events rendered per redraw so a flood cannot stall Tk
+BROWSER_ROWS = 12 # Row widgets in the results browser; scrolling re-fills them instead of creating more
+BROWSER_FETCH_SIZE = 200 # Documents read from the search index per query while scrolling
+BROWSER_CACHED_WINDOWS = 5
+THUMBNAIL_WIDTH = 48
+PREVIEW_WIDTH = 460
+PREVIEW_POLL_MS = 50
 
 class PDFProcessingThread(threading.Thread):
-    def __init__(self, pdf_processor_instance, status_callback, input_pdf_folder, summary_update_callback):
+    def __init__(self, pipelines, status_callback, summary_update_callback, settings, metrics=None, error_dialog_callback=None):
         super().__init__()
-        self.pdf_processor = pdf_processor_instance
+        self.pipelines = pipelines # pipeline_scheduler.Pipeline list; the first is the feed set up in Settings
+        self.pdf_processor = pipelines[0].pdf_processor
         self.status_callback = status_callback
-        self.input_pdf_folder = input_pdf_folder
         self.summary_update_callback = summary_update_callback
+        self.error_dialog_callback = error_dialog_callback # (title, message); shown on the Tk thread, never from here
+        self.settings = settings
+        self.metrics = metrics
+
+    def _discover(self, pipeline):
+        # Returns (pdf path iterator, InputDiscovery), or None if the input folder cannot be listed
+        input_pdf_folder = pipeline.settings["input_pdf_folder"]
+        discovery = InputDiscovery.from_settings(pipeline.settings, self.status_callback)
+        try:
+            return discovery.discover(), discovery
+        except FileNotFoundError:
+            self.status_callback(f"Error: Input folder '{input_pdf_folder}' not found.", "error")
+            self._show_error("Folder Error", f"Input folder '{input_pdf_folder}' not found.")
+        except Exception as e:
+            self.status_callback(f"Error listing files in input folder: {e}", "error")
+            self._show_error("File Listing Error", f"Error listing files: {e}")
+        return None
+
+    def _show_error(self, title, message):
+        if self.error_dialog_callback:
+            self.error_dialog_callback(title, message)
 
     def run(self):
-        self.status_callback(f"Starting PDF processing from: {self.input_pdf_folder}...")
-        
+        # Folders are created in the background at startup; make sure that has happened (waiting
+        # here, off the Tk thread, if a share is still slow to answer)
         try:
-            all_files = os.listdir(self.input_pdf_folder)
-            pdf_files_to_process = [f for f in all_files if f.lower().endswith('.pdf')]
-        except FileNotFoundError:
-            self.status_callback(f"Error: Input folder '{self.input_pdf_folder}' not found.")
-            tkinter.messagebox.showerror("Folder Error", f"Input folder '{self.input_pdf_folder}' not found.")
-            self.summary_update_callback() # Update summary even on error
-            return
+            for pipeline in self.pipelines:
+                pipeline.pdf_processor.ensure_folders()
         except Exception as e:
-            self.status_callback(f"Error listing files in input folder: {e}")
-            tkinter.messagebox.showerror("File Listing Error", f"Error listing files: {e}")
+            self.status_callback(f"Cannot process: the folders are not available ({e}).", "error")
+            self.summary_update_callback()
+            return
+
+        for pipeline in self.pipelines:
+            self.status_callback(f"Starting PDF processing from: {pipeline.settings['input_pdf_folder']}...")
+
+        # Finish whatever a crashed or killed run left half done before picking up new files
+        for pipeline in self.pipelines:
+            for result_type, base_name, details in pipeline.pdf_processor.recover_interrupted_jobs():
+                self.status_callback(f"Resumed interrupted document {base_name}: {result_type} ({details})")
+
+        sources = []
+        discoveries = []
+        for pipeline in self.pipelines:
+            discovered = self._discover(pipeline)
+            if discovered is not None:
+                sources.append((pipeline.name, discovered[0]))
+                discoveries.append((pipeline.settings["input_pdf_folder"], discovered[1]))
+        if not sources:
             self.summary_update_callback() # Update summary even on error
             return
 
-        if not pdf_files_to_process:
-            self.status_callback(f"No PDF files found in '{self.input_pdf_folder}'.")
+        # PDFs go to the pipeline as the folder is read (priority files first), so there is no total up front
+        batch = BatchProcessor.from_settings(self.pipelines, self.settings, status_callback=self.status_callback, metrics=self.metrics)
+        summaries = {pipeline.name: BatchSummary() for pipeline in self.pipelines}
+        summary = BatchSummary()
+        labelled = len(self.pipelines) > 1
+
+        for pipeline_name, result_tuple, stats in batch.run_pipelines(sources):
+            summary.add(result_tuple, stats)
+            summaries[pipeline_name].add(result_tuple, stats)
+            prefix = f"[{pipeline_name}] " if labelled else ""
+            self.status_callback(f"Finished file {summary.total_files}: {prefix}{result_tuple[1]} ({result_tuple[0]})")
+
+        if not summary.total_files and not any(discovery.skipped_unstable for _folder, discovery in discoveries):
+            for input_pdf_folder, _discovery in discoveries:
+                self.status_callback(f"No PDF files found in '{input_pdf_folder}'.")
             self.status_callback("Processing complete.")
             self.summary_update_callback() # Update summary
             return
 
-        self.status_callback(f"Found {len(pdf_files_to_process)} PDF files to process.")
-        
-        processed_count = 0
-        no_text_count = 0
-        failed_count = 0
-        total_files = len(pdf_files_to_process)
-
-        for i, item in enumerate(pdf_files_to_process):
-            pdf_path = os.path.join(self.input_pdf_folder, item)
-            self.status_callback(f"Processing file {i+1}/{total_files}: {item}")
-            
-            result_tuple = self.pdf_processor.process_pdf(pdf_path)
-            
-            status_type = result_tuple[0]
-            
-            if status_type == "success":
-                processed_count += 1
-            elif status_type == "no_text":
-                no_text_count += 1
-            elif status_type == "failed" or status_type == "failed_archive":
-                failed_count += 1
-        
         self.status_callback("\n--- Processing Complete ---")
-        self.status_callback(f"Total Files Processed: {total_files}")
-        self.status_callback(f"Successfully Extracted Text: {processed_count} files (Text to '{self.pdf_processor.output_text_folder}')")
-        self.status_callback(f"No Text Extracted: {no_text_count} files (Text logs to '{self.pdf_processor.failed_text_extraction_folder}')")
-        self.status_callback(f"Failed to Process: {failed_count} files (Error logs to '{self.pdf_processor.failed_text_extraction_folder}')")
+        self.status_callback(f"Total Files Processed: {summary.total_files}")
+        if labelled:
+            for pipeline_name, pipeline_summary in summaries.items():
+                self.status_callback(f"  {pipeline_name}: {pipeline_summary.total_files} files, {pipeline_summary.processed_count} with text, "
+                                     f"{pipeline_summary.no_text_count} without text, {pipeline_summary.failed_count} failed")
+        self.status_callback(f"Successfully Extracted Text: {summary.processed_count} files (Text to '{self.pdf_processor.output_text_folder}')")
+        self.status_callback(f"No Text Extracted: {summary.no_text_count} files (Text logs to '{self.pdf_processor.failed_text_extraction_folder}')")
+        self.status_callback(f"Failed to Process: {summary.failed_count} files (Error logs to '{self.pdf_processor.failed_text_extraction_folder}')")
+        self.status_callback(f"Duplicates Skipped: {summary.duplicate_count} files (already processed, archived without re-extraction)")
+        if summary.ocr_report():
+            self.status_callback(summary.ocr_report())
         self.status_callback(f"All original PDFs moved to: '{self.pdf_processor.archive_folder}' (if successful)")
         self.status_callback("---------------------------")
-        self.summary_update_callback(total_files, processed_count, no_text_count, failed_count) # Update summary after processing
+        self.summary_update_callback(summary.total_files, summary.processed_count, summary.no_text_count, summary.failed_count, summary.duplicate_count, summary.ocr_report()) # Update summary after processing
 
 customtkinter.set_appearance_mode("System")
 customtkinter.set_default_color_theme("blue")
@@ -81,6 +129,13 @@ class App(customtkinter.CTk):
 
         self._initialized = False # Flag to indicate if GUI is fully initialized
 
+        # Worker threads only ever touch status_bus; Tk widgets are updated by _drain_status_events
+        self.status_bus = StatusBus()
+        self.status_log_max_lines = app_config.DEFAULT_SETTINGS["status_log_max_lines"]
+        self._status_line_count = 0
+        self._pending_summary = None
+        self._pending_error_dialogs = queue.SimpleQueue()
+
         # Configure grid layout
         self.grid_columnconfigure(1, weight=1)
         self.grid_rowconfigure(0, weight=0) # Folder paths row
@@ -94,6 +149,9 @@ class App(customtkinter.CTk):
         self.status_textbox.grid(row=1, column=0, columnspan=2, padx=20, pady=(10, 20), sticky="nsew")
         self.status_textbox.insert("end", "GUI initialized. Ready to process PDFs.\n")
         self.status_textbox.configure(state="disabled")
+        self.status_textbox.tag_config("warning", foreground="orange")
+        self.status_textbox.tag_config("error", foreground="red")
+        self._status_line_count = 1
 
         # --- Summary Textbox ---
         self.summary_textbox = customtkinter.CTkTextbox(self, width=700, height=200)
@@ -106,10 +164,12 @@ class App(customtkinter.CTk):
         self.folder_frame.grid(row=0, column=0, columnspan=2, padx=20, pady=10, sticky="ew")
         self.folder_frame.grid_columnconfigure(1, weight=1)
 
-        self.input_pdf_folder = "Rightfax folder"
-        self.output_text_folder = "CPRS documents for provider to sign"
-        self.archive_folder = "PDF files to be archived in vistaimaging"
-        self.failed_text_extraction_folder = "failed text extraction folder"
+        self.settings = dict(app_config.DEFAULT_SETTINGS)
+        self.input_pdf_folder = self.settings["input_pdf_folder"]
+        self.output_text_folder = self.settings["output_text_folder"]
+        self.archive_folder = self.settings["archive_folder"]
+        self.failed_text_extraction_folder = self.settings["failed_text_extraction_folder"]
+        self.max_workers = self.settings["max_workers"]
 
         customtkinter.CTkLabel(self.folder_frame, text="Input Folder:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
         customtkinter.CTkLabel(self.folder_frame, text=self.input_pdf_folder).grid(row=0, column=1, padx=5, pady=2, sticky="w")
@@ -128,45 +188,98 @@ class App(customtkinter.CTk):
         self.process_button.grid(row=2, column=0, columnspan=2, padx=20, pady=(10, 5))
 
         # --- Settings Button ---
-        self.settings_button = customtkinter.CTkButton(self, text="Settings", command=self.open_settings_window)
-        self.settings_button.grid(row=3, column=0, columnspan=2, padx=20, pady=(5, 10))
+        self.button_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        self.button_frame.grid(row=3, column=0, columnspan=2, padx=20, pady=(5, 10))
+        self.settings_button = customtkinter.CTkButton(self.button_frame, text="Settings", command=self.open_settings_window)
+        self.settings_button.grid(row=0, column=0, padx=5)
+        self.browse_button = customtkinter.CTkButton(self.button_frame, text="Browse Results", command=self.open_results_browser)
+        self.browse_button.grid(row=0, column=1, padx=5)
+        self.preview_loader = None # Created with the first results browser; its cache outlives the window
         
         # Load settings
         self.load_settings()
 
+        # Metrics live for the whole session (the /metrics endpoint keeps its port), not per processor
+        try:
+            self.metrics = create_metrics(self.settings)
+        except Exception as e:
+            self.update_status_textbox(f"Error starting metrics export: {e}", "error")
+            self.metrics = None
+
         # --- PDF Processor Initialization ---
         try:
-            self.pdf_processor = PDFProcessor(
-                input_pdf_folder=self.input_pdf_folder,
-                output_text_folder=self.output_text_folder,
-                archive_folder=self.archive_folder,
-                failed_text_extraction_folder=self.failed_text_extraction_folder,
-                status_callback=self.update_status_textbox
-            )
-            self.update_status_textbox("PDFProcessor initialized successfully. Folders checked.")
+            self.pipelines = self.create_pipelines()
+            self.pdf_processor = self.pipelines[0].pdf_processor
+            self.update_status_textbox("PDFProcessor initialized successfully.")
+            self.check_folders_in_background()
         except Exception as e:
             error_message = f"Error initializing PDFProcessor or creating folders: {e}"
-            self.update_status_textbox(error_message)
+            self.update_status_textbox(error_message, "error")
             tkinter.messagebox.showerror("Initialization Error", error_message)
             self.pdf_processor = None # Set to None to prevent further errors
+            self.pipelines = []
 
         self._initialized = True # Set flag to True after all components are initialized
+        self.after(STATUS_REFRESH_MS, self._drain_status_events)
+
+    def create_pipelines(self):
+        # The feed edited in Settings plus any extra "pipelines" from config.json
+        settings = dict(self.settings)
+        settings.update({
+            "input_pdf_folder": self.input_pdf_folder,
+            "output_text_folder": self.output_text_folder,
+            "archive_folder": self.archive_folder,
+            "failed_text_extraction_folder": self.failed_text_extraction_folder,
+        })
+        # Folders are not touched here: makedirs on a slow share would freeze the window
+        return create_pipelines(settings, status_callback=self.update_status_textbox, create_folders=False)
+
+    def check_folders_in_background(self):
+        # Creates the configured folders on a worker thread; if that has not finished within
+        # folder_check_timeout seconds the log says so, and the window stays usable either way
+        pipelines = list(self.pipelines)
+        finished = threading.Event()
+
+        def check():
+            try:
+                for pipeline in pipelines:
+                    pipeline.pdf_processor.ensure_folders()
+                self.update_status_textbox("Folders checked.")
+            except Exception as e:
+                self.update_status_textbox(f"Error creating folders: {e}", "error")
+            finally:
+                finished.set()
+
+        threading.Thread(target=check, name="folder-check", daemon=True).start()
+        timeout = float(self.settings["folder_check_timeout"])
+        self.after(int(timeout * 1000), self._warn_if_folders_slow, finished, timeout)
+
+    def _warn_if_folders_slow(self, finished, timeout):
+        if not finished.is_set():
+            self.update_status_textbox(f"The folders have not answered within {timeout:g} seconds; a network share may be slow "
+                                       "or offline. Checking continues in the background.", "warning")
 
     def process_pdfs(self):
         if self.pdf_processor:
-            self.update_status_textbox("Starting PDF processing...")
             self.process_button.configure(state="disabled") # Disable button during processing
             self.settings_button.configure(state="disabled")
             
             # Clear previous status and summary
+            self.status_bus.clear()
+            self.status_textbox.configure(state="normal")
             self.status_textbox.delete("1.0", "end")
+            self.status_textbox.configure(state="disabled")
+            self._status_line_count = 0
             self.summary_textbox.delete("1.0", "end")
+            self.update_status_textbox("Starting PDF processing...")
 
             processing_thread = PDFProcessingThread(
-                pdf_processor_instance=self.pdf_processor,
+                pipelines=self.pipelines,
                 status_callback=self.update_status_textbox,
-                input_pdf_folder=self.input_pdf_folder,
-                summary_update_callback=self.update_summary_display
+                summary_update_callback=self._queue_summary_update,
+                settings=dict(self.settings, max_workers=self.max_workers),
+                metrics=self.metrics,
+                error_dialog_callback=self._queue_error_dialog
             )
             processing_thread.start()
             self.after(100, self.check_thread_status, processing_thread) # Start checking thread status
@@ -182,50 +295,96 @@ class App(customtkinter.CTk):
             self.update_status_textbox("PDF processing finished.")
 
     def load_settings(self):
-        config_file = "config.json"
+        config_file = app_config.CONFIG_FILE
         if os.path.exists(config_file):
             try:
-                with open(config_file, "r") as f:
-                    settings = json.load(f)
-                    self.input_pdf_folder = settings.get("input_pdf_folder", self.input_pdf_folder)
-                    self.output_text_folder = settings.get("output_text_folder", self.output_text_folder)
-                    self.archive_folder = settings.get("archive_folder", self.archive_folder)
-                    self.failed_text_extraction_folder = settings.get("failed_text_extraction_folder", self.failed_text_extraction_folder)
-                    self.update_folder_display()
-                    self.update_status_textbox("Settings loaded from config.json.")
+                settings = app_config.load_settings(config_file)
+                self.settings = settings
+                self.input_pdf_folder = settings["input_pdf_folder"]
+                self.output_text_folder = settings["output_text_folder"]
+                self.archive_folder = settings["archive_folder"]
+                self.failed_text_extraction_folder = settings["failed_text_extraction_folder"]
+                self.max_workers = settings["max_workers"]
+                self.status_bus.min_level = level_value(settings["status_log_level"])
+                self.status_log_max_lines = max(1, int(settings["status_log_max_lines"]))
+                self.update_folder_display()
+                self.update_status_textbox("Settings loaded from config.json.")
             except Exception as e:
-                self.update_status_textbox(f"Error loading settings: {e}")
+                self.update_status_textbox(f"Error loading settings: {e}", "error")
                 tkinter.messagebox.showerror("Settings Error", f"Error loading settings: {e}")
         else:
             self.update_status_textbox("config.json not found. Using default folder paths.")
 
     def save_settings(self):
-        config_file = "config.json"
-        settings = {
+        # Start from everything that was loaded so keys the GUI does not edit (watch mode etc.) survive
+        settings = dict(self.settings)
+        settings.update({
             "input_pdf_folder": self.input_pdf_folder,
             "output_text_folder": self.output_text_folder,
             "archive_folder": self.archive_folder,
             "failed_text_extraction_folder": self.failed_text_extraction_folder,
-        }
+            "max_workers": self.max_workers,
+        })
         try:
-            with open(config_file, "w") as f:
-                json.dump(settings, f, indent=4)
+            app_config.save_settings(settings)
+            self.settings = settings
             self.update_status_textbox("Settings saved to config.json.")
         except Exception as e:
-            self.update_status_textbox(f"Error saving settings: {e}")
+            self.update_status_textbox(f"Error saving settings: {e}", "error")
             tkinter.messagebox.showerror("Settings Error", f"Error saving settings: {e}")
 
-    def update_status_textbox(self, message):
-        if hasattr(self, '_initialized') and self._initialized:
-            self.status_textbox.configure(state="normal")
-            self.status_textbox.insert("end", message + "\n")
-            self.status_textbox.configure(state="disabled")
-            self.status_textbox.see("end")
-        else:
-            # If not yet initialized, print to console or log
-            print(f"[GUI Init] {message}")
+    def update_status_textbox(self, message, level="info"):
+        # Safe to call from any thread: the message is queued and rendered on the Tk thread
+        self.status_bus.emit(message, level)
+
+    def _queue_summary_update(self, *counts):
+        # Called from the processing thread; applied by _drain_status_events on the Tk thread
+        self._pending_summary = counts
+
+    def _queue_error_dialog(self, title, message):
+        # Called from the processing thread; Tk dialogs may only be opened by _drain_status_events
+        self._pending_error_dialogs.put((title, message))
+
+    def _drain_status_events(self):
+        events = self.status_bus.drain(STATUS_EVENTS_PER_REFRESH)
+        if events:
+            self._append_status_events(events)
+
+        if self._pending_summary is not None:
+            counts, self._pending_summary = self._pending_summary, None
+            self.update_summary_display(*counts)
+
+        # Rescheduled first: a dialog blocks until it is dismissed, and the log should keep moving meanwhile
+        self.after(STATUS_REFRESH_MS, self._drain_status_events)
+        while not self._pending_error_dialogs.empty():
+            tkinter.messagebox.showerror(*self._pending_error_dialogs.get())
+
+    def _append_status_events(self, events):
+        # One insert per run of same-level events instead of one configure/insert/see per message
+        self.status_textbox.configure(state="normal")
+        run_level = None
+        run_lines = []
+        for event in events + [None]:
+            level = event.level if event else None
+            if run_lines and level != run_level:
+                text = "\n".join(run_lines) + "\n"
+                tags = run_level if run_level in ("warning", "error") else ()
+                self.status_textbox.insert("end", text, tags)
+                self._status_line_count += text.count("\n")
+                run_lines = []
+            if event:
+                run_level = level
+                run_lines.append(event.message)
+
+        # Keep only the newest status_log_max_lines lines (ring buffer on top of the textbox)
+        excess = self._status_line_count - self.status_log_max_lines
+        if excess > 0:
+            self.status_textbox.delete("1.0", f"{excess + 1}.0")
+            self._status_line_count -= excess
+        self.status_textbox.configure(state="disabled")
+        self.status_textbox.see("end")
 
-    def update_summary_display(self, total_files=0, processed_count=0, no_text_count=0, failed_count=0):
+    def update_summary_display(self, total_files=0, processed_count=0, no_text_count=0, failed_count=0, duplicate_count=0, ocr_report=""):
         self.summary_textbox.configure(state="normal")
         self.summary_textbox.delete("1.0", "end")
         
@@ -234,6 +393,9 @@ class App(customtkinter.CTk):
         summary_text += f"Successfully Extracted Text: {processed_count} files\n"
         summary_text += f"No Text Extracted: {no_text_count} files\n"
         summary_text += f"Failed to Process: {failed_count} files\n"
+        summary_text += f"Duplicates Skipped: {duplicate_count} files\n"
+        if ocr_report:
+            summary_text += ocr_report + "\n"
         summary_text += "---------------------------\n"
 
         self.summary_textbox.insert("end", summary_text)
@@ -256,6 +418,20 @@ class App(customtkinter.CTk):
         customtkinter.CTkLabel(self.folder_frame, text="Failed Extraction Folder:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
         customtkinter.CTkLabel(self.folder_frame, text=self.failed_text_extraction_folder).grid(row=3, column=1, padx=5, pady=2, sticky="w")
 
+    def open_results_browser(self):
+        search_index = self.pdf_processor.search_index if self.pdf_processor else None
+        if search_index is None:
+            tkinter.messagebox.showerror("Results Browser", "The results browser lists documents from the search index. "
+                                                            "Set search_index_path in config.json to use it.")
+            return
+        if getattr(self, "results_browser", None) is not None and self.results_browser.winfo_exists():
+            self.results_browser.focus()
+            return
+        if self.preview_loader is None:
+            self.preview_loader = PreviewLoader(max_bytes=int(float(self.settings["preview_cache_mb"]) * 1024 * 1024))
+        self.results_browser = ResultsBrowser(self, search_index, self.preview_loader)
+        self.results_browser.focus()
+
     def open_settings_window(self):
         if not hasattr(self, "settings_window") or self.settings_window is None or not self.settings_window.winfo_exists():
             self.settings_window = SettingsWindow(self)
@@ -263,6 +439,245 @@ class App(customtkinter.CTk):
         else:
             self.settings_window.focus()
 
+class ResultsBrowser(customtkinter.CTkToplevel):
+    # Processed documents from the search index, newest first. The list is virtual: BROWSER_ROWS
+    # row widgets are re-filled as it scrolls, documents are read from sqlite a window at a time,
+    # and a thumbnail is only rendered for rows on screen. The selected page is rendered and its
+    # text shown on the right. No PDF is opened for anything that is not being looked at.
+    def __init__(self, master, search_index, preview_loader):
+        super().__init__(master)
+        self.search_index = search_index
+        self.preview_loader = preview_loader
+        self.title("Results Browser")
+        self.geometry("1100x720")
+        self.transient(master)
+
+        self._query = None
+        self._total = 0
+        self._top = 0 # Index of the document in the first row
+        self._windows = {} # window number -> documents, at most BROWSER_CACHED_WINDOWS of them
+        self._selected = None
+        self._page = 0
+        self._page_count = None
+        self._photos = {} # render request -> tkinter.PhotoImage currently on screen
+
+        self.grid_columnconfigure(2, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        search_frame = customtkinter.CTkFrame(self, fg_color="transparent")
+        search_frame.grid(row=0, column=0, columnspan=3, padx=10, pady=10, sticky="ew")
+        search_frame.grid_columnconfigure(0, weight=1)
+        self.search_entry = customtkinter.CTkEntry(search_frame, placeholder_text="Search text or file name (e.g. smith AND mrn)")
+        self.search_entry.grid(row=0, column=0, padx=5, sticky="ew")
+        self.search_entry.bind("<Return>", lambda event: self.refresh())
+        customtkinter.CTkButton(search_frame, text="Search", width=80, command=self.refresh).grid(row=0, column=1, padx=5)
+        self.count_label = customtkinter.CTkLabel(search_frame, text="")
+        self.count_label.grid(row=0, column=2, padx=5)
+
+        # --- Virtual document list ---
+        self.list_frame = customtkinter.CTkFrame(self, width=380)
+        self.list_frame.grid(row=1, column=0, padx=(10, 0), pady=(0, 10), sticky="ns")
+        self.rows = []
+        self._blank_thumbnail = tkinter.PhotoImage(width=THUMBNAIL_WIDTH, height=THUMBNAIL_WIDTH) # Keeps rows the same size before rendering
+        for row_num in range(BROWSER_ROWS):
+            row = customtkinter.CTkFrame(self.list_frame, height=THUMBNAIL_WIDTH + 6, width=370)
+            row.grid(row=row_num, column=0, padx=4, pady=2, sticky="ew")
+            row.grid_propagate(False)
+            thumb = tkinter.Label(row, image=self._blank_thumbnail, borderwidth=0)
+            thumb.grid(row=0, column=0, padx=4, pady=3)
+            label = customtkinter.CTkLabel(row, text="", anchor="w", justify="left")
+            label.grid(row=0, column=1, padx=4, sticky="w")
+            for widget in (row, thumb, label):
+                widget.bind("<Button-1>", lambda event, n=row_num: self._select_row(n))
+                self._bind_wheel(widget)
+            self.rows.append((row, thumb, label))
+        self._bind_wheel(self.list_frame)
+        self._row_color = self.rows[0][0].cget("fg_color")
+
+        self.scrollbar = customtkinter.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, pady=(0, 10), sticky="ns")
+
+        # --- Selected page ---
+        preview_frame = customtkinter.CTkFrame(self)
+        preview_frame.grid(row=1, column=2, padx=10, pady=(0, 10), sticky="nsew")
+        preview_frame.grid_columnconfigure(0, weight=1)
+        preview_frame.grid_columnconfigure(1, weight=1)
+        preview_frame.grid_rowconfigure(1, weight=1)
+        nav_frame = customtkinter.CTkFrame(preview_frame, fg_color="transparent")
+        nav_frame.grid(row=0, column=0, columnspan=2, pady=5)
+        customtkinter.CTkButton(nav_frame, text="<", width=40, command=lambda: self._turn_page(-1)).grid(row=0, column=0, padx=5)
+        self.page_label = customtkinter.CTkLabel(nav_frame, text="No document selected")
+        self.page_label.grid(row=0, column=1, padx=10)
+        customtkinter.CTkButton(nav_frame, text=">", width=40, command=lambda: self._turn_page(1)).grid(row=0, column=2, padx=5)
+        self.page_image = tkinter.Label(preview_frame, borderwidth=0, text="")
+        self.page_image.grid(row=1, column=0, padx=5, pady=5, sticky="n")
+        self.page_textbox = customtkinter.CTkTextbox(preview_frame, wrap="word")
+        self.page_textbox.grid(row=1, column=1, padx=5, pady=5, sticky="nsew")
+        self.page_textbox.configure(state="disabled")
+
+        self.refresh()
+        self.after(PREVIEW_POLL_MS, self._poll_previews)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda event: self._scroll_to(self._top - (1 if event.delta > 0 else -1) * 3))
+        widget.bind("<Button-4>", lambda event: self._scroll_to(self._top - 3)) # X11
+        widget.bind("<Button-5>", lambda event: self._scroll_to(self._top + 3))
+
+    def refresh(self):
+        self._query = self.search_entry.get().strip() or None
+        self.preview_loader.clear_errors() # PDFs that were missing may have been archived since
+        self._windows.clear()
+        try:
+            self._total = self.search_index.count_documents(self._query)
+        except Exception as e:
+            self._total = 0
+            self.count_label.configure(text=f"Search failed: {e}")
+        else:
+            self.count_label.configure(text=f"{self._total} document(s)")
+        self._top = 0
+        self._show_rows()
+
+    def _document_at(self, index):
+        if index >= self._total:
+            return None
+        window_number, offset = divmod(index, BROWSER_FETCH_SIZE)
+        documents = self._windows.get(window_number)
+        if documents is None:
+            documents = self.search_index.list_documents(window_number * BROWSER_FETCH_SIZE, BROWSER_FETCH_SIZE, self._query)
+            if len(self._windows) >= BROWSER_CACHED_WINDOWS:
+                self._windows.pop(next(iter(self._windows)))
+            self._windows[window_number] = documents
+        return documents[offset] if offset < len(documents) else None
+
+    def _on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self._scroll_to(int(float(args[0]) * self._total))
+        elif action == "scroll":
+            step = BROWSER_ROWS if len(args) > 1 and args[1] == "pages" else 1
+            self._scroll_to(self._top + int(float(args[0])) * step)
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, self._total - BROWSER_ROWS))
+        if top != self._top:
+            self._top = top
+            self._show_rows()
+        return "break"
+
+    def _thumbnail_request(self, document):
+        if not document or not document["pdf_path"]:
+            return None
+        return (document["pdf_path"], self.search_index.source_page(document, 1) - 1, THUMBNAIL_WIDTH)
+
+    def _page_request(self):
+        # A segment of a split packet shows its own pages of the archived packet, not the packet's first ones
+        if self._selected is None or not self._selected["pdf_path"]:
+            return None
+        source_page = self.search_index.source_page(self._selected, self._page + 1)
+        return (self._selected["pdf_path"], source_page - 1, PREVIEW_WIDTH) if source_page else None
+
+    def _photo(self, request):
+        # PhotoImage for a rendered request, decoded once while it stays on screen
+        photo = self._photos.get(request)
+        if photo is None:
+            rendered = self.preview_loader.result(request)
+            if rendered is None:
+                return None
+            photo = self._photos[request] = tkinter.PhotoImage(data=rendered[0])
+        return photo
+
+    def _show_rows(self):
+        wanted = []
+        page_request = self._page_request()
+        if page_request:
+            wanted.append(page_request)
+        for row_num, (row, thumb, label) in enumerate(self.rows):
+            document = self._document_at(self._top + row_num)
+            if document is None:
+                label.configure(text="")
+                thumb.configure(image=self._blank_thumbnail)
+                row.configure(fg_color=self._row_color)
+                continue
+            arrived = time.strftime("%Y-%m-%d %H:%M", time.localtime(document["arrival"]))
+            pages = f"{document['page_count']} page(s)" if document["page_count"] else ""
+            label.configure(text=f"{document['source_name']}\n{document['result_type']}  {arrived}  {pages}")
+            selected = self._selected is not None and document["document_id"] == self._selected["document_id"]
+            row.configure(fg_color=("gray75", "gray30") if selected else self._row_color)
+            request = self._thumbnail_request(document)
+            photo = self._photo(request) if request else None
+            thumb.configure(image=photo or self._blank_thumbnail)
+            if request and photo is None:
+                wanted.append(request)
+        self.preview_loader.want(wanted)
+        # Drop decoded images that scrolled away; the PNGs stay in the loader's LRU cache
+        on_screen = {self._thumbnail_request(self._document_at(self._top + n)) for n in range(BROWSER_ROWS)}
+        on_screen.add(page_request)
+        for request in [request for request in self._photos if request not in on_screen]:
+            del self._photos[request]
+        if self._total:
+            self.scrollbar.set(self._top / self._total, min(1.0, (self._top + BROWSER_ROWS) / self._total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _select_row(self, row_num):
+        document = self._document_at(self._top + row_num)
+        if document is None:
+            return
+        self._selected = document
+        self._page = 0
+        self._page_count = document["page_count"]
+        self._show_rows()
+        self._show_page()
+
+    def _turn_page(self, step):
+        if self._selected is None:
+            return
+        page = self._page + step
+        if page < 0 or (self._page_count and page >= self._page_count):
+            return
+        self._page = page
+        self._show_rows()
+        self._show_page()
+
+    def _show_page(self):
+        if self._selected is None:
+            return
+        request = self._page_request()
+        rendered = self.preview_loader.result(request) if request else None
+        if rendered is not None and not self._selected["page_count"]:
+            self._page_count = rendered[1] # Indexed without a page count: the archived PDF's is the document's
+        page_text = self.search_index.page_text(self._selected["document_id"], self.search_index.source_page(self._selected, self._page + 1))
+        if page_text is None:
+            page_text = rendered[2] if rendered is not None else ""
+        page_of = f"Page {self._page + 1} of {self._page_count}" if self._page_count else f"Page {self._page + 1}"
+        self.page_label.configure(text=f"{self._selected['source_name']}: {page_of}")
+
+        photo = self._photo(request) if request else None
+        if photo is not None:
+            self.page_image.configure(image=photo, text="")
+        elif request is None:
+            self.page_image.configure(image="", text="No archived PDF recorded for this document")
+        else:
+            self.page_image.configure(image="", text=self.preview_loader.error(request) or "Rendering...")
+
+        self.page_textbox.configure(state="normal")
+        self.page_textbox.delete("1.0", "end")
+        self.page_textbox.insert("end", page_text or "(no text on this page)")
+        self.page_textbox.configure(state="disabled")
+
+    def _poll_previews(self):
+        if not self.winfo_exists():
+            return
+        done = self.preview_loader.poll()
+        if done:
+            self._show_rows()
+            if self._page_request() in done:
+                self._show_page()
+        self.after(PREVIEW_POLL_MS, self._poll_previews)
+
+    def destroy(self):
+        self.preview_loader.want([]) # Nothing on screen any more
+        super().destroy()
+
 class SettingsWindow(customtkinter.CTkToplevel):
     def __init__(self, master):
         super().__init__(master)
@@ -323,19 +738,16 @@ class SettingsWindow(customtkinter.CTkToplevel):
 
         # Re-initialize PDFProcessor with new paths
         try:
-            self.master.pdf_processor = PDFProcessor(
-                input_pdf_folder=self.master.input_pdf_folder,
-                output_text_folder=self.master.output_text_folder,
-                archive_folder=self.master.archive_folder,
-                failed_text_extraction_folder=self.master.failed_text_extraction_folder,
-                status_callback=self.master.update_status_textbox
-            )
+            self.master.pipelines = self.master.create_pipelines()
+            self.master.pdf_processor = self.master.pipelines[0].pdf_processor
             self.master.update_status_textbox("PDFProcessor re-initialized with new settings.")
+            self.master.check_folders_in_background()
         except Exception as e:
             error_message = f"Error re-initializing PDFProcessor with new settings: {e}"
-            self.master.update_status_textbox(error_message)
+            self.master.update_status_textbox(error_message, "error")
             tkinter.messagebox.showerror("Initialization Error", error_message)
             self.master.pdf_processor = None
+            self.master.pipelines = []
 
         self.destroy() # Close the settings window
 
@@ -0,0 +1,126 @@
+import os
+import re
+import time
+import collections
+
+DiscoveredFile = collections.namedtuple("DiscoveredFile", ["name", "size", "mtime_ns"]) # No path: a whole listing is held at once
+
+
+def is_pdf_name(name):
+    return name.lower().endswith(".pdf")
+
+
+class InputDiscovery:
+    # Lists the input folder with os.scandir. Files matching a priority pattern (e.g. STAT faxes)
+    # come first, then the rest by `order`. With page_size 0 the whole listing is read and sorted
+    # before the first PDF is handed out (only name, size and mtime are kept per file); with a
+    # page_size, entries are read and sorted that many at a time so the first PDF of a huge folder
+    # starts at once, but priority and order then only hold within each page.
+    # Files modified less than stable_seconds ago are probably still being written by RightFax;
+    # they are held back to the end of the listing and only yielded if they have stopped changing.
+    def __init__(self, folder, priority_patterns=(), order="oldest", stable_seconds=2.0, page_size=0, status_callback=None):
+        self.folder = folder
+        self.priority_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in priority_patterns]
+        self.order = order
+        self.stable_seconds = float(stable_seconds)
+        self.page_size = max(0, int(page_size or 0))
+        self.status_callback = status_callback
+        self.skipped_unstable = 0
+
+    @classmethod
+    def from_settings(cls, settings, status_callback=None):
+        return cls(
+            settings["input_pdf_folder"],
+            priority_patterns=settings["priority_patterns"],
+            order=settings["discovery_order"],
+            stable_seconds=settings["watch_stable_seconds"],
+            page_size=settings["discovery_page_size"],
+            status_callback=status_callback
+        )
+
+    def _send_status(self, message, level="info"):
+        if self.status_callback:
+            self.status_callback(message, level)
+
+    def priority(self, name):
+        # Index of the first matching pattern; files matching nothing sort after all of them
+        for rank, pattern in enumerate(self.priority_patterns):
+            if pattern.search(name):
+                return rank
+        return len(self.priority_patterns)
+
+    def sort_key(self, name, mtime_ns):
+        if self.order == "newest":
+            return (self.priority(name), -mtime_ns, name)
+        if self.order == "name":
+            return (self.priority(name), name)
+        return (self.priority(name), mtime_ns, name)
+
+    def _pages(self, entries):
+        page = []
+        with entries:
+            for entry in entries:
+                if not is_pdf_name(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat() # Free on Windows; one stat, no second lookup, elsewhere
+                except OSError:
+                    continue # Moved away since the directory was read
+                page.append(DiscoveredFile(entry.name, st.st_size, st.st_mtime_ns))
+                if self.page_size and len(page) >= self.page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+
+    def discover(self):
+        # Returns an iterator of PDF paths ready to process; skipped_unstable counts files left for
+        # a later run. The folder is opened here, so a missing or unreadable folder raises OSError
+        # straight away rather than on the first next().
+        self.skipped_unstable = 0
+        return self._discover(os.scandir(self.folder))
+
+    def _discover(self, entries):
+        stable_ns = int(self.stable_seconds * 1e9)
+        held_back = []
+        for page in self._pages(entries):
+            now_ns = time.time_ns()
+            ready = []
+            for item in page:
+                if now_ns - item.mtime_ns < stable_ns:
+                    held_back.append(item)
+                else:
+                    ready.append(item)
+            ready.sort(key=lambda item: self.sort_key(item.name, item.mtime_ns))
+            for item in ready:
+                yield os.path.join(self.folder, item.name)
+        if held_back:
+            yield from self._settle(held_back)
+
+    def _settle(self, held_back):
+        # Give recently modified files until they are stable_seconds old, then take the ones whose
+        # size and mtime did not change in the meantime
+        youngest_ns = max(item.mtime_ns for item in held_back)
+        wait = self.stable_seconds - (time.time_ns() - youngest_ns) / 1e9
+        self._send_status(f"{len(held_back)} PDF file(s) were modified in the last {self.stable_seconds:g} seconds; "
+                          f"waiting {max(wait, 0):.1f}s to make sure they are complete.", "debug")
+        if wait > 0:
+            time.sleep(wait)
+
+        ready = []
+        for item in held_back:
+            path = os.path.join(self.folder, item.name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if (st.st_size, st.st_mtime_ns) == (item.size, item.mtime_ns):
+                ready.append(item)
+            else:
+                self.skipped_unstable += 1
+                self._send_status(f"{item.name} is still being written; leaving it for the next run.", "warning")
+        ready.sort(key=lambda item: self.sort_key(item.name, item.mtime_ns))
+        for item in ready:
+            yield os.path.join(self.folder, item.name)
@@ -0,0 +1,92 @@
+import os
+import time
+from sqlite_connections import SqliteConnections
+
+# Per-document states, in the order process_pdf reaches them. A job row is deleted once the
+# original PDF has been archived, so every row left behind is an interrupted document; a row in
+# MOVE_QUEUED waits for its retry_group to leave the RetryQueue.
+CLAIMED = "claimed"
+EXTRACTED = "extracted"
+TEXT_WRITTEN = "text_written"
+FAILED_COPIED = "failed_copied"
+MOVE_QUEUED = "move_queued"
+STATES = (CLAIMED, EXTRACTED, TEXT_WRITTEN, FAILED_COPIED, MOVE_QUEUED)
+
+
+def _create_tables(conn):
+    conn.execute("PRAGMA synchronous=FULL") # A transition must survive power loss, not just a crash
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_path TEXT NOT NULL,
+            base_name TEXT NOT NULL,
+            partial_path TEXT NOT NULL,
+            content_hash TEXT,
+            state TEXT NOT NULL,
+            result_type TEXT,
+            text_path TEXT,
+            page_count INTEGER,
+            error_details TEXT,
+            retry_group TEXT,
+            outputs TEXT,
+            claimed REAL NOT NULL,
+            updated REAL NOT NULL
+        )""")
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for name in ("retry_group", "outputs"): # Journals written by earlier versions
+        if name not in columns:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} TEXT")
+
+
+class JobJournal:
+    # Write-ahead record of each document's progress through process_pdf, so a restart after a
+    # crash can finish the remaining steps instead of extracting and copying everything again.
+    # Like DedupIndex, every process (batch workers included) and thread has its own connection.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._connections = SqliteConnections(db_path, _create_tables)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def claim(self, source_path, partial_path, content_hash=None):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("""
+                INSERT INTO jobs (source_path, base_name, partial_path, content_hash, state, claimed, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (os.path.abspath(source_path), os.path.basename(source_path), partial_path, content_hash, CLAIMED, now, now))
+        return cursor.lastrowid
+
+    def advance(self, job_id, state, **fields):
+        # fields: any of result_type, text_path, page_count, error_details, retry_group, outputs
+        # (JSON list of [partial path, final path] groups when a document has several output files)
+        assignments = ["state = ?", "updated = ?"]
+        values = [state, time.time()]
+        for name in ("result_type", "text_path", "page_count", "error_details", "retry_group", "outputs"):
+            if name in fields:
+                assignments.append(f"{name} = ?")
+                values.append(fields[name])
+        values.append(job_id)
+        conn = self._connection()
+        with conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(assignments)} WHERE job_id = ?", values)
+
+    def finish(self, job_id):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def finish_group(self, retry_group):
+        # Ends the job waiting in MOVE_QUEUED on this RetryQueue group
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE retry_group = ?", (retry_group,))
+
+    def unfinished(self):
+        rows = self._connection().execute("SELECT * FROM jobs ORDER BY job_id").fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self._connections.close()
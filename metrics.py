@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import itertools
+import threading
+import app_config
+
+# Prometheus-style metrics for the extraction pipeline. Workers only fill in
+# PDFProcessor.last_document_stats; everything here runs in the process that collects
+# results, so when metrics are disabled there is nothing to pay beyond those few timers.
+
+# Seconds; covers sub-millisecond renames up to multi-minute OCR'd packets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+_report_numbers = itertools.count(1) # Tells apart reports of batches that start within the same millisecond
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for upper, count in zip(self.buckets, self.counts):
+            total += count
+            yield upper, total
+
+
+class PipelineMetrics:
+    def __init__(self, textfile_path=None, report_folder=None, http_port=0):
+        self.textfile_path = textfile_path
+        self.report_folder = report_folder
+        self._lock = threading.Lock()
+        self._counters = {} # (name, labels) -> value
+        self._histograms = {} # (name, labels) -> Histogram
+        self._batch = None
+        self._server = None
+        if http_port:
+            self.serve(http_port)
+
+    def _inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe(self, name, labels, value):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def start_batch(self):
+        with self._lock:
+            self._batch = {"started": time.time(), "documents": {}, "pages": 0, "bytes_in": 0, "bytes_out": 0,
+                           "retries": 0, "stage_seconds": {}, "document_seconds": []}
+
+    def observe_document(self, result_tuple, stats):
+        result_type = result_tuple[0]
+        with self._lock:
+            self._inc("ezpass_documents_total", (("result", result_type),))
+            batch = self._batch
+            if batch is not None:
+                batch["documents"][result_type] = batch["documents"].get(result_type, 0) + 1
+            if not stats:
+                return # Worker crashed; only the result is known
+
+            self._inc("ezpass_pages_total", value=stats["pages"])
+            self._inc("ezpass_bytes_in_total", value=stats["bytes_in"])
+            self._inc("ezpass_bytes_out_total", value=stats["bytes_out"])
+            self._inc("ezpass_file_retries_total", value=stats["retries"])
+            self._inc("ezpass_ocr_pages_total", value=stats.get("ocr_pages", 0))
+            self._observe("ezpass_document_seconds", (("result", result_type),), stats["seconds"])
+            for stage, seconds in stats["stages"].items():
+                self._observe("ezpass_stage_seconds", (("stage", stage),), seconds)
+
+            if batch is not None:
+                batch["pages"] += stats["pages"]
+                batch["bytes_in"] += stats["bytes_in"]
+                batch["bytes_out"] += stats["bytes_out"]
+                batch["retries"] += stats["retries"]
+                batch["document_seconds"].append(stats["seconds"])
+                for stage, seconds in stats["stages"].items():
+                    batch["stage_seconds"][stage] = batch["stage_seconds"].get(stage, 0.0) + seconds
+
+    def end_batch(self):
+        # Returns the batch report dict and writes the textfile / JSON report if configured
+        with self._lock:
+            batch, self._batch = self._batch, None
+        if batch is None:
+            return None
+
+        finished = time.time()
+        latencies = sorted(batch.pop("document_seconds"))
+        report = dict(batch)
+        report["finished"] = finished
+        report["wall_seconds"] = round(finished - batch["started"], 3)
+        report["stage_seconds"] = {stage: round(seconds, 4) for stage, seconds in batch["stage_seconds"].items()}
+        report["document_seconds"] = {
+            "count": len(latencies),
+            "p50": round(_nearest_rank(latencies, 50), 4),
+            "p95": round(_nearest_rank(latencies, 95), 4),
+            "max": round(latencies[-1], 4) if latencies else 0.0,
+        }
+
+        if self.report_folder:
+            os.makedirs(self.report_folder, exist_ok=True)
+            started = batch["started"]
+            name = (time.strftime("batch_%Y%m%d_%H%M%S", time.localtime(started)) +
+                    f"_{int(started * 1000) % 1000:03d}_{os.getpid()}_{next(_report_numbers)}.json")
+            _atomic_write(os.path.join(self.report_folder, name), json.dumps(report, indent=2))
+        self.write_textfile()
+        return report
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} histogram")
+                    seen.add(name)
+                for upper, count in histogram.cumulative():
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(upper)),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self):
+        # For node_exporter's textfile collector, which must never see a half-written file
+        if self.textfile_path:
+            _atomic_write(self.textfile_path, self.render_prometheus())
+
+    def serve(self, port, host="127.0.0.1"):
+        import http.server # Only needed with metrics_http_port set; keeps it off the startup path
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Scrapes every few seconds would otherwise flood stderr
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def create_metrics(settings, config_file=app_config.CONFIG_FILE):
+    # None when metrics are off, so callers skip all bookkeeping
+    if not settings.get("metrics_enabled"):
+        return None
+    return PipelineMetrics(textfile_path=app_config.data_path(settings.get("metrics_textfile"), config_file),
+                           report_folder=app_config.data_path(settings.get("metrics_report_folder"), config_file),
+                           http_port=int(settings.get("metrics_http_port") or 0))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def _nearest_rank(ordered, pct):
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-pct * len(ordered) // 100))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _atomic_write(path, text):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
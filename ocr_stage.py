@@ -0,0 +1,156 @@
+import os
+import time
+import sqlite3
+import hashlib
+import collections
+import concurrent.futures
+from sqlite_connections import SqliteConnections
+
+
+def _ocr_pixmap(width, height, samples, dpi, language):
+    # Runs in the OCR worker pool: MuPDF's built-in Tesseract bridge turns the image into a
+    # one-page PDF with a text layer, which is then read back like any text-native page.
+    import fitz # PyMuPDF; imported on first use, see pdf_processor
+    started = time.perf_counter()
+    pix = fitz.Pixmap(fitz.csGRAY, width, height, samples, 0)
+    pix.set_dpi(dpi, dpi)
+    pdf_bytes = pix.pdfocr_tobytes(language=language)
+    with fitz.open("pdf", pdf_bytes) as ocr_doc:
+        text = ocr_doc[0].get_text()
+    return text, time.perf_counter() - started
+
+
+def _create_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ocr_pages (
+            page_hash TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            ocr_seconds REAL NOT NULL,
+            created REAL NOT NULL
+        )""")
+
+
+class OcrStage:
+    # OCR fallback for pages with no text layer (scanned faxes). Pages are rasterized in the
+    # calling process, looked up in a per-page cache, and OCR'd in a separate process pool so
+    # text-native pages never wait on Tesseract.
+    def __init__(self, dpi=300, language="eng", max_workers=2, cache_path=None):
+        self.dpi = int(dpi)
+        self.language = language
+        self.total_workers = max(1, int(max_workers))
+        self.max_workers = self.total_workers # This process's share; see split_workers()
+        self.cache_path = cache_path
+        self._executor = None
+        self._connections = SqliteConnections(cache_path, _create_tables) if cache_path else None
+        self._owner_pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_owner_pid"] = None
+        return state
+
+    def split_workers(self, process_count):
+        # Called in each of process_count extraction processes, so that together they start at
+        # most total_workers OCR processes instead of total_workers each (never fewer than one)
+        self.max_workers = max(1, self.total_workers // max(1, int(process_count)))
+
+    def _ensure_process_resources(self):
+        # Pools are per process; never reuse one inherited through fork
+        if self._owner_pid != os.getpid():
+            self._executor = None
+            self._owner_pid = os.getpid()
+
+    def _pool(self):
+        self._ensure_process_resources()
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _cache(self):
+        return self._connections.get() if self._connections is not None else None
+
+    def _page_hash(self, pix):
+        digest = hashlib.sha256()
+        digest.update(f"{pix.width}x{pix.height}@{self.dpi}:{self.language}:".encode("ascii"))
+        digest.update(pix.samples_mv)
+        return digest.hexdigest()
+
+    def _cached_text(self, page_hash):
+        conn = self._cache()
+        if conn is None:
+            return None
+        row = conn.execute("SELECT text FROM ocr_pages WHERE page_hash = ?", (page_hash,)).fetchone()
+        return row[0] if row else None
+
+    def _store_text(self, page_hash, text, ocr_seconds):
+        conn = self._cache()
+        if conn is None:
+            return
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO ocr_pages (page_hash, text, ocr_seconds, created) VALUES (?, ?, ?, ?)",
+                         (page_hash, text, ocr_seconds, time.time()))
+
+    def fill_empty_pages(self, doc, page_texts, stats):
+        # Takes (page_num, text) pairs in page order and yields them back in the same order, with
+        # empty pages replaced by their OCR text. At most 2 * max_workers pages (OCR'd or not) are
+        # held back behind an unfinished OCR result: once that many are pending, no more pages are
+        # pulled from page_texts until the oldest one resolves.
+        pending = collections.deque() # (page_num, text, future, page_hash, submitted_at)
+        max_pending = 2 * self.max_workers
+
+        for page_num, page_text in page_texts:
+            if page_text and not page_text.isspace():
+                pending.append((page_num, page_text, None, None, None))
+            else:
+                self._queue_ocr(doc, page_num, pending, stats)
+
+            while pending and (pending[0][2] is None or len(pending) >= max_pending):
+                yield self._resolve(pending.popleft(), stats)
+
+        while pending:
+            yield self._resolve(pending.popleft(), stats)
+
+    def _queue_ocr(self, doc, page_num, pending, stats):
+        # Appends the page to `pending`: with an OCR future, or with its cached (or empty) text
+        import fitz # PyMuPDF
+        try:
+            pix = doc.load_page(page_num).get_pixmap(dpi=self.dpi, colorspace=fitz.csGRAY, alpha=False)
+            page_hash = self._page_hash(pix)
+            cached = self._cached_text(page_hash)
+            if cached is not None:
+                stats["ocr_cache_hits"] += 1
+                pending.append((page_num, cached, None, None, None))
+                return
+            future = self._pool().submit(_ocr_pixmap, pix.width, pix.height, bytes(pix.samples_mv), self.dpi, self.language)
+            pending.append((page_num, "", future, page_hash, time.perf_counter()))
+        except Exception as e:
+            stats["ocr_failures"] += 1
+            stats["ocr_error"] = str(e)
+            pending.append((page_num, "", None, None, None))
+
+    def _resolve(self, entry, stats):
+        page_num, page_text, future, page_hash, submitted_at = entry
+        if future is None:
+            return page_num, page_text
+        try:
+            page_text, ocr_seconds = future.result()
+        except Exception as e:
+            stats["ocr_failures"] += 1
+            stats["ocr_error"] = str(e)
+            return page_num, ""
+        stats["ocr_pages"] += 1
+        stats["ocr_seconds"] += ocr_seconds
+        try:
+            self._store_text(page_hash, page_text, ocr_seconds)
+        except sqlite3.Error as e:
+            stats["ocr_error"] = f"OCR cache write failed: {e}"
+        return page_num, page_text
+
+    def close(self):
+        self._ensure_process_resources()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._connections is not None:
+            self._connections.close()
@@ -1,134 +1,876 @@
 import os
-import shutil
-import fitz # PyMuPDF
+import glob
+import json
 import time
+import uuid
+from status_bus import level_value
+import app_config
+from dedup_index import DedupIndex, PROCESSING, sha256_data, sha256_file
+from ocr_stage import OcrStage
+from job_journal import JobJournal, CLAIMED, EXTRACTED, TEXT_WRITTEN, FAILED_COPIED, MOVE_QUEUED
+from file_ops import InputBuffer, atomic_copy, atomic_move, is_network_path
+from retry_queue import RetryQueue, backoff_delay
+from search_index import SearchIndex
+from document_router import DocumentRouter
+from structured_output import OUTPUT_FORMATS, JsonDocumentWriter, page_record, read_page_texts
+
+# PyMuPDF (fitz) is imported where a PDF is first opened rather than here: it is by far the
+# slowest import of the app, and the GUI window and the CLI's search/diagnostics commands never
+# need it. Worker processes pay for it once, on their first document.
+
+class DocumentJob:
+    # One PDF on its way through PDFProcessor's three phases (extract_document -> write_text ->
+    # finish_document). Picklable, so the extract phase can run in a worker process and the
+    # other two wherever the caller likes.
+    def __init__(self, pdf_path, stats):
+        self.pdf_path = pdf_path
+        self.base_name = os.path.basename(pdf_path)
+        self.stats = stats
+        self.result_type = "failed" # Default to failed
+        self.error_details = ""
+        self.content_hash = None
+        self.duplicate_of = None # DedupIndex record when the PDF was seen before
+        self.job_id = None
+        self.page_count = None
+        self.arrival = None
+        self.text_file_path = None
+        self.partial_text_file_path = None
+        self.page_spans = None # {segment number: [(page number, start, end)]}, see _write_text_streaming
+        self.segments = None # document_router.Segment list when the PDF was split into several outputs
+        self.segment_text_paths = None
+        self.pipeline = None # Name of the pipeline (input feed) the PDF came from
+        self.input_data = None # The PDF's bytes, kept from a network read for the failed copy
+        self.status_events = None # (message, level) pairs from an extraction worker process, replayed by the parent
 
 class PDFProcessor:
-    def __init__(self, input_pdf_folder, output_text_folder, archive_folder, failed_text_extraction_folder, status_callback=None):
+    def __init__(self, input_pdf_folder, output_text_folder, archive_folder, failed_text_extraction_folder, status_callback=None, log_level="info", dedup_index=None, ocr_stage=None, journal=None, retry_queue=None, search_index=None, router=None, output_format="text", sort_text=False, create_folders=True, read_inputs_once=False, input_buffer_max_mb=256):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output_format '{output_format}' (expected one of: {', '.join(OUTPUT_FORMATS)}).")
         self.input_pdf_folder = input_pdf_folder
         self.output_text_folder = output_text_folder
         self.archive_folder = archive_folder
         self.failed_text_extraction_folder = failed_text_extraction_folder
         self.status_callback = status_callback
+        self.min_log_level = level_value(log_level)
+        # Per-page messages are only built when debug output is on, so their cost does not grow with page count
+        self._log_pages = self.min_log_level <= level_value("debug")
+        self.dedup_index = dedup_index # Optional DedupIndex; re-sent copies of a PDF then skip extraction
+        self.ocr_stage = ocr_stage # Optional OcrStage; pages without a text layer are OCR'd instead of failing the document
+        self.journal = journal # Optional JobJournal; lets recover_interrupted_jobs() finish documents cut off by a crash
+        self.retry_queue = retry_queue # Optional RetryQueue; failed moves/copies are retried in the background instead of inline
+        self.search_index = search_index # Optional SearchIndex; every document is indexed as its .txt is put in place
+        self.router = router # Optional DocumentRouter; multi-patient/multi-document packets get one output per segment
+        # Extensions written per document (or segment), main output first: the one the journal and
+        # the indexes point at. "json" is the layout-aware structured_output format.
+        self.output_exts = {"text": [".txt"], "json": [".json"], "both": [".txt", ".json"]}[output_format]
+        self.sort_text = sort_text # Reorder each page's blocks/lines top-left to bottom-right instead of content-stream order
+        # Read each input once into memory (file_ops.InputBuffer) for hashing, extraction and the
+        # copies, instead of letting each of them read the input folder again
+        self.read_inputs_once = read_inputs_once
+        self.input_buffer_max_bytes = int(float(input_buffer_max_mb) * 1024 * 1024) # Bigger PDFs are opened by path
+        self._remote_folders = {} # input folder -> on a network share (cached is_network_path)
+        self.last_document_stats = self._new_document_stats()
+
+        # With create_folders=False the caller runs ensure_folders() itself, e.g. off the GUI thread,
+        # since makedirs on a slow share can take seconds per folder
+        self._folders_ready = False
+        if create_folders:
+            self.ensure_folders()
+
+    @classmethod
+    def from_settings(cls, settings, status_callback=None, config_file=app_config.CONFIG_FILE, create_folders=True):
+        dedup_index_path = app_config.data_path(settings["dedup_index_path"], config_file)
+        journal_path = app_config.data_path(settings["journal_path"], config_file)
+        retry_queue_path = app_config.data_path(settings["retry_queue_path"], config_file)
+        search_index_path = app_config.data_path(settings["search_index_path"], config_file)
+        ocr_stage = None
+        if settings["ocr_enabled"]:
+            ocr_stage = OcrStage(
+                dpi=settings["ocr_dpi"],
+                language=settings["ocr_language"],
+                max_workers=settings["ocr_workers"],
+                cache_path=app_config.data_path(settings["ocr_cache_path"], config_file)
+            )
+        return cls(
+            input_pdf_folder=settings["input_pdf_folder"],
+            output_text_folder=settings["output_text_folder"],
+            archive_folder=settings["archive_folder"],
+            failed_text_extraction_folder=settings["failed_text_extraction_folder"],
+            status_callback=status_callback,
+            log_level=settings["status_log_level"],
+            dedup_index=DedupIndex(dedup_index_path) if dedup_index_path else None,
+            ocr_stage=ocr_stage,
+            journal=JobJournal(journal_path) if journal_path else None,
+            retry_queue=RetryQueue(
+                retry_queue_path,
+                max_attempts=settings["retry_max_attempts"],
+                base_delay=settings["retry_base_delay"],
+                max_delay=settings["retry_max_delay"],
+                breaker_threshold=settings["retry_breaker_threshold"],
+                breaker_cooldown=settings["retry_breaker_cooldown"]
+            ) if retry_queue_path else None,
+            search_index=SearchIndex(search_index_path) if search_index_path else None,
+            router=DocumentRouter.from_settings(settings) if settings["routing_enabled"] else None,
+            output_format=settings["output_format"],
+            sort_text=settings["output_sort"],
+            create_folders=create_folders,
+            read_inputs_once=settings["read_inputs_once"],
+            input_buffer_max_mb=settings["input_buffer_max_mb"]
+        )
 
-        self._create_folders()
+    def __getstate__(self):
+        # Sent to batch worker processes; the GUI callback cannot cross the process boundary
+        state = self.__dict__.copy()
+        state["status_callback"] = None
+        return state
 
-    def _send_status(self, message):
+    def _send_status(self, message, level="info"):
+        if level_value(level) < self.min_log_level:
+            return
         if self.status_callback:
-            self.status_callback(message)
-        print(message)
+            self.status_callback(message, level)
+        else:
+            print(message)
+
+    def ensure_folders(self):
+        # Creates the four folders once per processor; raises like _create_folders() on failure
+        if not self._folders_ready:
+            self._create_folders()
+            self._folders_ready = True
 
     def _create_folders(self):
         try:
             os.makedirs(self.output_text_folder, exist_ok=True)
             os.makedirs(self.archive_folder, exist_ok=True)
             os.makedirs(self.failed_text_extraction_folder, exist_ok=True)
-            self._send_status(f"Ensured output folder '{self.output_text_folder}' exists.")
-            self._send_status(f"Ensured archive folder '{self.archive_folder}' exists.")
-            self._send_status(f"Ensured failed text extraction folder '{self.failed_text_extraction_folder}' exists.")
+            self._send_status(f"Ensured output folder '{self.output_text_folder}' exists.", "debug")
+            self._send_status(f"Ensured archive folder '{self.archive_folder}' exists.", "debug")
+            self._send_status(f"Ensured failed text extraction folder '{self.failed_text_extraction_folder}' exists.", "debug")
         except Exception as e:
-            self._send_status(f"Error creating folders: {e}")
+            self._send_status(f"Error creating folders: {e}", "error")
             raise
 
-    def _move_file_with_retry(self, src_path, dest_path, operation="move", file_description="file"):
+    def _add_stage_time(self, stats, stage, seconds):
+        stages = stats["stages"]
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def _move_file_with_retry(self, src_path, dest_path, operation="move", file_description="file", stage=None, stats=None, data=None):
+        # True once the file is in place (or queued for a background retry), False if it gave up.
+        # data: src_path's content if it is already in memory (see DocumentJob.input_data)
+        if stats is None:
+            stats = self.last_document_stats
         max_retries = 5
-        op_func = shutil.move if operation == "move" else shutil.copy2
+        op_func = atomic_move if operation == "move" else atomic_copy
         op_word = "moved" if operation == "move" else "copied"
+        stage = stage or operation
+        started = time.perf_counter()
 
-        for i in range(max_retries):
+        try:
+            if self.retry_queue is not None and self._move_or_defer(src_path, dest_path, operation, file_description, stage, stats, data):
+                return True
+            for i in range(max_retries):
+                attempt_started = time.perf_counter()
+                try:
+                    op_func(src_path, dest_path, data)
+                    self._add_stage_time(stats, stage, time.perf_counter() - attempt_started)
+                    self._send_status(f"Successfully {op_word} {file_description}: {os.path.basename(src_path)} to {os.path.basename(dest_path)}")
+                    return True
+                except Exception as e:
+                    self._add_stage_time(stats, stage, time.perf_counter() - attempt_started)
+                    stats["retries"] += 1
+                    if i < max_retries - 1:
+                        delay = backoff_delay(i + 1, max_delay=4.0)
+                        self._send_status(f"Attempt {i+1}/{max_retries} to {operation} {file_description} {os.path.basename(src_path)} failed: {e}. Retrying in {delay:.1f} seconds...", "warning")
+                        sleep_started = time.perf_counter()
+                        time.sleep(delay)
+                        self._add_stage_time(stats, "retry_wait", time.perf_counter() - sleep_started)
+                    else:
+                        self._send_status(f"Failed to {operation} {file_description} {os.path.basename(src_path)} after {max_retries} attempts: {e}. It remains in its original location.", "error")
+                        return False
+        finally:
+            stats["move_seconds"] += time.perf_counter() - started
+
+    def _move_or_defer(self, src_path, dest_path, operation, file_description, stage, stats, data=None):
+        # One attempt, then hand the step to the retry queue so this worker can move on to the next
+        # PDF. Once one step of a document is queued, its later steps are queued behind it unattempted
+        # so they still run in order. Returns False only if the queue itself is unusable.
+        op_func = atomic_move if operation == "move" else atomic_copy
+        group_id = stats["deferred_moves"]
+        attempts = 0
+        error = "Waiting for an earlier step of the same document"
+        if group_id is None:
+            attempt_started = time.perf_counter()
             try:
-                op_func(src_path, dest_path)
+                op_func(src_path, dest_path, data) # Queued retries read src_path again
+                op_word = "moved" if operation == "move" else "copied"
                 self._send_status(f"Successfully {op_word} {file_description}: {os.path.basename(src_path)} to {os.path.basename(dest_path)}")
                 return True
             except Exception as e:
-                if i < max_retries - 1:
-                    self._send_status(f"Attempt {i+1}/{max_retries} to {operation} {file_description} {os.path.basename(src_path)} failed: {e}. Retrying in 0.5 seconds...")
-                    time.sleep(0.5)
-                else:
-                    self._send_status(f"Failed to {operation} {file_description} {os.path.basename(src_path)} after {max_retries} attempts: {e}. It remains in its original location.")
-                    return False
+                stats["retries"] += 1
+                attempts = 1
+                error = str(e)
+            finally:
+                self._add_stage_time(stats, stage, time.perf_counter() - attempt_started)
+
+        try:
+            new_group_id = group_id or uuid.uuid4().hex
+            self.retry_queue.enqueue(new_group_id, operation, src_path, dest_path, file_description,
+                                     required=(operation == "move"), attempts=attempts, last_error=error)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not queue {file_description} {os.path.basename(src_path)} for retry: {e}", "warning")
+            return False
+        stats["deferred_moves"] = new_group_id
+        self._send_status(f"Could not {operation} {file_description} {os.path.basename(src_path)} ({error}). Queued for background retry.", "warning")
+        return True
+
+    def _new_document_stats(self):
+        # Per-document numbers reported alongside the result tuple (see BatchProcessor.run_with_stats)
+        # "stages" holds monotonic seconds per pipeline stage (dedup_hash, open, extract, text_write,
+        # split_pdf, search_index, failed_copy, archive, retry_wait, read_input); retries counts failed move/copy attempts. deferred_moves is
+        # the RetryQueue group id when a move/copy was handed to the retry queue.
+        return {"seconds": 0.0, "pages": 0, "move_seconds": 0.0, "bytes_in": 0, "bytes_out": 0, "retries": 0, "stages": {},
+                "deferred_moves": None,
+                "ocr_pages": 0, "ocr_seconds": 0.0, "ocr_cache_hits": 0, "ocr_failures": 0, "ocr_error": ""}
+
+    def _unique_text_path(self, text_file_path, sibling_exts=()):
+        # A different document with the same file name must not overwrite an earlier .txt, nor the
+        # files written next to it (sibling_exts, e.g. its .json)
+        stem, ext = os.path.splitext(text_file_path)
+        exts = (ext,) + tuple(sibling_exts)
+        candidate = stem
+        counter = 2
+        while any(os.path.exists(candidate + other_ext) for other_ext in exts):
+            candidate = f"{stem} ({counter})"
+            counter += 1
+        return candidate + ext
+
+    def _find_duplicate(self, pdf_path, base_name, stats, buffer=None):
+        # Returns (content_hash, previous record or None); hashing problems never block processing.
+        # Without a previous record the hash is now claimed for this document (see DedupIndex.claim).
+        started = time.perf_counter()
+        try:
+            content_hash = sha256_data(buffer.data) if buffer is not None else sha256_file(pdf_path)
+            return content_hash, self.dedup_index.claim(content_hash, base_name)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not check {base_name} against the duplicate index: {e}", "warning")
+            return None, None
+        finally:
+            self._add_stage_time(stats, "dedup_hash", time.perf_counter() - started)
+
+    def _record_result(self, content_hash, base_name, result_type, output_path, page_count):
+        try:
+            self.dedup_index.record(content_hash, base_name, result_type, output_path, page_count)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not record {base_name} in the duplicate index: {e}", "warning")
+
+    def _release_claim(self, content_hash, base_name):
+        try:
+            self.dedup_index.release(content_hash)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not update the duplicate index for {base_name}: {e}", "warning")
+
+    def _archive_duplicate(self, job):
+        pdf_path, base_name, previous = job.pdf_path, job.base_name, job.duplicate_of
+        result = "still being processed" if previous["result_type"] == PROCESSING else f"result: {previous['result_type']}"
+        self._send_status(f"{base_name} is a duplicate of {previous['source_name']} "
+                          f"(first processed {time.strftime('%Y-%m-%d %H:%M', time.localtime(previous['first_seen']))}, "
+                          f"{result}). Skipping extraction.", "warning")
+        try:
+            self.dedup_index.mark_seen(job.content_hash)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not update the duplicate index for {base_name}: {e}", "warning")
+
+        archive_path = os.path.join(self.archive_folder, base_name)
+        if not self._move_file_with_retry(pdf_path, archive_path, operation="move", file_description="duplicate PDF", stage="archive", stats=job.stats, data=job.input_data):
+            self._send_status(f"WARNING: Duplicate PDF {base_name} could not be archived. It remains in the source folder.", "warning")
+            return ("failed_archive", base_name, "Could not archive original PDF.")
+        return ("duplicate", base_name, f"Duplicate of {previous['source_name']}")
+
+    def _journal_claim(self, pdf_path, partial_text_file_path, content_hash):
+        # Returns the job id, or None when there is no journal or it cannot be written
+        if self.journal is None:
+            return None
+        try:
+            return self.journal.claim(pdf_path, partial_text_file_path, content_hash)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not record {os.path.basename(pdf_path)} in the job journal: {e}", "warning")
+            return None
+
+    def _journal_advance(self, job_id, state, **fields):
+        if job_id is None:
+            return
+        try:
+            self.journal.advance(job_id, state, **fields)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not update the job journal ({state}): {e}", "warning")
+
+    def _journal_finish(self, job_id):
+        if job_id is None:
+            return
+        try:
+            self.journal.finish(job_id)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not update the job journal (archived): {e}", "warning")
+
+    def _journal_settle(self, job_id, stats, result_type, error_details):
+        # The document's last step: ends its job, unless a move/copy went to the retry queue. Then the
+        # job stays open in MOVE_QUEUED until settle_deferred() (or the next recovery) sees the group done.
+        if stats["deferred_moves"]:
+            self._journal_advance(job_id, MOVE_QUEUED, result_type=result_type, error_details=error_details,
+                                  retry_group=stats["deferred_moves"])
+        else:
+            self._journal_finish(job_id)
+
+    def settle_deferred(self, group_id):
+        # Called by the batch once the retry queue has finished (or given up on) a document's group
+        if self.journal is None:
+            return
+        try:
+            self.journal.finish_group(group_id)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not update the job journal (archived): {e}", "warning")
+
+    def _index_document(self, base_name, text_path, result_type, arrival, pages, page_count, stats, source_pages=None):
+        # Indexing problems never fail the document; `ezpass reindex` can catch up later
+        started = time.perf_counter()
+        try:
+            self.search_index.add_document(base_name, text_path, result_type, arrival, pages, page_count,
+                                           pdf_path=os.path.join(self.archive_folder, base_name), source_pages=source_pages)
+        except Exception as e:
+            self._send_status(f"WARNING: Could not add {base_name} to the search index: {e}", "warning")
+        finally:
+            self._add_stage_time(stats, "search_index", time.perf_counter() - started)
+
+    def _read_back_pages(self, text_path, page_spans):
+        # (page number, text) pairs for the search index, read one page at a time from the output
+        # that was just put in place: a .txt by the byte ranges recorded while writing it, a .json
+        # (output_format "json") by its page records
+        if text_path.lower().endswith(".json"):
+            for page, text in read_page_texts(text_path):
+                if text and not text.isspace():
+                    yield page, text
+            return
+        with open(text_path, "rb") as f:
+            for page, start, end in page_spans:
+                f.seek(start)
+                # Text mode wrote os.linesep; the index has always stored the text as extracted
+                yield page, f.read(end - start).decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+    def _iter_page_text(self, doc, records=None):
+        # With a records dict, each page's structured layout is also left there under its page
+        # number for the JSON writer; both come from one TextPage, so the page is only analysed once
+        import fitz # PyMuPDF
+        for page_num in range(len(doc)):
+            page = doc.load_page(page_num)
+            if records is None:
+                yield page_num, page.get_text(sort=self.sort_text)
+                continue
+            textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+            page_dict = page.get_text("dict", textpage=textpage, sort=self.sort_text)
+            records[page_num] = page_record(page_num, page.rect, page_dict)
+            yield page_num, page.get_text("text", textpage=textpage, sort=self.sort_text)
+
+    def _segment_partial_path(self, partial_text_file_path, number, ext=".txt"):
+        # Segment 1 of a split document is written to the document's own .partial; the others sit
+        # next to it so _remove_partials() can find every one of them
+        if number == 1 and ext == ".txt":
+            return partial_text_file_path
+        return f"{partial_text_file_path}.{number}{ext}"
+
+    def _remove_partials(self, partial_text_file_path):
+        if not partial_text_file_path:
+            return
+        for path in [partial_text_file_path] + glob.glob(glob.escape(partial_text_file_path) + ".*"):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    self._send_status(f"WARNING: Could not remove partial text file {os.path.basename(path)}: {e}", "warning")
+
+    def _write_text_streaming(self, doc, base_name, text_file_path, stats, page_spans=None, split=None):
+        # Returns (total text length, number of pages with non-whitespace text). With a page_spans
+        # dict, the byte range of each page with text is recorded there per segment .txt, so the
+        # search index can read the pages back from disk instead of this process sending them over.
+        # With a DocumentSplit, each page goes to its segment's files as it is extracted (same single
+        # pass over the pages); segment 1's .txt is text_file_path itself. The .json partials are
+        # written page by page alongside, never held in memory as a whole.
+        text_length = 0
+        text_page_count = 0
+        records = {} if ".json" in self.output_exts else None # Pages extracted but not written yet (held back by OCR)
+        page_texts = self._iter_page_text(doc, records)
+        if self.ocr_stage is not None:
+            page_texts = self.ocr_stage.fill_empty_pages(doc, page_texts, stats)
+        write_seconds = 0.0
+        started = time.perf_counter()
+        out_files = {} # partial path -> open .txt file or JsonDocumentWriter
+        segment_numbers = {} # partial path -> segment number
+        try:
+            for page_num, page_text in page_texts:
+                number = split.assign(page_num, page_text).number if split is not None else 1
+                write_started = time.perf_counter()
+                for ext in self.output_exts:
+                    partial_path = self._segment_partial_path(text_file_path, number, ext)
+                    out_file = out_files.get(partial_path)
+                    if ext == ".txt":
+                        if out_file is None:
+                            out_file = out_files[partial_path] = open(partial_path, "w", encoding="utf-8")
+                        start = out_file.tell() if page_spans is not None else 0
+                        out_file.write(page_text)
+                        if page_spans is not None and page_text and not page_text.isspace():
+                            page_spans.setdefault(number, []).append((page_num + 1, start, out_file.tell()))
+                    else:
+                        if out_file is None:
+                            out_file = out_files[partial_path] = JsonDocumentWriter(partial_path, base_name, len(doc), self.sort_text)
+                            segment_numbers[partial_path] = number
+                        record = records.pop(page_num)
+                        if not record["blocks"] and page_text:
+                            record["ocr_text"] = page_text # No text layer; the text came from the OCR stage
+                        out_file.write_page(record)
+                write_seconds += time.perf_counter() - write_started
+                text_length += len(page_text)
+                if page_text and not page_text.isspace():
+                    text_page_count += 1
+                if self._log_pages:
+                    self._send_status(f"Extracted text from page {page_num + 1} of {base_name}. Current text length: {text_length}.", "debug")
+            for partial_path, out_file in out_files.items():
+                if isinstance(out_file, JsonDocumentWriter):
+                    out_file.finish(self._json_segment(split, segment_numbers[partial_path]))
+            if self.journal is not None:
+                # The journal will say this text is complete; make sure the disk agrees
+                for out_file in out_files.values():
+                    raw_file = out_file.file if isinstance(out_file, JsonDocumentWriter) else out_file
+                    raw_file.flush()
+                    os.fsync(raw_file.fileno())
+        finally:
+            for out_file in out_files.values():
+                out_file.close()
+        # Page extraction and writes are interleaved; split the elapsed time between the two stages
+        self._add_stage_time(stats, "text_write", write_seconds)
+        self._add_stage_time(stats, "extract", time.perf_counter() - started - write_seconds)
+        for partial_path in out_files:
+            stats["bytes_out"] += os.path.getsize(partial_path)
+        return text_length, text_page_count
+
+    def _json_segment(self, split, number):
+        # The "segment" entry of a .json that holds one part of a split PDF (see _segment_outputs)
+        if split is None or len(split.segments) <= 1:
+            return None
+        segment = split.segments[number - 1]
+        return {"number": number, "count": len(split.segments), "label": segment.label(self.router.label_fields)}
+
+    def _write_split_pdfs(self, doc, job):
+        # One PDF per segment, written next to the segment .partial files and renamed with them
+        import fitz # PyMuPDF
+        started = time.perf_counter()
+        for segment in job.segments:
+            with fitz.open() as part:
+                for first_page, last_page in segment.page_runs():
+                    part.insert_pdf(doc, from_page=first_page, to_page=last_page)
+                part.save(self._segment_partial_path(job.partial_text_file_path, segment.number, ".pdf"), garbage=3, deflate=True)
+        self._add_stage_time(job.stats, "split_pdf", time.perf_counter() - started)
+
+    def _output_files(self, partial_text_file_path, number, stem_path, exts):
+        # (partial path, final path) pairs for one document or segment, main output first; all of
+        # them share one file name stem that none of them is already using
+        main_path = self._unique_text_path(stem_path + exts[0], exts[1:])
+        final_stem = os.path.splitext(main_path)[0]
+        return [(self._segment_partial_path(partial_text_file_path, number, ext), final_stem + ext) for ext in exts]
+
+    def _segment_outputs(self, job):
+        # One list of (partial path, final path) pairs per segment of a split document, in segment order
+        stem = os.path.splitext(job.base_name)[0]
+        total = len(job.segments)
+        exts = self.output_exts + ([".pdf"] if self.router.split_pdf else [])
+        outputs = []
+        for segment in job.segments:
+            label = segment.label(self.router.label_fields)
+            name = f"{stem} - part {segment.number} of {total}" + (f" ({label})" if label else "")
+            outputs.append(self._output_files(job.partial_text_file_path, segment.number,
+                                              os.path.join(self.output_text_folder, name), exts))
+        return outputs
+
+    def recover_interrupted_jobs(self):
+        # Replays the job journal left by a run that crashed or was killed. Must run before any
+        # batch starts. Returns result tuples for the documents it finished; documents that never
+        # got past extraction are rolled back and simply get processed again from the input folder.
+        if self.dedup_index is not None:
+            try:
+                released = self.dedup_index.release_claims()
+            except Exception as e:
+                self._send_status(f"WARNING: Could not clean up the duplicate index: {e}", "warning")
+            else:
+                if released:
+                    self._send_status(f"Released {released} duplicate-index claim(s) left by an interrupted run.", "debug")
+        if self.journal is None:
+            return []
+        try:
+            jobs = self.journal.unfinished()
+        except Exception as e:
+            self._send_status(f"WARNING: Could not read the job journal: {e}", "warning")
+            return []
+        if jobs:
+            self._send_status(f"Resuming {len(jobs)} document(s) interrupted in a previous run.", "warning")
+
+        results = []
+        for job in jobs:
+            self.last_document_stats = self._new_document_stats()
+            try:
+                result_tuple = self._resume_job(job)
+            except Exception as e:
+                self._send_status(f"Could not resume {job['base_name']}: {e}. It will be processed again.", "error")
+                result_tuple = None
+                self._journal_finish(job["job_id"])
+            if result_tuple:
+                results.append(result_tuple)
+        return results
+
+    def _resume_job(self, job):
+        job_id = job["job_id"]
+        pdf_path = job["source_path"]
+        base_name = job["base_name"]
+        partial_text_file_path = job["partial_path"]
+        state = job["state"]
+        result_type = job["result_type"]
+        error_details = job["error_details"] or ""
+
+        if state == MOVE_QUEUED and self.retry_queue is not None and self.retry_queue.has_group(job["retry_group"]):
+            # Still queued from the last run: the retry queue carries on with it and the next recovery
+            # closes the job. Until then discovery skips the PDF.
+            return None
+        if state == EXTRACTED and result_type == "success" and job["outputs"]:
+            state = self._recover_outputs(job)
+        elif state == EXTRACTED and result_type == "success":
+            if os.path.exists(partial_text_file_path):
+                text_path = self._unique_text_path(job["text_path"])
+                os.replace(partial_text_file_path, text_path)
+                self._send_status(f"Recovered text for {base_name}: {os.path.basename(text_path)}")
+                state = TEXT_WRITTEN
+                if self.search_index is not None:
+                    try:
+                        self.search_index.add_text_file(text_path, base_name, pdf_path=os.path.join(self.archive_folder, base_name))
+                    except Exception as e:
+                        self._send_status(f"WARNING: Could not add {base_name} to the search index: {e}", "warning")
+            elif os.path.exists(job["text_path"]):
+                state = TEXT_WRITTEN # Crashed between the rename and the journal update
+        if state == CLAIMED or (state == EXTRACTED and result_type == "success"):
+            # Extraction never finished (or its output is gone): roll back
+            self._remove_partials(partial_text_file_path)
+            self.journal.finish(job_id)
+            self._send_status(f"{base_name} was interrupted during extraction; it will be processed again.", "warning")
+            return None
+
+        self._remove_partials(partial_text_file_path)
+        if job["content_hash"] and self.dedup_index is not None and state not in (FAILED_COPIED, MOVE_QUEUED):
+            output_path = job["text_path"] if result_type == "success" else None
+            self._record_result(job["content_hash"], base_name, result_type, output_path, job["page_count"])
+
+        source_present = os.path.exists(pdf_path)
+        if result_type in ("no_text", "failed") and state not in (FAILED_COPIED, MOVE_QUEUED) and source_present:
+            failed_pdf_path = os.path.join(self.failed_text_extraction_folder, base_name)
+            if self._move_file_with_retry(pdf_path, failed_pdf_path, operation="copy", file_description="failed PDF copy", stage="failed_copy"):
+                self.journal.advance(job_id, FAILED_COPIED)
+            else:
+                self._send_status(f"WARNING: Could not copy original PDF {base_name} to failed text extraction folder.", "warning")
+
+        if source_present:
+            archive_path = os.path.join(self.archive_folder, base_name)
+            if not self._move_file_with_retry(pdf_path, archive_path, operation="move", file_description="original PDF", stage="archive"):
+                self._send_status(f"WARNING: Original PDF {base_name} could not be archived. It remains in the source folder.", "warning")
+                if result_type != "failed":
+                    result_type = "failed_archive"
+                    error_details = "Could not archive original PDF."
+        self._journal_settle(job_id, self.last_document_stats, result_type, error_details)
+        return (result_type, base_name, error_details or "Resumed after an interrupted run")
+
+    def _recover_outputs(self, job):
+        # Finishes the renames _write_outputs() was part way through. Returns TEXT_WRITTEN, or
+        # EXTRACTED (to roll back and process the PDF again) when some output is gone altogether.
+        output_groups = json.loads(job["outputs"])
+        for outputs in output_groups:
+            for partial_path, final_path in outputs:
+                if os.path.exists(partial_path):
+                    os.replace(partial_path, final_path)
+        final_paths = [final_path for outputs in output_groups for _partial, final_path in outputs]
+        if not all(os.path.exists(final_path) for final_path in final_paths):
+            for final_path in final_paths:
+                if os.path.exists(final_path):
+                    os.remove(final_path)
+            return EXTRACTED
+        self._send_status(f"Recovered output for {job['base_name']}: {', '.join(os.path.basename(path) for path in final_paths)}")
+        if self.search_index is not None:
+            for outputs in output_groups:
+                try:
+                    self.search_index.add_text_file(outputs[0][1], job["base_name"], pdf_path=os.path.join(self.archive_folder, job["base_name"]))
+                except Exception as e:
+                    self._send_status(f"WARNING: Could not add {job['base_name']} to the search index: {e}", "warning")
+        return TEXT_WRITTEN
 
     def process_pdf(self, pdf_path):
-        base_name = os.path.basename(pdf_path)
+        # All three phases back to back; the asynchronous pipeline runs them as separate stages
+        job = self.extract_document(pdf_path)
+        self.write_text(job)
+        result_tuple = self.finish_document(job)
+        self.last_document_stats = job.stats
+        return result_tuple
+
+    def extract_document(self, pdf_path):
+        # Phase 1 (CPU): duplicate check, then text streamed into a .partial file next to the final .txt
+        job = DocumentJob(pdf_path, self._new_document_stats())
+        started = time.perf_counter()
+        buffer = None
+        try:
+            buffer = self._read_input(job)
+            self._extract_document(job, buffer)
+        finally:
+            if buffer is not None:
+                self._keep_input_data(job, buffer)
+                buffer.close()
+            job.stats["seconds"] += time.perf_counter() - started
+        return job
+
+    def _read_input(self, job):
+        # The whole PDF in memory, or None to work from its path as before (setting off, PDF over
+        # input_buffer_max_mb, or unreadable - then opening it by path reports the error as usual)
+        if not self.read_inputs_once:
+            return None
+        started = time.perf_counter()
+        folder = os.path.dirname(os.path.abspath(job.pdf_path))
+        try:
+            if folder not in self._remote_folders:
+                self._remote_folders[folder] = is_network_path(folder)
+            if os.path.getsize(job.pdf_path) > self.input_buffer_max_bytes:
+                return None
+            return InputBuffer(job.pdf_path, mapped=not self._remote_folders[folder])
+        except OSError as e:
+            self._send_status(f"Could not read {job.base_name} into memory ({e}); opening it from the folder instead.", "debug")
+            return None
+        finally:
+            self._add_stage_time(job.stats, "read_input", time.perf_counter() - started)
+
+    def _keep_input_data(self, job, buffer):
+        # A PDF read from a network share keeps its bytes only for the failed-folder copy, which
+        # would otherwise read the share a second time. They travel with the job to the finishing
+        # thread (pickled, when extraction ran in a worker process) and are dropped once it is done.
+        # Successful documents carry nothing, since every one of them would otherwise hold up to
+        # input_buffer_max_mb in the queues; their archive move reads the share again if it cannot
+        # be a rename. Local files are re-read from disk.
+        if not buffer.mapped and job.result_type in ("no_text", "failed"):
+            job.input_data = buffer.data
+
+    def _extract_document(self, job, buffer=None):
+        stats = job.stats
+        pdf_path, base_name = job.pdf_path, job.base_name
         text_file_name = os.path.splitext(base_name)[0] + ".txt"
-        
+        job.text_file_path = os.path.join(self.output_text_folder, text_file_name)
+        job.partial_text_file_path = job.text_file_path + ".partial"
+
         doc = None
-        result_type = "failed" # Default to failed
-        error_details = ""
 
         self._send_status(f"Attempting to process: {base_name}")
 
+        if self.dedup_index is not None:
+            job.content_hash, job.duplicate_of = self._find_duplicate(pdf_path, base_name, stats, buffer)
+            if job.duplicate_of:
+                job.result_type = "duplicate"
+                return
+
+        job.job_id = self._journal_claim(pdf_path, job.partial_text_file_path, job.content_hash)
+
         try:
             # Open PDF
-            self._send_status(f"Opening PDF: {pdf_path}")
-            doc = fitz.open(pdf_path)
-            self._send_status(f"Successfully opened PDF: {base_name}")
-
-            # Extract text
-            full_text = ""
-            self._send_status(f"Starting text extraction for {base_name}...")
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                full_text += page.get_text()
-                self._send_status(f"Extracted text from page {page_num + 1} of {base_name}. Current text length: {len(full_text)}.")
-            self._send_status(f"Finished text extraction for {base_name}. Total text length: {len(full_text)}.")
-
-            # Determine where to save the text file and if it should be written
-            should_write_text_file = True
-            if not full_text.strip():
-                self._send_status(f"No significant text extracted from {base_name}.")
-                result_type = "no_text"
-                should_write_text_file = False
-                target_text_folder = None # No text file to write
+            self._send_status(f"Opening PDF: {pdf_path}", "debug")
+            open_started = time.perf_counter()
+            import fitz # PyMuPDF; the first document of a process also pays for the import here
+            if buffer is not None:
+                stats["bytes_in"] = buffer.stat.st_size
+                job.arrival = buffer.stat.st_mtime # When the fax landed in the input folder
+                doc = fitz.open(stream=buffer.data, filetype="pdf")
             else:
-                self._send_status(f"Text extracted from {base_name}. Text file will go to output folder.")
-                target_text_folder = self.output_text_folder
-                result_type = "success"
+                stats["bytes_in"] = os.path.getsize(pdf_path)
+                job.arrival = os.path.getmtime(pdf_path)
+                doc = fitz.open(pdf_path)
+            job.page_count = stats["pages"] = len(doc)
+            self._add_stage_time(stats, "open", time.perf_counter() - open_started)
+            self._send_status(f"Successfully opened PDF: {base_name}", "debug")
 
-            if should_write_text_file:
-                target_text_file_path = os.path.join(target_text_folder, text_file_name)
+            # Extract text page by page straight into a partial file next to the final .txt,
+            # so memory use is bounded by one page instead of the whole document
+            self._send_status(f"Starting text extraction for {base_name}...", "debug")
+            self._send_status(f"Attempting to write text to: {text_file_name}", "debug")
+            try:
+                job.page_spans = {} if self.search_index is not None else None
+                split = self.router.new_split() if self.router is not None else None
+                text_length, text_page_count = self._write_text_streaming(doc, base_name, job.partial_text_file_path, stats, job.page_spans, split)
+            except OSError as write_e:
+                self._send_status(f"Error writing text file {text_file_name}: {write_e}", "error")
+                job.result_type = "failed"
+                job.error_details = str(write_e)
+                # If text file writing fails, we still try to archive the original PDF
+                # and return 'failed'
+            else:
+                self._send_status(f"Finished text extraction for {base_name}. Total text length: {text_length}.", "debug")
+                if stats["ocr_pages"] or stats["ocr_cache_hits"]:
+                    self._send_status(f"OCR recovered {stats['ocr_pages'] + stats['ocr_cache_hits']} page(s) of {base_name} "
+                                      f"({stats['ocr_cache_hits']} from cache, {stats['ocr_seconds']:.1f}s OCR time).")
+                if stats["ocr_failures"]:
+                    self._send_status(f"WARNING: OCR failed on {stats['ocr_failures']} page(s) of {base_name}: {stats['ocr_error']}", "warning")
+
+                if text_page_count == 0:
+                    self._send_status(f"No significant text extracted from {base_name}.", "warning")
+                    job.result_type = "no_text"
+                    self._journal_advance(job.job_id, EXTRACTED, result_type=job.result_type, page_count=job.page_count)
+                else:
+                    self._send_status(f"Text extracted from {base_name}. Text file will go to output folder.", "debug")
+                    job.result_type = "success" # Provisional until write_text puts the .txt in place
+                    if split is not None and len(split.segments) > 1:
+                        job.segments = split.segments
+                        self._send_status(f"{base_name} holds {len(job.segments)} patients/documents; splitting it.")
+                        if self.router.split_pdf:
+                            self._write_split_pdfs(doc, job)
 
-                # Write text to file
-                self._send_status(f"Attempting to write text to: {os.path.basename(target_text_file_path)}")
-                try:
-                    with open(target_text_file_path, "w", encoding="utf-8") as text_file:
-                        text_file.write(full_text)
-                    self._send_status(f"Successfully wrote text to: {os.path.basename(target_text_file_path)}")
-                except Exception as write_e:
-                    self._send_status(f"Error writing text file {os.path.basename(target_text_file_path)}: {write_e}")
-                    result_type = "failed"
-                    error_details = str(write_e)
-                    # If text file writing fails, we still try to archive the original PDF
-                    # and return 'failed'
-                    
         except Exception as e:
-            error_details = str(e)
-            self._send_status(f"An unexpected error occurred while processing {base_name}: {error_details}")
-            result_type = "failed"
+            job.error_details = str(e)
+            self._send_status(f"An unexpected error occurred while processing {base_name}: {job.error_details}", "error")
+            job.result_type = "failed"
             # No text file is written to failed_text_extraction_folder in case of error,
-            # only the original PDF is copied there in the finally block.
+            # only the original PDF is copied there in finish_document.
 
         finally:
             if doc:
-                self._send_status(f"Closing PDF document: {base_name}")
+                self._send_status(f"Closing PDF document: {base_name}", "debug")
                 doc.close()
 
-            # Handle original PDF movement based on result_type
-            if result_type == "no_text" or result_type == "failed":
-                # Copy original PDF to failed_text_extraction_folder
-                failed_pdf_path = os.path.join(self.failed_text_extraction_folder, base_name)
-                copied_to_failed = self._move_file_with_retry(pdf_path, failed_pdf_path, operation="copy", file_description="failed PDF copy")
-                if not copied_to_failed:
-                    self._send_status(f"WARNING: Could not copy original PDF {base_name} to failed text extraction folder.")
-            
-            # Always attempt to move original PDF to archive
-            archive_path = os.path.join(self.archive_folder, base_name)
-            original_pdf_moved = self._move_file_with_retry(pdf_path, archive_path, operation="move", file_description="original PDF")
-            
-            if not original_pdf_moved:
-                self._send_status(f"WARNING: Original PDF {base_name} could not be archived. It remains in the source folder.")
-                if result_type != "failed": # If it was success or no_text but couldn't archive
-                    result_type = "failed_archive" # New status for archiving failure
-                    error_details = "Could not archive original PDF."
+    def write_text(self, job):
+        # Phase 2 (local I/O): rename the .partial into place and record the result in the indexes
+        started = time.perf_counter()
+        try:
+            self._write_text(job)
+        finally:
+            job.stats["seconds"] += time.perf_counter() - started
+        return job
+
+    def _write_text(self, job):
+        stats = job.stats
+        base_name = job.base_name
+        if job.result_type == "duplicate":
+            return
+
+        if job.result_type == "success" and job.segments:
+            self._write_outputs(job, self._segment_outputs(job))
+        elif job.result_type == "success" and self.output_exts != [".txt"]:
+            stem_path = os.path.splitext(job.text_file_path)[0]
+            self._write_outputs(job, [self._output_files(job.partial_text_file_path, 1, stem_path, self.output_exts)])
+        elif job.result_type == "success":
+            try:
+                # Atomic on the same volume: readers never see a half-written .txt
+                rename_started = time.perf_counter()
+                job.text_file_path = self._unique_text_path(job.text_file_path)
+                self._journal_advance(job.job_id, EXTRACTED, result_type="success", text_path=job.text_file_path, page_count=job.page_count)
+                os.replace(job.partial_text_file_path, job.text_file_path)
+                self._journal_advance(job.job_id, TEXT_WRITTEN)
+                self._add_stage_time(stats, "text_write", time.perf_counter() - rename_started)
+                self._send_status(f"Successfully wrote text to: {os.path.basename(job.text_file_path)}")
+            except OSError as write_e:
+                self._send_status(f"Error writing text file {os.path.basename(job.text_file_path)}: {write_e}", "error")
+                job.result_type = "failed"
+                job.error_details = str(write_e)
+
+        if self.search_index is not None and job.result_type == "success" and job.segments:
+            # One search document per segment, so a hit opens the right patient's file
+            for segment, text_path in zip(job.segments, job.segment_text_paths):
+                pages = self._read_back_pages(text_path, job.page_spans.get(segment.number, []))
+                self._index_document(base_name, text_path, job.result_type, job.arrival, pages, len(segment.pages), stats,
+                                     source_pages=[page_num + 1 for page_num in segment.pages])
+        elif self.search_index is not None and job.result_type in ("success", "no_text"):
+            text_path = job.text_file_path if job.result_type == "success" else None
+            pages = self._read_back_pages(text_path, job.page_spans.get(1, [])) if text_path else []
+            self._index_document(base_name, text_path, job.result_type, job.arrival, pages, job.page_count, stats)
+
+        # Nothing to keep from an unfinished or text-less extraction
+        self._remove_partials(job.partial_text_file_path)
+
+        if job.content_hash and job.result_type in ("success", "no_text"):
+            output_path = job.text_file_path if job.result_type == "success" else None
+            self._record_result(job.content_hash, base_name, job.result_type, output_path, job.page_count)
+        elif job.content_hash and job.result_type == "failed":
+            self._release_claim(job.content_hash, base_name)
+
+    def _write_outputs(self, job, output_groups):
+        # The single .txt case for several files: a split document's segments and/or .json outputs
+        # (one group of (partial, final) pairs per segment). The journal learns every pair before the
+        # first rename, so recovery can finish a crashed set of renames (_recover_outputs); a rename
+        # failing here puts the ones already done back, leaving no partial set of outputs behind.
+        started = time.perf_counter()
+        main_paths = [outputs[0][1] for outputs in output_groups]
+        renamed = []
+        try:
+            self._journal_advance(job.job_id, EXTRACTED, result_type="success", text_path=main_paths[0],
+                                  page_count=job.page_count, outputs=json.dumps(output_groups))
+            for outputs in output_groups:
+                for partial_path, final_path in outputs:
+                    os.replace(partial_path, final_path)
+                    renamed.append((partial_path, final_path))
+                    self._send_status(f"Successfully wrote {'split ' if job.segments else ''}output to: {os.path.basename(final_path)}")
+            if job.segments:
+                job.segment_text_paths = main_paths
+            job.text_file_path = main_paths[0]
+            self._journal_advance(job.job_id, TEXT_WRITTEN)
+        except OSError as write_e:
+            self._send_status(f"Error writing output files for {job.base_name}: {write_e}", "error")
+            self._undo_renames(renamed)
+            job.result_type = "failed"
+            job.error_details = str(write_e)
+            self._journal_advance(job.job_id, EXTRACTED, result_type="failed", error_details=job.error_details)
+        finally:
+            self._add_stage_time(job.stats, "text_write", time.perf_counter() - started)
+
+    def _undo_renames(self, renamed):
+        # Back to their .partial names, which the caller then removes with the rest
+        for partial_path, final_path in reversed(renamed):
+            try:
+                os.replace(final_path, partial_path)
+            except OSError as e:
+                self._send_status(f"WARNING: Could not remove incomplete output {os.path.basename(final_path)}: {e}", "warning")
+
+    def finish_document(self, job):
+        # Phase 3 (share I/O): failed copy and archive move; returns the result tuple
+        started = time.perf_counter()
+        try:
+            return self._finish_document(job)
+        finally:
+            job.input_data = None
+            job.stats["seconds"] += time.perf_counter() - started
+
+    def _finish_document(self, job):
+        stats = job.stats
+        pdf_path, base_name = job.pdf_path, job.base_name
+        if job.result_type == "duplicate":
+            return self._archive_duplicate(job)
+
+        result_type = job.result_type
+        error_details = job.error_details
+
+        # Handle original PDF movement based on result_type
+        if result_type == "no_text" or result_type == "failed":
+            # Copy original PDF to failed_text_extraction_folder
+            failed_pdf_path = os.path.join(self.failed_text_extraction_folder, base_name)
+            copied_to_failed = self._move_file_with_retry(pdf_path, failed_pdf_path, operation="copy", file_description="failed PDF copy", stage="failed_copy", stats=stats, data=job.input_data)
+            if not copied_to_failed:
+                self._send_status(f"WARNING: Could not copy original PDF {base_name} to failed text extraction folder.", "warning")
+            else:
+                self._journal_advance(job.job_id, FAILED_COPIED, result_type=result_type, error_details=error_details)
+
+        # Always attempt to move original PDF to archive
+        archive_path = os.path.join(self.archive_folder, base_name)
+        original_pdf_moved = self._move_file_with_retry(pdf_path, archive_path, operation="move", file_description="original PDF", stage="archive", stats=stats, data=job.input_data)
+
+        if not original_pdf_moved:
+            self._send_status(f"WARNING: Original PDF {base_name} could not be archived. It remains in the source folder.", "warning")
+            if result_type != "failed": # If it was success or no_text but couldn't archive
+                result_type = "failed_archive" # New status for archiving failure
+                error_details = "Could not archive original PDF."
+        # The PDF is archived, queued for archiving, or left in the input folder to be picked up
+        # again; only a queued move keeps the job open
+        self._journal_settle(job.job_id, stats, result_type, error_details)
 
-        return (result_type, base_name, error_details)
\ No newline at end of file
+        return (result_type, base_name, error_details)
@@ -0,0 +1,148 @@
+import collections
+import app_config
+from pdf_processor import PDFProcessor
+
+# Marks an input iterator that has run dry.
+_EXHAUSTED = object()
+
+# Assumed extraction cost of a source's first document, before any has been timed
+_INITIAL_COST_SECONDS = 1.0
+
+
+class Pipeline:
+    # One input feed (RightFax, a Direct messaging drop, a scanner share...) with its own folders,
+    # a priority (its weight in the fair share of extraction workers) and an optional cap on how
+    # many workers it may hold at once (0 = no cap beyond the shared pool)
+    def __init__(self, name, pdf_processor, settings, priority=1, worker_quota=0):
+        self.name = name
+        self.pdf_processor = pdf_processor
+        self.settings = settings
+        self.priority = max(1, int(priority))
+        self.worker_quota = max(0, int(worker_quota))
+
+    @classmethod
+    def from_settings(cls, settings, status_callback=None, config_file=app_config.CONFIG_FILE, create_folders=True):
+        # settings: one entry of app_config.pipeline_settings()
+        return cls(
+            settings["pipeline_name"],
+            PDFProcessor.from_settings(settings, status_callback=status_callback, config_file=config_file,
+                                       create_folders=create_folders),
+            settings,
+            priority=settings["pipeline_priority"],
+            worker_quota=settings["pipeline_worker_quota"]
+        )
+
+
+def create_pipelines(settings, status_callback=None, config_file=app_config.CONFIG_FILE, create_folders=True):
+    return [Pipeline.from_settings(pipeline_settings, status_callback, config_file, create_folders)
+            for pipeline_settings in app_config.pipeline_settings(settings)]
+
+
+class _SourceState:
+    def __init__(self, name, pdf_paths, priority, worker_quota):
+        self.name = name
+        self.iterator = iter(pdf_paths)
+        self.weight = max(1, int(priority))
+        self.worker_quota = worker_quota
+        # Paths read ahead from the iterator on a thread: one per worker the pipeline may hold, so
+        # when several workers free up at once it can take all the turns it is owed
+        self.ready = collections.deque()
+        self.exhausted = False
+        self.in_flight = 0
+        self.virtual_seconds = 0.0 # Extraction seconds used, divided by weight
+        self.average_cost = _INITIAL_COST_SECONDS
+        self.charged = {} # pdf path -> cost charged when it was handed out
+
+
+class FairScheduler:
+    # Shares the extraction workers between pipelines by weighted fair queueing: the next free
+    # worker goes to the pipeline that has used the least extraction time relative to its priority,
+    # among those with a PDF waiting and below their worker quota. A bulk load on one feed therefore
+    # only gets its share, and a fax arriving on another feed takes the next free worker. A single
+    # document is never interrupted, so give bulk feeds a worker_quota below the pool size to keep
+    # a worker free for everyone else.
+    # Input iterators may block (folder listings, watch mode), so they are read on threads; all
+    # other state is only touched from the event loop.
+    def __init__(self, sources, total_workers, cancelled=None):
+        # sources: (name, pdf_paths, priority, worker_quota) tuples
+        self.total_workers = max(1, int(total_workers))
+        self._states = {name: _SourceState(name, pdf_paths, priority, worker_quota or self.total_workers)
+                        for name, pdf_paths, priority, worker_quota in sources}
+        self._cancelled = cancelled # threading.Event; stops handing out work when set
+        self._changed = None
+        self._readers = []
+
+    def _is_cancelled(self):
+        return self._cancelled is not None and self._cancelled.is_set()
+
+    def start(self, loop):
+        import asyncio # Deferred like async_pipeline itself: create_pipelines() runs at GUI startup
+        self._changed = asyncio.Condition()
+        self._readers = [loop.create_task(self._read_ahead(loop, state)) for state in self._states.values()]
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _read_ahead(self, loop, state):
+        while not self._is_cancelled():
+            pdf_path = await loop.run_in_executor(None, next, state.iterator, _EXHAUSTED)
+            if pdf_path is _EXHAUSTED:
+                state.exhausted = True
+                await self._notify()
+                return
+            if state.in_flight == 0 and not state.ready:
+                # Coming back from idle: start level with the busy pipelines instead of claiming
+                # all the time it did not use while it had nothing to do
+                busy = [other.virtual_seconds for other in self._states.values() if other.in_flight]
+                if busy:
+                    state.virtual_seconds = max(state.virtual_seconds, min(busy))
+            state.ready.append(pdf_path)
+            async with self._changed:
+                self._changed.notify_all()
+                await self._changed.wait_for(lambda: len(state.ready) < state.worker_quota or self._is_cancelled())
+
+    def _pick(self):
+        ready = [state for state in self._states.values()
+                 if state.ready and state.in_flight < state.worker_quota]
+        if not ready:
+            return None
+        return min(ready, key=lambda state: (state.virtual_seconds, -state.weight))
+
+    def _finished(self):
+        return self._is_cancelled() or all(state.exhausted and not state.ready for state in self._states.values())
+
+    async def acquire(self):
+        # Waits for the next (pipeline name, pdf path) to extract; None once every input is done
+        import asyncio
+        async with self._changed:
+            while True:
+                if self._finished():
+                    return None
+                state = self._pick()
+                if state is not None:
+                    pdf_path = state.ready.popleft()
+                    state.in_flight += 1
+                    # Charge the expected cost now so the other workers picking at the same
+                    # moment see it; release() settles the difference
+                    state.charged[pdf_path] = state.average_cost
+                    state.virtual_seconds += state.average_cost / state.weight
+                    self._changed.notify_all() # Wakes the reader to fetch this source's next path
+                    return state.name, pdf_path
+                try:
+                    # Poll now and then: cancellation is signalled from another thread
+                    await asyncio.wait_for(self._changed.wait(), 0.5)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, name, pdf_path, seconds):
+        # seconds: how long the extraction held its worker
+        state = self._states[name]
+        state.in_flight -= 1
+        state.virtual_seconds += (seconds - state.charged.pop(pdf_path, 0.0)) / state.weight
+        state.average_cost = 0.8 * state.average_cost + 0.2 * seconds
+        await self._notify()
+
+    def stop(self):
+        for reader in self._readers:
+            reader.cancel()
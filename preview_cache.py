@@ -0,0 +1,128 @@
+import os
+import collections
+import concurrent.futures
+
+
+def render_page(pdf_path, page_num, width):
+    # Runs in the preview process: opens the PDF, loads just this one page and returns
+    # (PNG bytes scaled to `width` pixels, page count, page text)
+    import fitz # PyMuPDF; only the preview process ever needs it
+    with fitz.open(pdf_path) as doc:
+        page = doc.load_page(page_num)
+        zoom = width / max(page.rect.width, 1)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return pix.tobytes("png"), len(doc), page.get_text()
+
+
+class LRUCache:
+    # Byte-capped least-recently-used cache; values are (value, size in bytes)
+    def __init__(self, max_bytes):
+        self.max_bytes = max(0, int(max_bytes))
+        self.current_bytes = 0
+        self._items = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._items.get(key)
+        if item is None:
+            return default
+        self._items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, size):
+        if key in self._items:
+            self.current_bytes -= self._items.pop(key)[1]
+        if size > self.max_bytes:
+            return # Would evict everything else and still not fit
+        self._items[key] = (value, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _key, (_value, evicted_size) = self._items.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def clear(self):
+        self._items.clear()
+        self.current_bytes = 0
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+class PreviewLoader:
+    # Renders page images for the GUI results browser. Only what the browser currently shows is
+    # asked for (want()); requests that scrolled out of view before their turn are dropped, so
+    # flicking through thousands of rows never renders more than a screenful. Rendering happens in
+    # a separate process because PyMuPDF must not run on two threads of one process (the GUI's
+    # processing thread may be extracting at the same time). Every method runs on the Tk thread.
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_in_flight=2):
+        self.cache = LRUCache(max_bytes)
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._executor = None
+        self._wanted = collections.OrderedDict() # key -> (pdf_path, page_num, width), in display priority
+        self._in_flight = {} # future -> key
+        self._failed = {} # key -> error message, so a broken PDF is not re-rendered on every scroll
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+        return self._executor
+
+    def want(self, requests):
+        # requests: (pdf_path, page_num, width) tuples, most important first. Replaces earlier ones.
+        self._wanted.clear()
+        for request in requests:
+            if request not in self.cache and request not in self._failed:
+                self._wanted[request] = request
+
+    def result(self, request):
+        # (PNG bytes, page count, page text), or None if it is not rendered (yet)
+        return self.cache.get(request)
+
+    def error(self, request):
+        return self._failed.get(request)
+
+    def clear_errors(self):
+        self._failed.clear()
+
+    def poll(self):
+        # Collects finished renders and starts the next wanted ones; returns the requests that
+        # completed (successfully or not) since the last call
+        done = []
+        for future in [future for future in self._in_flight if future.done()]:
+            request = self._in_flight.pop(future)
+            try:
+                png, page_count, text = future.result()
+            except Exception as e:
+                self._failed[request] = str(e) or e.__class__.__name__
+            else:
+                self.cache.put(request, (png, page_count, text), len(png) + len(text) * 2)
+            done.append(request)
+
+        busy = set(self._in_flight.values())
+        while self._wanted and len(self._in_flight) < self.max_in_flight:
+            request, _ = self._wanted.popitem(last=False)
+            if request in busy or request in self.cache:
+                continue
+            pdf_path, page_num, width = request
+            if not os.path.exists(pdf_path):
+                self._failed[request] = "PDF not found (not archived yet, or moved)"
+                done.append(request)
+                continue
+            try:
+                future = self._pool().submit(render_page, pdf_path, page_num, width)
+            except Exception as e: # e.g. BrokenProcessPool after MuPDF crashed the preview process
+                self._executor = None
+                self._failed[request] = str(e) or e.__class__.__name__
+                done.append(request)
+                continue
+            self._in_flight[future] = request
+        return done
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._wanted.clear()
+        self._in_flight.clear()
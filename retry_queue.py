@@ -0,0 +1,243 @@
+import os
+import time
+import random
+import threading
+from file_ops import atomic_copy, atomic_move
+from sqlite_connections import SqliteConnections
+
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=60.0):
+    # Exponential backoff with "equal jitter": half the delay is fixed, half random, so files
+    # locked by the same scanner do not all come back at the same instant
+    delay = min(max_delay, base_delay * (2 ** max(0, attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitBreaker:
+    # Per-destination failure counter. After `threshold` consecutive failures the destination is
+    # left alone for `cooldown` seconds; the first attempt after that either closes it again or
+    # re-opens it straight away.
+    def __init__(self, threshold=3, cooldown=30.0):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = float(cooldown)
+        self._failures = {}
+        self._open_until = {}
+
+    def open_until(self, key):
+        return self._open_until.get(key, 0.0)
+
+    def record_success(self, key):
+        self._failures.pop(key, None)
+        self._open_until.pop(key, None)
+
+    def record_failure(self, key, now):
+        # Returns True when this failure opened the circuit
+        failures = self._failures[key] = self._failures.get(key, 0) + 1
+        if failures >= self.threshold:
+            was_open = self._open_until.get(key, 0.0) > now
+            self._open_until[key] = now + self.cooldown
+            return not was_open
+        return False
+
+
+def _create_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS file_retries (
+            retry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            src_path TEXT NOT NULL,
+            dest_path TEXT NOT NULL,
+            description TEXT NOT NULL,
+            required INTEGER NOT NULL,
+            attempts INTEGER NOT NULL,
+            next_attempt REAL NOT NULL,
+            last_error TEXT,
+            created REAL NOT NULL
+        )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS file_retries_src ON file_retries (src_path)")
+
+
+class RetryQueue:
+    # Disk-backed queue of file moves/copies that failed on their first attempt. Batch workers
+    # enqueue and carry on extracting; one background thread in the collecting process retries
+    # with backoff. Steps queued under the same group_id (one document) run strictly in order,
+    # so a document's failed copy always happens before its original is archived.
+    def __init__(self, db_path, max_attempts=8, base_delay=0.5, max_delay=60.0, breaker_threshold=3, breaker_cooldown=30.0):
+        self.db_path = db_path
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.status_callback = None
+        self._connections = SqliteConnections(db_path, _create_tables)
+        self._thread = None
+        self._wakeup = None
+        self._stop = None
+        self._idle = None
+        self._failed_groups = set()
+        self._outcome_lock = threading.Lock() # A group's last row and its failure flag change together
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("status_callback", "_thread", "_wakeup", "_stop", "_idle", "_outcome_lock"):
+            state[name] = None
+        state["_failed_groups"] = set()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._outcome_lock = threading.Lock()
+
+    def _connection(self):
+        return self._connections.get()
+
+    def _send_status(self, message, level="info"):
+        if self.status_callback:
+            self.status_callback(message, level)
+
+    def enqueue(self, group_id, operation, src_path, dest_path, description, required, attempts=1, last_error=None):
+        # `required` steps decide the group's outcome (archiving the original); the rest only warn
+        now = time.time()
+        next_attempt = now + backoff_delay(attempts, self.base_delay, self.max_delay) if attempts else now
+        conn = self._connection()
+        with conn:
+            conn.execute("""
+                INSERT INTO file_retries (group_id, operation, src_path, dest_path, description, required, attempts, next_attempt, last_error, created)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (group_id, operation, os.path.abspath(src_path), os.path.abspath(dest_path), description, int(required),
+                 attempts, next_attempt, last_error, now))
+
+    def pending_count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM file_retries").fetchone()[0]
+
+    def has_group(self, group_id):
+        return self._connection().execute("SELECT 1 FROM file_retries WHERE group_id = ? LIMIT 1", (group_id,)).fetchone() is not None
+
+    def has_queued_move(self, src_path):
+        # True while a move of src_path (an input PDF waiting to be archived) is still queued
+        row = self._connection().execute("SELECT 1 FROM file_retries WHERE src_path = ? AND operation = 'move' LIMIT 1",
+                                         (os.path.abspath(src_path),)).fetchone()
+        return row is not None
+
+    def take_outcome(self, group_id):
+        # None while steps are still queued, then "ok" or "failed" (a required step ran out of retries).
+        # Only valid in the process running the retry thread, and only once per group.
+        with self._outcome_lock:
+            if self.has_group(group_id):
+                return None
+            if group_id in self._failed_groups:
+                self._failed_groups.discard(group_id)
+                return "failed"
+            return "ok"
+
+    def start(self, status_callback=None):
+        # Starts the retry thread in this process; also picks up anything left from a previous run
+        if status_callback is not None:
+            self.status_callback = status_callback
+        if self._thread is not None and self._thread.is_alive():
+            return
+        # Create the table (and switch the file to WAL) before any worker process touches it
+        self._connection()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="file-retry-queue", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def wait_idle(self, timeout=None):
+        # Blocks until every queued step has succeeded or run out of retries; False on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.wake()
+        with self._idle:
+            while self.pending_count():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(1.0 if remaining is None else min(1.0, remaining))
+        return True
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            try:
+                wait = self._retry_due()
+            except Exception as e:
+                self._send_status(f"File retry queue error: {e}", "error")
+                wait = 5.0
+            with self._idle:
+                self._idle.notify_all()
+            # Workers enqueue from other processes, so poll now and then even without a wake()
+            self._wakeup.wait(wait)
+
+    def _retry_due(self):
+        # Runs every step that is due; returns seconds until the next one
+        conn = self._connection()
+        heads = conn.execute("""
+            SELECT * FROM file_retries r
+            WHERE retry_id = (SELECT MIN(retry_id) FROM file_retries WHERE group_id = r.group_id)
+            ORDER BY next_attempt""").fetchall()
+        next_wait = 1.0
+        for row in heads:
+            now = time.time()
+            destination = os.path.dirname(row["dest_path"])
+            due = max(row["next_attempt"], self.breaker.open_until(destination))
+            if due > now:
+                next_wait = min(next_wait, due - now)
+                continue
+            if self._stop.is_set():
+                break
+            self._attempt(conn, row, destination)
+            next_wait = 0.0 # The group's next step may be runnable right away
+        return next_wait
+
+    def _attempt(self, conn, row, destination):
+        name = os.path.basename(row["src_path"])
+        try:
+            if row["operation"] == "move" and not os.path.exists(row["src_path"]) and os.path.exists(row["dest_path"]):
+                pass # Already moved before a restart, or by hand
+            elif row["operation"] == "move":
+                atomic_move(row["src_path"], row["dest_path"])
+            else:
+                atomic_copy(row["src_path"], row["dest_path"])
+        except Exception as e:
+            now = time.time()
+            if self.breaker.record_failure(destination, now):
+                self._send_status(f"Pausing retries to {destination} for {self.breaker.cooldown:.0f}s after repeated failures: {e}", "warning")
+            attempts = row["attempts"] + 1
+            permanent = not os.path.exists(row["src_path"]) # Nothing left to retry with
+            if attempts >= self.max_attempts or permanent:
+                # Flag the failure before the row goes, or take_outcome() could see an empty group
+                # in between and report it as "ok"
+                with self._outcome_lock:
+                    if row["required"]:
+                        self._failed_groups.add(row["group_id"])
+                    with conn:
+                        conn.execute("DELETE FROM file_retries WHERE retry_id = ?", (row["retry_id"],))
+                self._send_status(f"Giving up on {row['operation']} of {row['description']} {name} after {attempts} attempts: {e}", "error")
+            else:
+                with conn:
+                    conn.execute("UPDATE file_retries SET attempts = ?, next_attempt = ?, last_error = ? WHERE retry_id = ?",
+                                 (attempts, now + backoff_delay(attempts, self.base_delay, self.max_delay), str(e), row["retry_id"]))
+            return
+
+        self.breaker.record_success(destination)
+        with conn:
+            conn.execute("DELETE FROM file_retries WHERE retry_id = ?", (row["retry_id"],))
+        op_word = "moved" if row["operation"] == "move" else "copied"
+        self._send_status(f"Successfully {op_word} {row['description']} on attempt {row['attempts'] + 1}: {name}")
+
+    def close(self):
+        self.stop()
+        self._connections.close()
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import sqlite3
+import itertools
+from sqlite_connections import SqliteConnections
+from structured_output import read_page_texts
+
+SNIPPET_TOKENS = 12 # Words of context around each hit
+# Page rows of document n get FTS rowids n << PAGE_BITS upwards, so a document's pages can be
+# deleted by rowid range instead of scanning the whole table for its (unindexed) document_id
+PAGE_BITS = 20
+
+
+def _quote_terms(query):
+    # Fallback for input that is not valid FTS5 syntax (e.g. "DOB: 01/02/1950"): match every word literally
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def _create_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            document_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_name TEXT NOT NULL,
+            text_path TEXT UNIQUE,
+            result_type TEXT NOT NULL,
+            arrival REAL NOT NULL,
+            indexed REAL NOT NULL,
+            page_count INTEGER,
+            pdf_path TEXT,
+            source_pages TEXT
+        )""")
+    # Indexes created before the results browser / before split segments knew their pages
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}
+    for column in ("pdf_path", "source_pages"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE documents ADD COLUMN {column} TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS documents_arrival ON documents (arrival)")
+    # page is NULL for text indexed from a .txt file, where page boundaries are no longer known
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+            source_name, text, document_id UNINDEXED, page UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )""")
+
+
+class SearchIndex:
+    # SQLite FTS5 index over extracted text, one row per page, updated by PDFProcessor right after
+    # each .txt is put in place. Rows are keyed by the .txt path, so re-processing or deleting a
+    # document only touches that document's rows.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._connections = SqliteConnections(db_path, _create_tables)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def _delete_document(self, conn, document_id):
+        conn.execute("DELETE FROM pages WHERE rowid BETWEEN ? AND ?",
+                     (document_id << PAGE_BITS, ((document_id + 1) << PAGE_BITS) - 1))
+        conn.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+
+    def add_document(self, source_name, text_path, result_type, arrival, pages, page_count=None, pdf_path=None, source_pages=None):
+        # pages: (page number, text) pairs, read lazily (one page in memory at a time when pages
+        # is a generator). A document already indexed under text_path is replaced.
+        # pdf_path is where the original ends up (the archive), for the GUI results browser.
+        # source_pages: for one segment of a split packet, the packet's page numbers (1-based) that
+        # make up the document, in order; see source_page()
+        text_path = os.path.abspath(text_path) if text_path else None
+        pdf_path = os.path.abspath(pdf_path) if pdf_path else None
+        source_pages = json.dumps(list(source_pages)) if source_pages else None
+        conn = self._connection()
+        with conn:
+            if text_path:
+                row = conn.execute("SELECT document_id FROM documents WHERE text_path = ?", (text_path,)).fetchone()
+                if row:
+                    self._delete_document(conn, row["document_id"])
+            cursor = conn.execute("""
+                INSERT INTO documents (source_name, text_path, result_type, arrival, indexed, page_count, pdf_path, source_pages)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (source_name, text_path, result_type, arrival, time.time(), page_count, pdf_path, source_pages))
+            document_id = cursor.lastrowid
+            first_rowid = document_id << PAGE_BITS
+            rows = ((first_rowid + i, source_name, text, document_id, page) for i, (page, text) in enumerate(pages))
+            first_row = next(rows, None)
+            if first_row is None:
+                first_row = (first_rowid, source_name, "", document_id, None) # Still findable by file name
+            conn.executemany("INSERT INTO pages (rowid, source_name, text, document_id, page) VALUES (?, ?, ?, ?, ?)",
+                             itertools.chain([first_row], rows))
+        return document_id
+
+    def add_text_file(self, text_path, source_name=None, result_type="success", pdf_path=None):
+        # Indexes an existing .txt (recovered after a crash, or written before the index existed),
+        # or a .json output, which still knows its page boundaries
+        if text_path.lower().endswith(".json"):
+            pages = ((page, text) for page, text in read_page_texts(text_path) if text and not text.isspace())
+        else:
+            with open(text_path, "r", encoding="utf-8", errors="replace") as f:
+                pages = [(None, f.read())]
+        source_name = source_name or os.path.splitext(os.path.basename(text_path))[0] + ".pdf"
+        return self.add_document(source_name, text_path, result_type, os.path.getmtime(text_path), pages, pdf_path=pdf_path)
+
+    def remove(self, text_path):
+        text_path = os.path.abspath(text_path)
+        conn = self._connection()
+        with conn:
+            row = conn.execute("SELECT document_id FROM documents WHERE text_path = ?", (text_path,)).fetchone()
+            if row:
+                self._delete_document(conn, row["document_id"])
+        return row is not None
+
+    def sync(self, output_text_folder):
+        # Incremental catch-up with the output folder: drops documents whose .txt was deleted and
+        # adds .txt files that are not indexed yet; a .json counts as the document's text only when
+        # there is no .txt of the same name (output_format "json"). Returns (added, removed).
+        conn = self._connection()
+        indexed = {row["text_path"]: row["document_id"]
+                   for row in conn.execute("SELECT document_id, text_path FROM documents WHERE text_path IS NOT NULL")}
+        text_files = {} # path without extension -> path
+        json_files = {}
+        with os.scandir(output_text_folder) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                path = os.path.abspath(entry.path)
+                stem, ext = os.path.splitext(path)
+                if ext.lower() == ".txt":
+                    text_files[stem] = path
+                elif ext.lower() == ".json":
+                    json_files[stem] = path
+        on_disk = set(text_files.values())
+        on_disk.update(path for stem, path in json_files.items() if stem not in text_files)
+
+        removed = 0
+        with conn:
+            for text_path, document_id in indexed.items():
+                if text_path not in on_disk:
+                    self._delete_document(conn, document_id)
+                    removed += 1
+        added = 0
+        for text_path in sorted(on_disk.difference(indexed)):
+            self.add_text_file(text_path)
+            added += 1
+        return added, removed
+
+    def search(self, query, limit=20):
+        # Best-ranked pages first (bm25), each with a highlighted snippet
+        sql = f"""
+            SELECT d.source_name, d.text_path, d.result_type, d.arrival, p.page,
+                   snippet(pages, 1, '[', ']', '...', {SNIPPET_TOKENS}) AS snippet, p.rank AS score
+            FROM pages p JOIN documents d ON d.document_id = p.document_id
+            WHERE pages MATCH ?
+            ORDER BY p.rank
+            LIMIT ?"""
+        conn = self._connection()
+        try:
+            rows = conn.execute(sql, (query, limit)).fetchall()
+        except sqlite3.OperationalError:
+            rows = conn.execute(sql, (_quote_terms(query), limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def _document_filter(self, query):
+        # SQL condition (and its parameter) limiting documents to those matching an FTS query
+        if not query:
+            return "", ()
+        return "WHERE document_id IN (SELECT document_id FROM pages WHERE pages MATCH ?)", (query,)
+
+    def _query_documents(self, sql, query, params):
+        conn = self._connection()
+        try:
+            condition, args = self._document_filter(query)
+            return conn.execute(sql.format(condition=condition), args + params).fetchall()
+        except sqlite3.OperationalError:
+            condition, args = self._document_filter(_quote_terms(query))
+            return conn.execute(sql.format(condition=condition), args + params).fetchall()
+
+    def count_documents(self, query=None):
+        return self._query_documents("SELECT COUNT(*) FROM documents {condition}", query, ())[0][0]
+
+    def list_documents(self, offset=0, limit=100, query=None):
+        # Newest first, one window at a time, for the GUI results browser
+        rows = self._query_documents("""
+            SELECT document_id, source_name, text_path, result_type, arrival, page_count, pdf_path, source_pages
+            FROM documents {condition}
+            ORDER BY arrival DESC, document_id DESC
+            LIMIT ? OFFSET ?""", query, (limit, offset))
+        documents = [dict(row) for row in rows]
+        for document in documents:
+            document["source_pages"] = json.loads(document["source_pages"]) if document["source_pages"] else None
+        return documents
+
+    def page_text(self, document_id, page):
+        # Indexed text of one page (1-based), including OCR text; None if the page was not indexed
+        # on its own (blank page, or a document indexed from its .txt)
+        row = self._connection().execute("""
+            SELECT text FROM pages WHERE rowid BETWEEN ? AND ? AND page = ?""",
+            (document_id << PAGE_BITS, ((document_id + 1) << PAGE_BITS) - 1, page)).fetchone()
+        return row["text"] if row else None
+
+    @staticmethod
+    def source_page(document, page):
+        # Page number (1-based) in document["pdf_path"] - and in page_text() - of the document's
+        # page-th page: a segment of a split packet is a subset of the packet's pages
+        source_pages = document.get("source_pages")
+        if source_pages:
+            return source_pages[page - 1] if page <= len(source_pages) else None
+        return page
+
+    def close(self):
+        self._connections.close()
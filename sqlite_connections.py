@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import threading
+
+
+class SqliteConnections:
+    # One sqlite3 connection per thread for one database file, shared by DedupIndex, JobJournal,
+    # RetryQueue, SearchIndex and the OCR cache. sqlite3 connections must not be shared between
+    # threads or cross a fork, so each thread opens its own on first use and keeps it in a
+    # threading.local: it lives as long as the thread, however the threads interleave, and is
+    # closed when the thread ends. setup(conn) creates the tables once per connection. A forked or
+    # unpickled copy (batch worker processes) starts without any connection.
+    def __init__(self, db_path, setup=None):
+        self.db_path = db_path
+        self.setup = setup # Module-level function, so the owner stays picklable
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_local"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def get(self):
+        if self._pid != os.getpid():
+            self._local = threading.local() # Inherited through fork; they belong to the parent
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            if self.setup is not None:
+                self.setup(conn)
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        # Closes this thread's connection; those of other threads are closed as they are dropped
+        # here (or when their threads end). The next get() in any thread reconnects.
+        conn = getattr(self._local, "conn", None) if self._pid == os.getpid() else None
+        self._local = threading.local()
+        self._pid = os.getpid()
+        if conn is not None:
+            conn.close()
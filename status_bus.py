@@ -0,0 +1,43 @@
+import time
+import queue
+import collections
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+StatusEvent = collections.namedtuple("StatusEvent", ["timestamp", "level", "message"])
+
+
+def level_value(level):
+    return LEVELS.get(str(level).lower(), LEVELS["info"])
+
+
+class StatusBus:
+    # Thread-safe hand-off of status events from worker threads to the GUI thread.
+    # Producers call emit() from anywhere; the GUI drains in batches on its own schedule.
+    def __init__(self, min_level="info"):
+        self._queue = queue.SimpleQueue()
+        self.min_level = level_value(min_level)
+
+    def is_enabled(self, level):
+        return level_value(level) >= self.min_level
+
+    def emit(self, message, level="info"):
+        if level_value(level) < self.min_level:
+            return
+        self._queue.put(StatusEvent(time.time(), level, message))
+
+    def drain(self, max_events=500):
+        events = []
+        try:
+            while len(events) < max_events:
+                events.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+    def clear(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
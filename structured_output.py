@@ -0,0 +1,104 @@
+import json
+
+OUTPUT_FORMATS = ("text", "json", "both") # .txt only, .json instead of the .txt, or both side by side
+FORMAT_VERSION = 2 # 2: page_count moved after "pages" and counts the file's own pages; "segment" added
+READ_CHUNK_CHARS = 1 << 16
+_PAGES_ARRAY = '"pages":[' # As JsonDocumentWriter writes it (compact separators)
+
+
+def _bbox(rect):
+    return [round(value, 2) for value in rect]
+
+
+def page_record(page_num, page_rect, page_dict):
+    # Trims PyMuPDF's page.get_text("dict") down to what downstream parsers use: text blocks ->
+    # lines -> spans, each with its bounding box (PDF points, origin top-left) and the spans with
+    # their font, size and style flags. page_num is 0-based; the record's "number" is 1-based.
+    blocks = []
+    for block in page_dict["blocks"]:
+        if block.get("type", 0) != 0:
+            continue # Image block
+        lines = []
+        for line in block["lines"]:
+            spans = [{"text": span["text"], "bbox": _bbox(span["bbox"]), "font": span["font"],
+                      "size": round(span["size"], 2), "flags": span["flags"]}
+                     for span in line["spans"]]
+            lines.append({"bbox": _bbox(line["bbox"]), "text": "".join(span["text"] for span in spans), "spans": spans})
+        blocks.append({"bbox": _bbox(block["bbox"]), "lines": lines})
+    return {"number": page_num + 1, "width": round(page_rect.width, 2), "height": round(page_rect.height, 2), "blocks": blocks}
+
+
+def record_text(record):
+    # Plain text of a page record, one line per line and a blank line between blocks; OCR'd pages
+    # have no blocks and carry their text as it came from Tesseract
+    if "ocr_text" in record:
+        return record["ocr_text"]
+    return "\n\n".join("\n".join(line["text"] for line in block["lines"]) for block in record["blocks"])
+
+
+class JsonDocumentWriter:
+    # Writes {"format_version", "source", "source_page_count", "sorted", "pages": [...], "page_count",
+    # "segment"} one page at a time through the encoder's chunked output, so a 2,000-page document
+    # never exists as one dict (or one string) in memory. page_count is the number of pages in this
+    # file, which is only known at the end: for one part of a split PDF it is not the source's.
+    # finish() closes the JSON; a writer closed without it leaves a truncated file, which only ever
+    # happens to a .partial that is about to be removed.
+    def __init__(self, path, source_name, source_page_count, sorted_text=False):
+        self.file = open(path, "w", encoding="utf-8")
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        self._pages_written = 0
+        header = {"format_version": FORMAT_VERSION, "source": source_name, "source_page_count": source_page_count, "sorted": sorted_text}
+        self.file.write(self._encoder.encode(header)[:-1] + "," + _PAGES_ARRAY)
+
+    def write_page(self, record):
+        if self._pages_written:
+            self.file.write(",")
+        for chunk in self._encoder.iterencode(record):
+            self.file.write(chunk)
+        self._pages_written += 1
+
+    def finish(self, segment=None):
+        # segment: {"number", "count", "label"} when this file is one part of a split PDF
+        trailer = {"page_count": self._pages_written}
+        if segment is not None:
+            trailer["segment"] = segment
+        self.file.write("]," + self._encoder.encode(trailer)[1:] + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def iter_page_records(json_path):
+    # The page records of a .json output one at a time: the file is read in chunks and the "pages"
+    # array decoded record by record, so only one page (plus a chunk) is ever in memory
+    decoder = json.JSONDecoder()
+    with open(json_path, "r", encoding="utf-8") as f:
+        buffer = ""
+        while _PAGES_ARRAY not in buffer:
+            chunk = f.read(READ_CHUNK_CHARS)
+            if not chunk:
+                raise ValueError(f"{json_path} has no pages array")
+            buffer += chunk
+        position = buffer.index(_PAGES_ARRAY) + len(_PAGES_ARRAY)
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The record runs past the end of the buffer (or the file is truncated)
+                chunk = f.read(READ_CHUNK_CHARS)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield record
+
+
+def read_page_texts(json_path):
+    # (page number, text) pairs of a .json output, e.g. to index it again after a rebuild
+    for record in iter_page_records(json_path):
+        yield record["number"], record_text(record)
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+import app_config
+
+
+def _settings(*pipelines):
+    return dict(app_config.DEFAULT_SETTINGS, input_pdf_folder="in", output_text_folder="out", archive_folder="archive",
+                failed_text_extraction_folder="failed", pipelines=list(pipelines))
+
+
+def test_extra_pipelines_get_their_own_folders_and_data_files():
+    primary, bulk, lab = app_config.pipeline_settings(_settings(
+        {"pipeline_name": "bulk", "input_pdf_folder": "bulk in"},
+        {"pipeline_name": "lab", "input_pdf_folder": "lab in", "archive_folder": "lab archive"}))
+    assert (primary["output_text_folder"], primary["archive_folder"]) == ("out", "archive")
+    assert bulk["output_text_folder"] == os.path.join("out", "bulk")
+    assert bulk["archive_folder"] == os.path.join("archive", "bulk")
+    assert bulk["failed_text_extraction_folder"] == os.path.join("failed", "bulk")
+    assert lab["archive_folder"] == "lab archive" # Named explicitly
+    assert lab["journal_path"] == "ezpass_index.lab.sqlite3"
+
+
+@pytest.mark.parametrize("key", app_config.PER_PIPELINE_FOLDERS)
+def test_pipelines_may_not_share_a_folder_they_write(key):
+    with pytest.raises(ValueError, match=key):
+        app_config.pipeline_settings(_settings({"pipeline_name": "bulk", "input_pdf_folder": "bulk in", key: f"./{key}"},
+                                               {"pipeline_name": "lab", "input_pdf_folder": "lab in", key: key}))
+
+
+def test_pipelines_may_not_share_an_input_folder():
+    with pytest.raises(ValueError, match="same input folder"):
+        app_config.pipeline_settings(_settings({"pipeline_name": "bulk", "input_pdf_folder": "./in"}))
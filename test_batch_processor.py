@@ -0,0 +1,60 @@
+import os
+import shutil
+import threading
+
+from batch_processor import BatchProcessor
+from conftest import write_pdf
+from job_journal import JobJournal
+from pdf_processor import PDFProcessor
+from retry_queue import RetryQueue
+
+
+def test_deferred_move_is_released_while_input_is_idle(tmp_path):
+    folders = {name: str(tmp_path / name) for name in ("input", "output", "archive", "failed")}
+    for folder in folders.values():
+        os.makedirs(folder)
+    pdf_path = os.path.join(folders["input"], "a.pdf")
+    write_pdf(pdf_path, ["hello"])
+    retry_queue = RetryQueue(str(tmp_path / "retries.sqlite3"), base_delay=0.05, max_delay=0.1, breaker_cooldown=0.1)
+    processor = PDFProcessor(folders["input"], folders["output"], folders["archive"], folders["failed"],
+                             journal=JobJournal(str(tmp_path / "journal.sqlite3")), retry_queue=retry_queue)
+    shutil.rmtree(folders["archive"]) # The first archive attempt fails and goes to the retry queue
+    threading.Timer(0.3, os.makedirs, (folders["archive"],)).start()
+
+    more_input = threading.Event()
+
+    def watched_folder():
+        # Like a FolderWatcher stream: one PDF, then nothing until the test says so
+        yield pdf_path
+        if not more_input.wait(10):
+            raise AssertionError("The held result was never released while the input was idle")
+
+    with BatchProcessor(processor, max_workers=1) as batch:
+        results = batch.run(watched_folder())
+        try:
+            assert next(results) == ("success", "a.pdf", "")
+        finally:
+            more_input.set()
+        assert list(results) == []
+    assert os.listdir(folders["archive"]) == ["a.pdf"]
+    assert processor.journal.unfinished() == []
+
+
+def test_worker_status_reaches_the_parent_callback(tmp_path, capfd):
+    folders = {name: str(tmp_path / name) for name in ("input", "output", "archive", "failed")}
+    os.makedirs(folders["input"])
+    pdf_paths = [os.path.join(folders["input"], f"fax{n}.pdf") for n in range(3)]
+    for pdf_path in pdf_paths:
+        write_pdf(pdf_path, ["hello"])
+    messages = []
+    processor = PDFProcessor(folders["input"], folders["output"], folders["archive"], folders["failed"],
+                             status_callback=lambda message, level="info": messages.append((message, level)))
+
+    with BatchProcessor(processor, max_workers=2) as batch:
+        results = [result_tuple for result_tuple, _stats in batch.run_with_stats(pdf_paths)]
+
+    assert sorted(results) == [("success", f"fax{n}.pdf", "") for n in range(3)]
+    # Sent inside the extraction processes, replayed here instead of printed there
+    for n in range(3):
+        assert (f"Attempting to process: fax{n}.pdf", "info") in messages
+    assert capfd.readouterr().out == ""
@@ -0,0 +1,45 @@
+import threading
+
+from dedup_index import DedupIndex, PROCESSING
+
+
+def test_only_one_of_two_racing_copies_claims_the_hash(tmp_path):
+    index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    index.claim("warm-up", "x.pdf") # Create the table before the race
+    barrier = threading.Barrier(8)
+    results = []
+
+    def claim(name):
+        barrier.wait()
+        results.append((name, index.claim("abc", name)))
+
+    threads = [threading.Thread(target=claim, args=(f"copy{n}.pdf",)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    owners = [name for name, previous in results if previous is None]
+    assert len(owners) == 1
+    assert all(previous["source_name"] == owners[0] and previous["result_type"] == PROCESSING
+               for _name, previous in results if previous is not None)
+
+
+def test_record_completes_a_claim(tmp_path):
+    index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    assert index.claim("abc", "fax.pdf") is None
+    index.record("abc", "fax.pdf", "success", "/out/fax.txt", 3)
+    record = index.lookup("abc")
+    assert (record["result_type"], record["seen_count"], record["output_path"]) == ("success", 1, "/out/fax.txt")
+    assert index.claim("abc", "fax copy.pdf")["result_type"] == "success"
+
+
+def test_released_claims_can_be_claimed_again(tmp_path):
+    index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    assert index.claim("failed", "a.pdf") is None
+    index.release("failed") # Extraction failed: a resent copy must be tried again
+    assert index.claim("failed", "a.pdf") is None
+    assert index.claim("crashed", "b.pdf") is None
+    index.record("done", "c.pdf", "no_text")
+    assert index.release_claims() == 2 # What a crashed run left behind
+    assert index.lookup("crashed") is None
+    assert index.lookup("done")["result_type"] == "no_text"
@@ -0,0 +1,55 @@
+import app_config
+from document_router import DocumentRouter
+
+
+def _router():
+    return DocumentRouter.from_settings(app_config.DEFAULT_SETTINGS)
+
+
+def _split(page_texts):
+    split = _router().new_split()
+    for page_num, text in enumerate(page_texts):
+        split.assign(page_num, text)
+    return [(segment.pages, segment.identifiers.get("mrn", (None,))[0], segment.doc_type) for segment in split.segments]
+
+
+def test_label_at_the_end_of_a_line_does_not_take_the_next_line():
+    identifiers, _doc_type, _first_page = _router().scan("Referral\nMRN\nPatient: Jane Doe\nDOB\n01/02/1950")
+    assert identifiers == {}
+
+
+def test_identifiers_are_read_on_their_own_line():
+    identifiers, doc_type, _first_page = _router().scan("Laboratory Report\nmrn: 00-12345  DOB: 1/2/1950\nSSN ***-**-6789")
+    assert identifiers == {"mrn": ("0012345", "00-12345"), "dob": ("121950", "1/2/1950"), "ssn4": ("6789", "6789")}
+    assert doc_type == "lab_results"
+
+
+def test_cover_page_stays_with_the_first_patient():
+    assert _split(["FAX COVER SHEET\nTo: Dr. Smith\nPages: 3", "Lab Results\nMRN: 1000", "Lab Results\nMRN: 2000"]) == [
+        ([0, 1], "1000", "lab_results"), ([2], "2000", "lab_results")]
+
+
+def test_continuation_pages_stay_with_their_patient():
+    assert _split(["Discharge Summary\nMRN: 1000", "continued: medications", "follow up in 2 weeks", "Discharge Summary\nMRN: 2000"]) == [
+        ([0, 1, 2], "1000", "discharge_summary"), ([3], "2000", "discharge_summary")]
+
+
+def test_returning_patient_goes_back_to_their_segment():
+    assert _split(["Lab Results\nMRN: 1000", "Lab Results\nMRN: 2000", "Lab Results\nMRN: 1000", "page without identifiers"]) == [
+        ([0, 2, 3], "1000", "lab_results"), ([1], "2000", "lab_results")]
+
+
+def test_same_patient_next_document_type_starts_a_segment():
+    assert _split(["Lab Results\nMRN: 1000", "Radiology Report\nMRN: 1000"]) == [
+        ([0], "1000", "lab_results"), ([1], "1000", "radiology_report")]
+
+
+def test_conflicting_identifiers_are_a_different_patient():
+    # Same MRN printed with another patient's date of birth: not merged into the first patient
+    assert _split(["Lab Results\nMRN: 1000\nDOB: 01/02/1950", "Lab Results\nMRN: 2000", "Lab Results\nMRN: 1000\nDOB: 03/04/1960"]) == [
+        ([0], "1000", "lab_results"), ([1], "2000", "lab_results"), ([2], "1000", "lab_results")]
+
+
+def test_page_one_of_a_new_document_starts_a_segment():
+    assert _split(["Progress Note\nMRN: 1000\nPage 1 of 2", "Page 2 of 2", "Progress Note\nMRN: 1000\nPage 1 of 1"]) == [
+        ([0, 1], "1000", "progress_note"), ([2], "1000", "progress_note")]
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from file_ops import InputBuffer, atomic_copy
+
+
+def _file(tmp_path, data, name="fax.pdf"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_local_file_is_mapped(tmp_path):
+    buffer = InputBuffer(_file(tmp_path, b"%PDF-1.4 local"))
+    try:
+        assert buffer.mapped
+        assert isinstance(buffer.data, memoryview)
+        assert bytes(buffer.data) == b"%PDF-1.4 local"
+        assert buffer.stat.st_size == len(b"%PDF-1.4 local")
+    finally:
+        buffer.close()
+
+
+def test_share_file_is_read_in_one_go(tmp_path):
+    buffer = InputBuffer(_file(tmp_path, b"%PDF-1.4 remote"), mapped=False)
+    assert not buffer.mapped
+    assert buffer.data == b"%PDF-1.4 remote"
+    buffer.close()
+
+
+def test_empty_file_is_read_not_mapped(tmp_path):
+    # mmap cannot map zero bytes
+    buffer = InputBuffer(_file(tmp_path, b""))
+    assert not buffer.mapped
+    assert buffer.data == b""
+    buffer.close()
+
+
+def test_close_releases_the_data(tmp_path):
+    buffer = InputBuffer(_file(tmp_path, b"%PDF-1.4"))
+    view = buffer.data
+    buffer.close()
+    assert buffer.data is None and not buffer.mapped
+    with pytest.raises(ValueError):
+        bytes(view) # The mapping is gone; nothing may still be reading it
+    buffer.close() # Closing twice is harmless
+
+
+def test_bytes_read_from_a_share_outlive_the_buffer(tmp_path):
+    # What PDFProcessor keeps in DocumentJob.input_data for the failed-folder copy
+    path = _file(tmp_path, b"%PDF-1.4 remote")
+    buffer = InputBuffer(path, mapped=False)
+    data = buffer.data
+    buffer.close()
+    dest = str(tmp_path / "copy.pdf")
+    atomic_copy(path, dest, data=data)
+    with open(dest, "rb") as f:
+        assert f.read() == b"%PDF-1.4 remote"
+    assert os.path.getmtime(dest) == os.path.getmtime(path)
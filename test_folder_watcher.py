@@ -0,0 +1,103 @@
+import os
+
+import folder_watcher
+from folder_watcher import FolderWatcher
+
+
+class _Clock:
+    # Stands in for the time module inside folder_watcher: sleeping just moves the clock on
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _watcher(tmp_path, monkeypatch, **kwargs):
+    monkeypatch.setattr(folder_watcher, "time", _Clock())
+    watcher = FolderWatcher(str(tmp_path), poll_interval=1.0, stable_seconds=1.0, use_inotify=False, **kwargs)
+    watcher._scan()
+    return watcher
+
+
+def _write(path, data, mtime_ns):
+    with open(path, "ab") as f:
+        f.write(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _names(paths):
+    return [os.path.basename(path) for path in paths]
+
+
+def test_pdf_is_ready_once_unchanged_for_stable_seconds(tmp_path, monkeypatch):
+    _write(tmp_path / "fax.pdf", b"%PDF", 10**18)
+    _write(tmp_path / "notes.txt", b"not a pdf", 10**18)
+    watcher = _watcher(tmp_path, monkeypatch)
+    assert watcher.poll() == [] # First sighting starts the clock
+    assert watcher.poll() == [] # Half a second unchanged
+    assert _names(watcher.poll()) == ["fax.pdf"]
+    assert watcher.poll() == []
+
+
+def test_growing_pdf_is_held_back(tmp_path, monkeypatch):
+    path = tmp_path / "fax.pdf"
+    _write(path, b"%PDF", 10**18)
+    watcher = _watcher(tmp_path, monkeypatch)
+    for step in range(1, 6):
+        assert watcher.poll() == [] # Still being written by the fax server
+        _write(path, b" more", 10**18 + step)
+    assert watcher.poll() == []
+    assert watcher.poll() == []
+    assert _names(watcher.poll()) == ["fax.pdf"]
+
+
+def test_handled_pdf_is_not_yielded_again_until_it_changes(tmp_path, monkeypatch):
+    path = tmp_path / "fax.pdf"
+    _write(path, b"%PDF", 10**18)
+    watcher = _watcher(tmp_path, monkeypatch)
+    ready = []
+    for _ in range(3):
+        ready += watcher.poll()
+    assert _names(ready) == ["fax.pdf"]
+
+    # Left in the input folder (e.g. its archive move is waiting on the retry queue)
+    for _ in range(5):
+        assert watcher.poll() == []
+
+    # Replaced by a new fax of the same name
+    _write(path, b" resent", 2 * 10**18)
+    ready = []
+    for _ in range(4):
+        ready += watcher.poll()
+    assert _names(ready) == ["fax.pdf"]
+
+
+def test_removed_pdf_is_forgotten(tmp_path, monkeypatch):
+    path = tmp_path / "fax.pdf"
+    _write(path, b"%PDF", 10**18)
+    watcher = _watcher(tmp_path, monkeypatch)
+    for _ in range(3):
+        watcher.poll()
+    os.remove(path)
+    watcher.poll()
+    assert watcher._handled == {}
+
+    _write(path, b"%PDF", 10**18) # Same size and mtime as before, but a new arrival
+    ready = []
+    for _ in range(3):
+        ready += watcher.poll()
+    assert _names(ready) == ["fax.pdf"]
+
+
+def test_ready_batch_follows_the_sort_key(tmp_path, monkeypatch):
+    for name, mtime_ns in (("b.pdf", 3), ("urgent.pdf", 2), ("a.pdf", 1)):
+        _write(tmp_path / name, b"%PDF", mtime_ns * 10**18)
+    watcher = _watcher(tmp_path, monkeypatch, sort_key=lambda name, mtime_ns: (not name.startswith("urgent"), mtime_ns))
+    ready = []
+    for _ in range(3):
+        ready += watcher.poll()
+    assert _names(ready) == ["urgent.pdf", "a.pdf", "b.pdf"]
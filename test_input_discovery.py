@@ -0,0 +1,58 @@
+import os
+import time
+
+import input_discovery
+from input_discovery import InputDiscovery
+
+HOUR_NS = 3600 * 10**9
+
+
+def _file(folder, name, age_ns, data=b"%PDF"):
+    path = folder / name
+    path.write_bytes(data)
+    mtime_ns = time.time_ns() - age_ns
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def _names(paths):
+    return [os.path.basename(path) for path in paths]
+
+
+def test_priority_and_order_hold_across_the_whole_listing(tmp_path):
+    for number in range(50):
+        _file(tmp_path, f"fax{number:02}.pdf", (100 - number) * HOUR_NS)
+    _file(tmp_path, "STAT fax.pdf", 1 * HOUR_NS) # Newest of all, and not in the first directory entries
+    _file(tmp_path, "notes.txt", 200 * HOUR_NS)
+    discovery = InputDiscovery(str(tmp_path), priority_patterns=["(?<![a-z])stat(?![a-z])"], order="oldest", stable_seconds=1)
+    names = _names(discovery.discover())
+    assert names == ["STAT fax.pdf"] + [f"fax{number:02}.pdf" for number in range(50)]
+
+
+def test_newest_order(tmp_path):
+    _file(tmp_path, "old.pdf", 3 * HOUR_NS)
+    _file(tmp_path, "new.pdf", 1 * HOUR_NS)
+    _file(tmp_path, "middle.pdf", 2 * HOUR_NS)
+    discovery = InputDiscovery(str(tmp_path), order="newest", stable_seconds=1)
+    assert _names(discovery.discover()) == ["new.pdf", "middle.pdf", "old.pdf"]
+
+
+def test_recently_modified_files_are_held_back_until_stable(tmp_path, monkeypatch):
+    _file(tmp_path, "done.pdf", HOUR_NS)
+    _file(tmp_path, "landed.pdf", 0) # Complete, but only just arrived
+    growing = _file(tmp_path, "growing.pdf", 0)
+    slept = []
+
+    def sleep(seconds):
+        # RightFax is still writing one of them while discovery waits
+        slept.append(seconds)
+        with open(growing, "ab") as f:
+            f.write(b" more")
+
+    monkeypatch.setattr(input_discovery.time, "sleep", sleep)
+    messages = []
+    discovery = InputDiscovery(str(tmp_path), stable_seconds=5, status_callback=lambda message, level: messages.append(level))
+    assert _names(discovery.discover()) == ["done.pdf", "landed.pdf"]
+    assert len(slept) == 1 and 0 < slept[0] <= 5
+    assert discovery.skipped_unstable == 1
+    assert "warning" in messages
@@ -0,0 +1,136 @@
+import os
+import sqlite3
+
+import pytest
+
+from conftest import Crash, failing_replace, write_pdf
+from job_journal import JobJournal, CLAIMED, MOVE_QUEUED
+from pdf_processor import PDFProcessor
+from retry_queue import RetryQueue
+from batch_processor import BatchProcessor
+
+
+@pytest.fixture
+def folders(tmp_path):
+    names = ("input", "output", "archive", "failed")
+    for name in names:
+        (tmp_path / name).mkdir()
+    return {name: str(tmp_path / name) for name in names}
+
+
+def _processor(tmp_path, folders, retry_queue=None):
+    return PDFProcessor(folders["input"], folders["output"], folders["archive"], folders["failed"],
+                        journal=JobJournal(str(tmp_path / "journal.sqlite3")), retry_queue=retry_queue)
+
+
+def _queued_job(processor, pdf_path, group_id):
+    journal = processor.journal
+    job_id = journal.claim(pdf_path, pdf_path + ".partial")
+    journal.advance(job_id, MOVE_QUEUED, result_type="success", retry_group=group_id)
+    return job_id
+
+
+def test_old_journal_gets_the_retry_group_column(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE jobs (job_id INTEGER PRIMARY KEY AUTOINCREMENT, source_path TEXT NOT NULL,
+                    base_name TEXT NOT NULL, partial_path TEXT NOT NULL, content_hash TEXT, state TEXT NOT NULL,
+                    result_type TEXT, text_path TEXT, page_count INTEGER, error_details TEXT,
+                    claimed REAL NOT NULL, updated REAL NOT NULL)""")
+    conn.execute("""INSERT INTO jobs (source_path, base_name, partial_path, state, claimed, updated)
+                    VALUES ('/in/a.pdf', 'a.pdf', '/out/a.txt.partial', ?, 0, 0)""", (CLAIMED,))
+    conn.commit()
+    conn.close()
+    journal = JobJournal(path)
+    [job] = journal.unfinished()
+    assert job["retry_group"] is None
+    journal.advance(job["job_id"], MOVE_QUEUED, retry_group="g1")
+    journal.finish_group("g1")
+    assert journal.unfinished() == []
+
+
+def test_job_stays_open_while_its_move_is_queued(tmp_path, folders):
+    retry_queue = RetryQueue(str(tmp_path / "retries.sqlite3"))
+    processor = _processor(tmp_path, folders, retry_queue)
+    pdf_path = os.path.join(folders["input"], "a.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    retry_queue.enqueue("g1", "move", pdf_path, os.path.join(folders["archive"], "a.pdf"), "original PDF", required=True)
+    _queued_job(processor, pdf_path, "g1")
+
+    assert processor.recover_interrupted_jobs() == []
+    assert [job["state"] for job in processor.journal.unfinished()] == [MOVE_QUEUED]
+
+    # The queue gave up in the meantime (the row is gone, the PDF still in the input folder): the
+    # next recovery archives it itself and closes the job
+    retry_queue._connection().execute("DELETE FROM file_retries")
+    retry_queue._connection().commit()
+    [(result_type, base_name, _details)] = processor.recover_interrupted_jobs()
+    assert (result_type, base_name) == ("success", "a.pdf")
+    assert os.path.exists(os.path.join(folders["archive"], "a.pdf"))
+    assert processor.journal.unfinished() == []
+
+
+def test_settle_deferred_closes_the_job(tmp_path, folders):
+    processor = _processor(tmp_path, folders)
+    _queued_job(processor, os.path.join(folders["input"], "a.pdf"), "g2")
+    processor.settle_deferred("g2")
+    assert processor.journal.unfinished() == []
+
+
+def test_discovery_skips_pdfs_with_a_queued_move(tmp_path, folders):
+    retry_queue = RetryQueue(str(tmp_path / "retries.sqlite3"))
+    batch = BatchProcessor(_processor(tmp_path, folders, retry_queue), max_workers=1)
+    queued = os.path.join(folders["input"], "queued.pdf")
+    retry_queue.enqueue("g3", "move", queued, os.path.join(folders["archive"], "queued.pdf"), "original PDF", required=True)
+    new = os.path.join(folders["input"], "new.pdf")
+    assert list(batch._skip_queued_moves(retry_queue, [queued, new])) == [new]
+
+
+def test_replay_finishes_text_cut_off_before_its_rename(tmp_path, folders, monkeypatch):
+    processor = _processor(tmp_path, folders)
+    pdf_path = os.path.join(folders["input"], "fax.pdf")
+    write_pdf(pdf_path, ["Lab results"])
+    job = processor.extract_document(pdf_path)
+    with monkeypatch.context() as patch:
+        failing_replace(patch, 1, Crash())
+        with pytest.raises(Crash):
+            processor.write_text(job)
+    assert [row["state"] for row in processor.journal.unfinished()] == ["extracted"]
+
+    restarted = _processor(tmp_path, folders)
+    assert restarted.recover_interrupted_jobs() == [("success", "fax.pdf", "Resumed after an interrupted run")]
+    assert os.listdir(folders["output"]) == ["fax.txt"]
+    with open(os.path.join(folders["output"], "fax.txt"), encoding="utf-8") as f:
+        assert "Lab results" in f.read()
+    assert os.listdir(folders["archive"]) == ["fax.pdf"]
+    assert restarted.journal.unfinished() == []
+
+
+def test_replay_rolls_back_an_unfinished_extraction(tmp_path, folders):
+    processor = _processor(tmp_path, folders)
+    pdf_path = os.path.join(folders["input"], "fax.pdf")
+    write_pdf(pdf_path, ["Lab results"])
+    processor.extract_document(pdf_path) # Crashes before write_text: the journal says CLAIMED
+    assert os.listdir(folders["output"]) == ["fax.txt.partial"]
+
+    restarted = _processor(tmp_path, folders)
+    assert restarted.recover_interrupted_jobs() == []
+    assert os.listdir(folders["output"]) == []
+    assert os.listdir(folders["input"]) == ["fax.pdf"] # Processed again by the next batch
+    assert restarted.journal.unfinished() == []
+
+
+def test_replay_copies_and_archives_a_textless_pdf(tmp_path, folders):
+    processor = _processor(tmp_path, folders)
+    pdf_path = os.path.join(folders["input"], "scan.pdf")
+    write_pdf(pdf_path, [""])
+    job = processor.extract_document(pdf_path)
+    assert job.result_type == "no_text"
+
+    restarted = _processor(tmp_path, folders)
+    [(result_type, base_name, _details)] = restarted.recover_interrupted_jobs()
+    assert (result_type, base_name) == ("no_text", "scan.pdf")
+    assert os.listdir(folders["failed"]) == ["scan.pdf"]
+    assert os.listdir(folders["archive"]) == ["scan.pdf"]
+    assert os.listdir(folders["output"]) == []
@@ -0,0 +1,11 @@
+import os
+
+from metrics import PipelineMetrics
+
+
+def test_back_to_back_batches_get_their_own_report(tmp_path):
+    metrics = PipelineMetrics(report_folder=str(tmp_path))
+    for _batch in range(5):
+        metrics.start_batch()
+        metrics.end_batch()
+    assert len(os.listdir(tmp_path)) == 5
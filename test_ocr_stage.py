@@ -0,0 +1,60 @@
+import collections
+import concurrent.futures
+
+from ocr_stage import OcrStage
+
+
+class _StalledOcrStage(OcrStage):
+    # OCR futures only finish when the stage blocks on one, like a pool that is always busy
+    def __init__(self, max_workers):
+        super().__init__(max_workers=max_workers)
+        self.pulled = 0
+        self.yielded = 0
+        self.high_water = 0
+
+    def _queue_ocr(self, doc, page_num, pending, stats):
+        pending.append((page_num, "", concurrent.futures.Future(), None, 0.0))
+
+    def _resolve(self, entry, stats):
+        page_num, _text, future, _page_hash, _submitted_at = entry
+        if future is not None and not future.done():
+            future.set_result((f"ocr {page_num}", 0.1))
+        self.yielded += 1
+        return super()._resolve(entry, stats)
+
+    def _store_text(self, page_hash, text, ocr_seconds):
+        pass
+
+    def page_texts(self, texts):
+        for page_num, text in enumerate(texts):
+            self.pulled += 1
+            self.high_water = max(self.high_water, self.pulled - self.yielded)
+            yield page_num, text
+
+
+def test_text_pages_held_behind_a_scan_are_bounded():
+    stage = _StalledOcrStage(max_workers=2)
+    texts = [""] + [f"page {page_num}" for page_num in range(1, 500)]
+    pages = list(stage.fill_empty_pages(None, stage.page_texts(texts), collections.Counter()))
+    assert pages == [(0, "ocr 0")] + [(page_num, f"page {page_num}") for page_num in range(1, 500)]
+    assert stage.high_water <= 2 * stage.max_workers
+
+
+def test_pending_high_water_mark_with_many_scans():
+    stage = _StalledOcrStage(max_workers=3)
+    stats = collections.Counter()
+    texts = ["" if page_num % 3 == 0 else f"page {page_num}" for page_num in range(300)]
+    pages = list(stage.fill_empty_pages(None, stage.page_texts(texts), stats))
+    assert [page_num for page_num, _text in pages] == list(range(300))
+    assert all(text == (f"ocr {page_num}" if page_num % 3 == 0 else f"page {page_num}") for page_num, text in pages)
+    assert stage.high_water <= 2 * stage.max_workers
+    assert stats["ocr_pages"] == 100
+
+
+def test_ocr_workers_are_a_budget_shared_by_extraction_processes():
+    stage = OcrStage(max_workers=8)
+    stage.split_workers(4)
+    assert stage.max_workers == 2
+    stage.split_workers(16)
+    assert stage.max_workers == 1 # Every extraction process can still OCR
+    assert stage.total_workers == 8
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+
+import fitz # PyMuPDF
+
+from conftest import Crash, failing_replace, write_pdf
+from document_router import DocumentRouter
+from job_journal import JobJournal
+from pdf_processor import PDFProcessor
+from search_index import SearchIndex
+
+
+def _processor(tmp_path, **kwargs):
+    folders = [str(tmp_path / name) for name in ("input", "output", "archive", "failed")]
+    os.makedirs(folders[0], exist_ok=True)
+    return PDFProcessor(*folders, search_index=SearchIndex(str(tmp_path / "search.sqlite3")), **kwargs)
+
+
+def _indexed_pages(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "search.sqlite3"))
+    return conn.execute("SELECT page, text FROM pages ORDER BY page").fetchall()
+
+
+def test_pages_are_indexed_from_the_written_text(tmp_path):
+    processor = _processor(tmp_path)
+    pdf_path = os.path.join(processor.input_pdf_folder, "fax.pdf")
+    write_pdf(pdf_path, ["Patient Zoë\nline two", "", "Glucose 98 mg/dL"])
+    result_type, _name, _details = processor.process_pdf(pdf_path)
+    assert result_type == "success"
+    with fitz.open(os.path.join(processor.archive_folder, "fax.pdf")) as doc:
+        expected = [(page_num + 1, doc[page_num].get_text()) for page_num in (0, 2)]
+    assert _indexed_pages(tmp_path) == expected
+
+
+def test_json_only_output_is_indexed_from_the_json(tmp_path):
+    processor = _processor(tmp_path, output_format="json")
+    pdf_path = os.path.join(processor.input_pdf_folder, "fax.pdf")
+    write_pdf(pdf_path, ["First page", "", "Third page"])
+    assert processor.process_pdf(pdf_path)[0] == "success"
+    assert [(page, text.strip()) for page, text in _indexed_pages(tmp_path)] == [(1, "First page"), (3, "Third page")]
+
+
+def test_failed_rename_leaves_no_partial_set_of_outputs(tmp_path, monkeypatch):
+    processor = _processor(tmp_path, output_format="both")
+    pdf_path = os.path.join(processor.input_pdf_folder, "fax.pdf")
+    write_pdf(pdf_path, ["First page"])
+    job = processor.extract_document(pdf_path)
+    failing_replace(monkeypatch, 2, OSError("disk full"))
+    processor.write_text(job)
+    monkeypatch.undo()
+    assert job.result_type == "failed"
+    assert os.listdir(processor.output_text_folder) == []
+
+
+def test_crash_between_renames_is_rolled_forward(tmp_path, monkeypatch):
+    journal_path = str(tmp_path / "journal.sqlite3")
+    processor = _processor(tmp_path, output_format="both", journal=JobJournal(journal_path))
+    pdf_path = os.path.join(processor.input_pdf_folder, "fax.pdf")
+    write_pdf(pdf_path, ["First page"])
+    job = processor.extract_document(pdf_path)
+    failing_replace(monkeypatch, 2, Crash())
+    try:
+        processor.write_text(job)
+    except Crash:
+        pass
+    monkeypatch.undo()
+
+    restarted = _processor(tmp_path, output_format="both", journal=JobJournal(journal_path))
+    assert restarted.recover_interrupted_jobs() == [("success", "fax.pdf", "Resumed after an interrupted run")]
+    assert sorted(os.listdir(processor.output_text_folder)) == ["fax.json", "fax.txt"]
+    assert os.listdir(processor.archive_folder) == ["fax.pdf"]
+    assert restarted.journal.unfinished() == []
+
+
+def _read_from_share(processor):
+    # Makes the input folder count as a network share, so inputs are bulk-read instead of mapped
+    processor._remote_folders[os.path.abspath(processor.input_pdf_folder)] = True
+
+
+def test_only_failed_documents_keep_the_bytes_read_from_a_share(tmp_path):
+    processor = _processor(tmp_path, read_inputs_once=True)
+    _read_from_share(processor)
+    text_path = os.path.join(processor.input_pdf_folder, "fax.pdf")
+    scan_path = os.path.join(processor.input_pdf_folder, "scan.pdf")
+    write_pdf(text_path, ["Lab results"])
+    write_pdf(scan_path, [""])
+
+    job = processor.extract_document(text_path)
+    assert job.result_type == "success" and job.input_data is None # Its archive move reads the share again
+
+    job = processor.extract_document(scan_path)
+    assert job.result_type == "no_text"
+    with open(scan_path, "rb") as f:
+        assert job.input_data == f.read() # For the failed-folder copy
+    processor.write_text(job)
+    assert processor.finish_document(job)[0] == "no_text"
+    assert job.input_data is None
+    assert os.listdir(os.path.join(tmp_path, "failed")) == ["scan.pdf"]
+
+
+def test_split_segments_map_their_pages_to_the_archived_packet(tmp_path):
+    router = DocumentRouter({"mrn": r"MRN[:#]?[ \t]*(\d+)"}, first_page_pattern="")
+    processor = _processor(tmp_path, router=router)
+    pdf_path = os.path.join(processor.input_pdf_folder, "packet.pdf")
+    write_pdf(pdf_path, ["MRN 1000 labs", "MRN 2000 x-ray", "MRN 1000 more labs"])
+    assert processor.process_pdf(pdf_path)[0] == "success"
+
+    index = processor.search_index
+    documents = {document["text_path"].rsplit(" - ", 1)[1]: document for document in index.list_documents()}
+    first, second = documents["part 1 of 2.txt"], documents["part 2 of 2.txt"]
+    assert first["pdf_path"] == second["pdf_path"] == os.path.abspath(os.path.join(processor.archive_folder, "packet.pdf"))
+    assert (first["page_count"], first["source_pages"]) == (2, [1, 3])
+    assert (second["page_count"], second["source_pages"]) == (1, [2])
+    # The second patient's only page is page 2 of the packet, for the preview and its text alike
+    assert index.source_page(second, 1) == 2
+    assert "MRN 2000" in index.page_text(second["document_id"], index.source_page(second, 1))
+    assert "MRN 1000 more" in index.page_text(first["document_id"], index.source_page(first, 2))
+    assert index.source_page(first, 3) is None
@@ -0,0 +1,62 @@
+import asyncio
+
+from pipeline_scheduler import FairScheduler
+
+
+def _run(sources, total_workers, extraction_seconds=1.0):
+    # Drives the scheduler the way AsyncPipeline's extract stage does, with every extraction
+    # reported as taking extraction_seconds. Returns the picked pipeline names in order and the
+    # most documents each pipeline ever had in flight.
+    picks = []
+    in_flight = {name: 0 for name, *_rest in sources}
+    peak = dict(in_flight)
+
+    async def worker(scheduler):
+        while True:
+            picked = await scheduler.acquire()
+            if picked is None:
+                return
+            name, pdf_path = picked
+            picks.append(name)
+            in_flight[name] += 1
+            peak[name] = max(peak[name], in_flight[name])
+            await asyncio.sleep(0.002) # Lets the input readers catch up, as real extraction would
+            in_flight[name] -= 1
+            await scheduler.release(name, pdf_path, extraction_seconds)
+
+    async def main():
+        scheduler = FairScheduler(sources, total_workers)
+        scheduler.start(asyncio.get_running_loop())
+        try:
+            await asyncio.gather(*(worker(scheduler) for _ in range(total_workers)))
+        finally:
+            scheduler.stop()
+
+    asyncio.run(main())
+    return picks, peak
+
+
+def _paths(name, count):
+    return [f"{name}/{number}.pdf" for number in range(count)]
+
+
+def test_workers_are_shared_by_priority():
+    sources = [("fax", _paths("fax", 100), 3, 0), ("bulk", _paths("bulk", 100), 1, 0)]
+    picks, _peak = _run(sources, total_workers=2)
+    assert len(picks) == 200
+    # While both feeds have work, the priority 3 feed gets about three workers' turns in four
+    fax_share = picks[:60].count("fax") / 60
+    assert 0.65 <= fax_share <= 0.85
+
+
+def test_equal_priorities_alternate():
+    sources = [("a", _paths("a", 40), 1, 0), ("b", _paths("b", 40), 1, 0)]
+    picks, _peak = _run(sources, total_workers=2)
+    assert abs(picks[:40].count("a") - picks[:40].count("b")) <= 4
+
+
+def test_worker_quota_caps_a_pipeline():
+    sources = [("bulk", _paths("bulk", 30), 5, 1), ("fax", _paths("fax", 30), 1, 0)]
+    picks, peak = _run(sources, total_workers=3)
+    assert len(picks) == 60
+    assert peak["bulk"] == 1
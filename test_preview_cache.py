@@ -0,0 +1,76 @@
+import time
+
+from conftest import write_pdf
+from preview_cache import LRUCache, PreviewLoader
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = LRUCache(max_bytes=30)
+    cache.put("a", "A", 10)
+    cache.put("b", "B", 10)
+    cache.put("c", "C", 10)
+    assert cache.get("a") == "A" # Now b is the oldest
+    cache.put("d", "D", 10)
+    assert "b" not in cache
+    assert [key in cache for key in "acd"] == [True, True, True]
+    assert cache.current_bytes == 30
+
+
+def test_memory_cap_counts_bytes_not_entries():
+    cache = LRUCache(max_bytes=100)
+    for key in range(10):
+        cache.put(key, key, 10)
+    cache.put("big", "page", 55) # Pushes out as many small entries as it takes
+    assert len(cache) == 5 and "big" in cache and 5 not in cache and 6 in cache
+    assert cache.current_bytes == 95
+
+    cache.put("big", "smaller", 5) # Replacing an entry gives its bytes back
+    assert cache.current_bytes == 45
+
+    cache.put("huge", "page", 101) # Never fits: kept out rather than emptying the cache
+    assert "huge" not in cache and len(cache) == 5 and cache.current_bytes == 45
+
+    cache.clear()
+    assert len(cache) == 0 and cache.current_bytes == 0
+
+
+def _poll_until_done(loader, request, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if request in loader.poll():
+            return
+        time.sleep(0.02)
+    raise AssertionError(f"{request} was never rendered")
+
+
+def test_rendered_page_is_cached_and_not_rendered_again(tmp_path):
+    pdf_path = str(tmp_path / "fax.pdf")
+    write_pdf(pdf_path, ["First page", "Second page"])
+    loader = PreviewLoader(max_in_flight=1)
+    try:
+        request = (pdf_path, 1, 100)
+        loader.want([request])
+        _poll_until_done(loader, request)
+        png, page_count, text = loader.result(request)
+        assert png.startswith(b"\x89PNG") and page_count == 2 and "Second page" in text
+        assert loader.cache.current_bytes == len(png) + len(text) * 2
+
+        loader.want([request])
+        assert loader.poll() == [] # Served from the cache
+    finally:
+        loader.close()
+
+
+def test_missing_pdf_fails_once_without_a_render(tmp_path):
+    loader = PreviewLoader()
+    request = (str(tmp_path / "not archived yet.pdf"), 0, 100)
+    loader.want([request])
+    assert loader.poll() == [request]
+    assert loader.error(request) and loader.result(request) is None
+    assert loader._executor is None # No preview process was started for it
+    loader.want([request])
+    assert loader.poll() == [] # Not retried on every scroll...
+    loader.clear_errors()
+    loader.want([request])
+    assert loader.poll() == [request] # ...until the browser is refreshed
+    loader.close()
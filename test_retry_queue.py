@@ -0,0 +1,83 @@
+import os
+import pickle
+import threading
+
+from retry_queue import RetryQueue
+
+
+def _queue(tmp_path):
+    return RetryQueue(str(tmp_path / "retries.sqlite3"), max_attempts=2, base_delay=0.0, max_delay=0.0)
+
+
+def test_group_outcome_ok_after_retried_move(tmp_path):
+    src = tmp_path / "in.pdf"
+    src.write_bytes(b"%PDF")
+    dest = tmp_path / "archive" / "in.pdf"
+    dest.parent.mkdir()
+    queue = _queue(tmp_path)
+    queue.enqueue("doc-1", "move", str(src), str(dest), "original PDF", required=True, attempts=0)
+    assert queue.take_outcome("doc-1") is None
+    queue.start()
+    try:
+        assert queue.wait_idle(timeout=10)
+    finally:
+        queue.stop()
+    assert queue.take_outcome("doc-1") == "ok"
+    assert dest.read_bytes() == b"%PDF" and not src.exists()
+
+
+def test_required_step_running_out_of_retries_fails_the_group(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue("doc-2", "move", str(tmp_path / "gone.pdf"), str(tmp_path / "out.pdf"), "original PDF", required=True, attempts=0)
+    queue.enqueue("doc-3", "copy", str(tmp_path / "gone.pdf"), str(tmp_path / "copy.pdf"), "failed copy", required=False, attempts=0)
+    queue.start()
+    try:
+        assert queue.wait_idle(timeout=10)
+    finally:
+        queue.stop()
+    assert queue.take_outcome("doc-2") == "failed"
+    assert queue.take_outcome("doc-3") == "ok" # Optional steps only warn
+
+
+class _WatchedConnection:
+    # Wraps the retry thread's connection: right after each commit, another thread asks for the
+    # group's outcome, as the batch loop may at any moment
+    def __init__(self, conn, on_commit):
+        self._conn = conn
+        self._on_commit = on_commit
+
+    def execute(self, *args):
+        return self._conn.execute(*args)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        result = self._conn.__exit__(*exc_info)
+        self._on_commit()
+        return result
+
+
+def test_outcome_read_while_giving_up_is_never_ok(tmp_path):
+    queue = _queue(tmp_path)
+    queue.enqueue("doc-4", "move", str(tmp_path / "gone.pdf"), str(tmp_path / "out.pdf"), "original PDF", required=True, attempts=1)
+    row = queue._connection().execute("SELECT * FROM file_retries").fetchone()
+    outcomes = []
+    readers = []
+
+    def read_outcome():
+        reader = threading.Thread(target=lambda: outcomes.append(queue.take_outcome("doc-4")))
+        reader.start()
+        reader.join(0.2) # Blocks on the outcome lock while the give-up is still in progress
+        readers.append(reader)
+
+    queue._attempt(_WatchedConnection(queue._connection(), read_outcome), row, str(tmp_path))
+    for reader in readers:
+        reader.join()
+    assert outcomes == ["failed"]
+
+
+def test_pickled_queue_gets_its_own_lock(tmp_path):
+    queue = pickle.loads(pickle.dumps(_queue(tmp_path)))
+    queue.enqueue("doc-5", "copy", os.devnull, str(tmp_path / "x"), "copy", required=False)
+    assert queue.take_outcome("doc-5") is None
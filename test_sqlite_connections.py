@@ -0,0 +1,73 @@
+import pickle
+import sqlite3
+import threading
+import concurrent.futures
+
+import sqlite_connections
+from dedup_index import DedupIndex
+from sqlite_connections import SqliteConnections
+
+
+def _count_connects(monkeypatch):
+    opened = []
+    real_connect = sqlite3.connect
+
+    def connect(*args, **kwargs):
+        conn = real_connect(*args, **kwargs)
+        opened.append((threading.get_ident(), conn))
+        return conn
+
+    monkeypatch.setattr(sqlite_connections.sqlite3, "connect", connect)
+    return opened
+
+
+def test_interleaved_threads_keep_their_own_connection(tmp_path, monkeypatch):
+    opened = _count_connects(monkeypatch)
+    index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    index.record("abc", "fax.pdf", "success")
+
+    def lookups(_n):
+        conns = set()
+        for _ in range(50):
+            assert index.lookup("abc")["source_name"] == "fax.pdf"
+            conns.add(id(index._connection()))
+        return threading.get_ident(), conns
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lookups, range(36)))
+    assert all(len(conns) == 1 for _thread, conns in results)
+    threads = {thread for thread, _conns in results}
+    assert len(opened) == len(threads) + 1 # Plus the test thread's own
+    assert len({thread for thread, _conn in opened}) == len(opened)
+
+
+def test_setup_runs_once_per_connection(tmp_path):
+    calls = []
+    connections = SqliteConnections(str(tmp_path / "db.sqlite3"), calls.append)
+    conn = connections.get()
+    assert connections.get() is conn and calls == [conn]
+    thread = threading.Thread(target=connections.get)
+    thread.start()
+    thread.join()
+    assert len(calls) == 2
+
+
+def test_close_reconnects_on_next_use(tmp_path):
+    connections = SqliteConnections(str(tmp_path / "db.sqlite3"))
+    conn = connections.get()
+    connections.close()
+    try:
+        conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        pass
+    else:
+        raise AssertionError("close() left the connection open")
+    assert connections.get() is not conn
+
+
+def test_unpickled_copy_opens_its_own_connection(tmp_path):
+    index = DedupIndex(str(tmp_path / "index.sqlite3"))
+    index.record("abc", "fax.pdf", "success")
+    copy = pickle.loads(pickle.dumps(index))
+    assert copy._connection() is not index._connection()
+    assert copy.lookup("abc")["result_type"] == "success"
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import structured_output
+from structured_output import JsonDocumentWriter, iter_page_records, read_page_texts, record_text
+
+
+def _record(number, text):
+    line = {"bbox": [0, 0, 10, 10], "text": text, "spans": [{"text": text, "bbox": [0, 0, 10, 10], "font": "Helv", "size": 11.0, "flags": 0}]}
+    return {"number": number, "width": 612.0, "height": 792.0, "blocks": [{"bbox": [0, 0, 10, 10], "lines": [line]}]}
+
+
+def _write(path, records, segment=None, source_page_count=10):
+    writer = JsonDocumentWriter(str(path), "fax.pdf", source_page_count, sorted_text=True)
+    try:
+        for record in records:
+            writer.write_page(record)
+        writer.finish(segment)
+    finally:
+        writer.close()
+
+
+@pytest.mark.parametrize("chunk_chars", [3, 17, 1 << 16])
+def test_pages_stream_back_across_chunk_boundaries(tmp_path, monkeypatch, chunk_chars):
+    monkeypatch.setattr(structured_output, "READ_CHUNK_CHARS", chunk_chars)
+    records = [_record(1, "Zoë, MRN 1000"), _record(2, 'quotes " and ] brackets [ inside'), dict(_record(3, ""), blocks=[], ocr_text="scanned")]
+    path = tmp_path / "fax.json"
+    _write(path, records)
+    assert list(iter_page_records(str(path))) == records
+    assert list(read_page_texts(str(path))) == [(1, "Zoë, MRN 1000"), (2, 'quotes " and ] brackets [ inside'), (3, "scanned")]
+
+
+def test_document_is_valid_json_with_its_own_page_count(tmp_path):
+    path = tmp_path / "part.json"
+    _write(path, [_record(4, "a"), _record(7, "b")], segment={"number": 2, "count": 3, "label": "MRN 1000"})
+    document = json.loads(path.read_text(encoding="utf-8"))
+    assert document["format_version"] == structured_output.FORMAT_VERSION
+    assert document["source"] == "fax.pdf" and document["source_page_count"] == 10
+    assert document["page_count"] == 2
+    assert document["segment"] == {"number": 2, "count": 3, "label": "MRN 1000"}
+    assert [record_text(record) for record in document["pages"]] == ["a", "b"]
+
+
+def test_empty_document(tmp_path):
+    path = tmp_path / "empty.json"
+    _write(path, [])
+    assert list(iter_page_records(str(path))) == []
+    assert json.loads(path.read_text(encoding="utf-8"))["page_count"] == 0
+
+
+def test_truncated_document_raises(tmp_path):
+    path = tmp_path / "cut.json"
+    _write(path, [_record(1, "a"), _record(2, "b")])
+    path.write_text(path.read_text(encoding="utf-8")[:-40], encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_page_records(str(path)))